@@ -1,8 +1,8 @@
 from flask import Flask, request, abort
-import json
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from jwks_cache import JWKSCache, JWKSUnavailable
 
 
 app = Flask(__name__)
@@ -51,26 +51,24 @@ def get_token_auth_header():
     return token
 
 
+jwks = JWKSCache(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    try:
+        rsa_key = jwks.get(unverified_header['kid'])
+    except JWKSUnavailable:
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }, 503)
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -111,6 +109,9 @@ def requires_auth(f):
         token = get_token_auth_header()
         try:
             payload = verify_decode_jwt(token)
+        except AuthError as error:
+            # the key provider being down is not the token's fault
+            abort(503 if error.error['code'] == 'jwks_unavailable' else 401)
         except:
             abort(401)
         return f(payload, *args, **kwargs)
@@ -0,0 +1,131 @@
+"""Signing key cache for verify_decode_jwt in app.py."""
+import json
+import logging
+import threading
+import time
+from urllib.request import urlopen
+
+JWKS_TTL = 600
+JWKS_MIN_REFETCH_INTERVAL = 30
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSUnavailable(Exception):
+    """The keys could not be fetched and there are none to fall back on."""
+
+
+def fetch_jwks(url):
+    with urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+class JWKSCache:
+    """Signing keys from a JWKS endpoint, keyed by kid.
+
+    Keys are fetched once and kept for `ttl` seconds, and a background
+    thread refreshes them before they expire, so requests do not wait on
+    the provider. A kid the cache does not know triggers a refetch to pick
+    up rotated keys, at most once every `min_interval` seconds so tokens
+    with made-up kids cannot flood the provider. If a fetch fails the
+    previous keys stay in use and the failure is logged; while there are
+    none get() raises JWKSUnavailable. Fetches run outside the cache's
+    lock, so while one is under way other requests keep using the current
+    keys.
+
+    `fetch(url)` returns the parsed JWKS document; pass a different one to
+    point the cache at a local stand-in server or a fixed key set in tests.
+    """
+
+    def __init__(self, url, fetch=fetch_jwks, ttl=JWKS_TTL,
+                 min_interval=JWKS_MIN_REFETCH_INTERVAL, clock=time.monotonic,
+                 background=True):
+        self.url = url
+        self.fetch = fetch
+        self.ttl = ttl
+        self.min_interval = min_interval
+        self.clock = clock
+        self.background = background
+        self._keys = {}
+        self._expires = None
+        self._last_attempt = None
+        self._fetching = False
+        self._lock = threading.Lock()
+        self._fetched = threading.Condition(self._lock)
+        self._refresher = None
+        self._stopped = threading.Event()
+
+    def get(self, kid):
+        """Returns the RSA key for `kid`, or None if the provider has none.
+        Raises JWKSUnavailable while no keys could be fetched at all."""
+        if self.background and self._refresher is None:
+            self._start()
+        if self._expires is None or self.clock() >= self._expires:
+            self._refetch()
+        key = self._keys.get(kid)
+        if key is None and self._refetch():
+            key = self._keys.get(kid)
+        if not self._keys:
+            raise JWKSUnavailable(self.url)
+        return key
+
+    def stop(self):
+        self._stopped.set()
+
+    def _refetch(self, rate_limited=True):
+        """Fetches the keys unless a fetch is under way or, when
+        `rate_limited`, was tried within min_interval. Returns whether new
+        keys were fetched.
+
+        The fetch runs outside the lock, so other threads keep using the
+        current keys meanwhile; only while there are none do they wait for
+        it to finish."""
+        with self._lock:
+            if self._fetching:
+                while self._fetching and not self._keys:
+                    self._fetched.wait()
+                return False
+            now = self.clock()
+            if rate_limited and self._last_attempt is not None and now - self._last_attempt < self.min_interval:
+                return False
+            self._last_attempt = now
+            self._fetching = True
+
+        keys = None
+        try:
+            keys = self._parse(self.fetch(self.url))
+        except Exception as e:
+            logger.warning('Fetching signing keys from %s failed, %s: %s', self.url,
+                           'keeping the cached keys' if self._keys else 'no keys to fall back on', e)
+        finally:
+            with self._lock:
+                if keys is not None:
+                    self._keys = keys
+                    self._expires = self.clock() + self.ttl
+                self._fetching = False
+                self._fetched.notify_all()
+        return keys is not None
+
+    def _parse(self, jwks):
+        return {
+            key['kid']: {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+            for key in jwks['keys'] if 'kid' in key
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._run, name='jwks-refresh', daemon=True)
+                self._refresher.start()
+
+    def _run(self):
+        # refresh at half the ttl, so one failed fetch still leaves time
+        # for another before the keys expire
+        while not self._stopped.wait(self.ttl / 2):
+            self._refetch(rate_limited=False)
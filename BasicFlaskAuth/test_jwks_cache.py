@@ -0,0 +1,146 @@
+import threading
+import unittest
+from urllib.error import URLError
+
+from jwks_cache import JWKSCache, JWKSUnavailable
+
+URL = 'https://example.auth0.com/.well-known/jwks.json'
+
+
+def key(kid):
+    return {'kty': 'RSA', 'kid': kid, 'use': 'sig', 'n': 'n-' + kid, 'e': 'AQAB', 'alg': 'RS256'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Provider:
+    """A JWKS endpoint whose keys and availability the test changes."""
+
+    def __init__(self, *kids):
+        self.kids = list(kids)
+        self.down = False
+        self.fetches = 0
+        # set to hold fetches until the test releases them
+        self.started = threading.Event()
+        self.release = None
+
+    def __call__(self, url):
+        self.fetches += 1
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        if self.down:
+            raise URLError('connection refused')
+        return {'keys': [key(kid) for kid in self.kids]}
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.provider = Provider('a')
+        self.cache = JWKSCache(URL, fetch=self.provider, ttl=600, min_interval=30,
+                               clock=self.clock, background=False)
+
+    def test_keys_are_kept_for_ttl(self):
+        self.assertEqual(self.cache.get('a'), {'kty': 'RSA', 'kid': 'a', 'use': 'sig', 'n': 'n-a', 'e': 'AQAB'})
+        self.clock.now = 599
+        self.cache.get('a')
+        self.assertEqual(self.provider.fetches, 1)
+
+        self.clock.now = 600
+        self.cache.get('a')
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_unknown_kid_refetches(self):
+        self.cache.get('a')
+        self.provider.kids.append('b')
+        self.clock.now = 30
+
+        self.assertEqual(self.cache.get('b')['kid'], 'b')
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_unknown_kid_refetch_is_rate_limited(self):
+        self.cache.get('a')
+        for i in range(10):
+            self.clock.now = i
+            self.assertIsNone(self.cache.get('made-up-%d' % i))
+        self.assertEqual(self.provider.fetches, 1)
+
+        self.clock.now = 30
+        self.assertIsNone(self.cache.get('made-up'))
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_failed_fetch_keeps_previous_keys(self):
+        self.cache.get('a')
+        self.provider.down = True
+        self.clock.now = 600
+
+        self.assertEqual(self.cache.get('a')['kid'], 'a')
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_unavailable_without_keys(self):
+        self.provider.down = True
+        with self.assertRaises(JWKSUnavailable):
+            self.cache.get('a')
+        # within min_interval the provider is not asked again, and still no keys
+        with self.assertRaises(JWKSUnavailable):
+            self.cache.get('a')
+        self.assertEqual(self.provider.fetches, 1)
+
+        self.provider.down = False
+        self.clock.now = 30
+        self.assertEqual(self.cache.get('a')['kid'], 'a')
+
+    def test_failed_fetch_is_logged(self):
+        self.cache.get('a')
+        self.provider.down = True
+        self.clock.now = 600
+
+        with self.assertLogs('jwks_cache', 'WARNING') as logs:
+            self.cache.get('a')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(URL, logs.output[0])
+        self.assertIn('keeping the cached keys', logs.output[0])
+        self.assertIn('connection refused', logs.output[0])
+
+    def fetch_in_background(self):
+        self.provider.started.clear()
+        self.provider.release = threading.Event()
+        thread = threading.Thread(target=self.cache.get, args=('a',))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.provider.release.set)
+        self.assertTrue(self.provider.started.wait(5))
+
+    def test_stale_keys_served_during_fetch(self):
+        self.cache.get('a')
+        self.provider.kids = ['b']
+        self.clock.now = 600
+        self.fetch_in_background()
+
+        # answered from the expired keys without waiting on the fetch
+        self.assertEqual(self.cache.get('a')['kid'], 'a')
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_first_fetch_is_waited_for(self):
+        self.fetch_in_background()
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(self.cache.get('a')))
+        waiter.start()
+        waiter.join(0.05)
+        self.assertTrue(waiter.is_alive())
+
+        self.provider.release.set()
+        waiter.join(5)
+        self.assertEqual(result[0]['kid'], 'a')
+        self.assertEqual(self.provider.fetches, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,20 +2,26 @@
 # Imports
 from flask_migrate import Migrate
 from datetime import datetime
-import re
 from itertools import groupby
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+import click
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, case, or_, and_
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+import search
+import formatting
+import cache
+import importer
+import listing
+import db_pool
+from instrumentation import Instrumentation, metrics_access
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -27,10 +33,39 @@ db = SQLAlchemy(app)
 
 # TODO: connect to a local postgresql database
 migrate = Migrate(app, db)
+
+detail_cache = cache.from_config(app.config)
+instrumentation = Instrumentation(app, gauges=lambda: {
+  'db_pool_' + name: value for name, value in db_pool.pool_stats(db.engine).items()})
+
+SHOWS_PER_PAGE = 30
+MAX_SHOWS_PER_PAGE = 200
+SHOWS_STREAM_BATCH = 1000
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True, index=True)
+
+    def __repr__(self):
+        return f'<({self.id}) {self.name}>'
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
 
@@ -40,7 +75,6 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -49,7 +83,7 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default = True, nullable=False)
     seeking_description = db.Column(db.String(500))
 
-    #genres = db.relationship('Genre', secondary=venues_genres__association_table, backref=db.backref('venues'))
+    genres = db.relationship('Genre', secondary=venue_genres, backref=db.backref('venues', lazy=True))
     
     shows = db.relationship('Show', backref = 'venue', lazy = True , cascade="all, delete-orphan" )
 
@@ -68,7 +102,6 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -77,7 +110,7 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default = True, nullable=False)
     seeking_description = db.Column(db.String(500))
 
-    #genres = db.relationship('Genre', secondary=artists_genres_association_table, backref=db.backref('artists'))
+    genres = db.relationship('Genre', secondary=artist_genres, backref=db.backref('artists', lazy=True))
 
     shows = db.relationship('Show', backref = 'artist', lazy = True , cascade="all, delete-orphan" )
 
@@ -89,9 +122,12 @@ class Artist(db.Model):
 class Show(db.Model):
     __tablename__ = 'Show'
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable = False)    
-    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable = False)      
+    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable = False, index = True)    
+    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable = False, index = True)      
     start_time = db.Column(db.DateTime, default=datetime.utcnow , nullable = False)
+
+    __table_args__ = (db.Index('ix_Show_start_time_id', 'start_time', 'id'),)
+
     def __repr__(self):
         return f'<({self.id}) Artist:({self.artist_id}), Venue:({self.venue_id})>'
 
@@ -100,15 +136,34 @@ class Show(db.Model):
 #----------------------------------------------------------------------------#
 
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+  return formatting.format_datetime(value, format, app.config.get('DATETIME_LOCALE'))
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def venue_key(venue_id):
+  return 'venue:%s' % venue_id
+
+def artist_key(artist_id):
+  return 'artist:%s' % artist_id
+
+def invalidate_details(venue_ids=(), artist_ids=()):
+  detail_cache.delete(*([venue_key(id) for id in venue_ids] + [artist_key(id) for id in artist_ids]))
+
+def split_shows(shows, now):
+  # shows are ordered by start_time, so the past ones form a prefix
+  past_shows = [show for show in shows if show['start_time'] < now]
+  return past_shows, shows[len(past_shows):]
+
+def genres_by_name(names):
+  # reuses the existing Genre rows and creates the rest
+  names = list(dict.fromkeys(names))
+  existing = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names)).all()}
+  return [existing.get(name) or Genre(name=name) for name in names]
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -124,33 +179,34 @@ def index():
 
 @app.route('/venues')
 def venues():
-  venues = Venue.query.order_by(Venue.name).all() 
-  data=[]
+  now = datetime.now()
+  num_upcoming_shows = func.count(case((Show.start_time > now, Show.id)))
 
-  def grouper( item ): 
-    return item.city, item.state 
+  query = db.session.query(
+    Venue.id, Venue.name, Venue.city, Venue.state,
+    num_upcoming_shows.label('num_upcoming_shows')
+  )
 
-  for ( (city, state), items ) in groupby( venues, grouper ):
-        
-       data_venues =[]
-       for item in items:
-          
-          num_upcoming_shows = 0 
-          now = datetime.now()                    
-          for show in item.shows:
-            if show.start_time > now:
-              num_upcoming_shows += 1
-          
-          data_venues.append({
-                    "id": item.id,
-                    "name": item.name,
-                    "num_upcoming_shows": num_upcoming_shows
-              })
+  genre = request.args.get('genre')
+  if genre:
+    query = query.join(venue_genres, venue_genres.c.venue_id == Venue.id).\
+    join(Genre, Genre.id == venue_genres.c.genre_id).\
+    filter(Genre.name == genre)
+
+  rows = listing.fetch(db.session, query.outerjoin(Show, Show.venue_id == Venue.id).\
+  group_by(Venue.id).\
+  order_by(Venue.city, Venue.state, Venue.name), listing.VenueRow)
 
+  data=[]
+
+  def grouper( row ): 
+    return row.city, row.state 
+
+  for ( (city, state), items ) in groupby( rows, grouper ):
        data.append({
          "city": city,
          "state": state,
-         "venues": data_venues
+         "venues": list(items)
         })
       
   return render_template('pages/venues.html', areas=data);
@@ -160,21 +216,14 @@ def search_venues():
   
   search_term = request.form.get('search_term', '')
 
-  venues = Venue.query.filter(Venue.name.ilike('%' + search_term + '%')).all()  
-  
-  data = []
-  now = datetime.now()
-  for venue in venues:
-    shows = venue.shows
-    num_upcoming_shows = 0
-    for show in shows:
-      if show.start_time > now:
-        num_upcoming_shows += 1
+  rows = search.by_name(db.session, Venue, Show.venue_id, Show.start_time, search_term, datetime.now())
 
+  data = []
+  for row in rows:
     data.append({
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": num_upcoming_shows  
+      "id": row.id,
+      "name": row.name,
+      "num_upcoming_shows": row.num_upcoming_shows  
     })
 
   response = {
@@ -184,64 +233,53 @@ def search_venues():
 
   return render_template('pages/search_venues.html', results=response, search_term= search_term)
 
+def venue_detail(venue_id):
+    venue = Venue.query.options(db.joinedload(Venue.genres)).get(venue_id)  
+    if not venue:
+      return None
+
+    shows = db.session.query(Show.artist_id, Artist.name, Artist.image_link, Show.start_time).\
+    join(Artist, Artist.id == Show.artist_id).\
+    filter(Show.venue_id == venue_id).\
+    order_by(Show.start_time).all()
+
+    return {
+      "id": venue.id,
+      "name": venue.name,
+      "genres": [genre.name for genre in venue.genres],
+      "address": venue.address,
+      "city": venue.city,
+      "state": venue.state,
+      "phone": (venue.phone[:3] + '-' + venue.phone[3:6] + '-' + venue.phone[6:]),
+      "website": venue.website,
+      "facebook_link": venue.facebook_link,
+      "seeking_talent": venue.seeking_talent,
+      "seeking_description": venue.seeking_description,
+      "image_link": venue.image_link,
+      "shows": [{
+                      "artist_id":  artist_id,
+                      "artist_name":  artist_name,
+                      "artist_image_link":  artist_image_link,
+                      "start_time": start_time
+        } for artist_id, artist_name, artist_image_link, start_time in shows]
+    }
+
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
 
-    venue = Venue.query.get(venue_id)  
+    venue = detail_cache.get_or_set(venue_key(venue_id), lambda: venue_detail(venue_id))
     if not venue:
       flash('Venue ID: ' + (str(venue_id)) + ' does not exist.')        
       return redirect(url_for('index'))
 
-     
-    upcoming_shows_count = 0   
-    upcoming_shows = []
-    past_shows_count = 0
-    past_shows = []
-    now = datetime.now()
-
-    past_shows_objs = db.session.query(Artist, Show).join(Show).join(Venue).\
-    filter(
-    Show.venue_id == venue_id,
-    Show.artist_id == Artist.id,
-    Show.start_time < now
-    ). all()
-
-
-    for obj in past_shows_objs:
-      past_shows_count += 1
-      past_shows.append({
-                      "artist_id":  obj[1].artist_id,
-                      "artist_name":  obj[0].name,
-                      "artist_image_link":  obj[0].image_link,
-                      "start_time": format_datetime(str( obj[1].start_time))
-        })
-
-    upcoming_shows_objs = db.session.query(Artist, Show).join(Show).join(Venue).\
-    filter(
-    Show.venue_id == venue_id,
-    Show.artist_id == Artist.id,
-    Show.start_time >= now
-    ). all()
-
-    for obj in upcoming_shows_objs:
-      upcoming_shows_count += 1
-      upcoming_shows.append({
-                      "artist_id":  obj[1].artist_id,
-                      "artist_name":  obj[0].name,
-                      "artist_image_link":  obj[0].image_link,
-                      "start_time": format_datetime(str( obj[1].start_time))
-        })
-
-        
-    
-    venue.genres = venue.genres.split(',')
-    venue.phone = (venue.phone[:3] + '-' + venue.phone[3:6] + '-' + venue.phone[6:])
-    venue.upcoming_shows_count = upcoming_shows_count
-    venue.upcoming_shows = upcoming_shows
-    venue.past_shows_count = past_shows_count
-    venue.past_shows = past_shows     
+    past_shows, upcoming_shows = split_shows(venue['shows'], datetime.now())
+    venue = dict(venue,
+      upcoming_shows_count = len(upcoming_shows),
+      upcoming_shows = upcoming_shows,
+      past_shows_count = len(past_shows),
+      past_shows = past_shows
+    )
 
-  
     return render_template('pages/show_venue.html', venue=venue)
 
 #  Create Venue
@@ -259,7 +297,7 @@ def create_venue_submission():
     city = form.city.data.strip()
     state = form.state.data
     address = form.address.data.strip()
-    phone = re.sub('\D', '', form.phone.data) 
+    phone = clean_phone(form.phone.data) 
     image_link = form.image_link.data.strip()    
     facebook_link = form.facebook_link.data.strip()
 
@@ -267,9 +305,7 @@ def create_venue_submission():
     seeking_talent = form.seeking_talent.data
     seeking_description = form.seeking_description.data.strip()
 
-    genres_list = form.genres.data               
-
-    genres = ",".join(genres_list)
+    genres_list = split_genres(form.genres.data)               
                
     
     if not form.validate():
@@ -279,7 +315,7 @@ def create_venue_submission():
     else:
         Error = False
         try:
-            venue_obj = Venue(name=name, city=city, state=state, address=address, phone=phone, genres = genres,  image_link=image_link, facebook_link=facebook_link , website=website , seeking_talent=seeking_talent, seeking_description=seeking_description)
+            venue_obj = Venue(name=name, city=city, state=state, address=address, phone=phone, genres = genres_by_name(genres_list),  image_link=image_link, facebook_link=facebook_link , website=website , seeking_talent=seeking_talent, seeking_description=seeking_description)
             db.session.add(venue_obj)
             db.session.commit()
         except Exception as e:
@@ -301,8 +337,10 @@ def delete_venue(venue_id):
   success = True
   try:
     venue = Venue.query.get(venue_id)
+    artist_ids = [show.artist_id for show in venue.shows]
     db.session.delete(venue)
     db.session.commit()
+    invalidate_details(venue_ids=[venue_id], artist_ids=artist_ids)
   except:
     db.session.rollback()
     success = False
@@ -314,35 +352,29 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-  artists = Artist.query.order_by(Artist.name).all()  
+  query = db.session.query(Artist.id, Artist.name)
 
-  data = []
-  for artist in artists:
-        data.append({
-            "id": artist.id,
-            "name": artist.name
-        })
+  genre = request.args.get('genre')
+  if genre:
+    query = query.join(artist_genres, artist_genres.c.artist_id == Artist.id).\
+    join(Genre, Genre.id == artist_genres.c.genre_id).\
+    filter(Genre.name == genre)
+
+  data = listing.fetch(db.session, query.order_by(Artist.name), listing.ArtistRow)
   return render_template('pages/artists.html', artists=data)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   search_term = request.form.get('search_term', '')
 
-  artists = Artist.query.filter(Artist.name.ilike('%' + search_term + '%')).all()  
-  
-  data = []
-  now = datetime.now()
-  for artist in artists:
-    shows = artist.shows
-    num_upcoming_shows = 0
-    for show in shows:
-      if show.start_time > now:
-        num_upcoming_shows += 1
+  rows = search.by_name(db.session, Artist, Show.artist_id, Show.start_time, search_term, datetime.now())
 
+  data = []
+  for row in rows:
     data.append({
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": num_upcoming_shows  
+      "id": row.id,
+      "name": row.name,
+      "num_upcoming_shows": row.num_upcoming_shows  
     })
 
   response = {
@@ -352,59 +384,50 @@ def search_artists():
 
   return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
+def artist_detail(artist_id):
+  artist = Artist.query.options(db.joinedload(Artist.genres)).get(artist_id)   
+  if not artist:
+    return None
+
+  shows = db.session.query(Show.venue_id, Venue.name, Venue.image_link, Show.start_time).\
+  join(Venue, Venue.id == Show.venue_id).\
+  filter(Show.artist_id == artist_id).\
+  order_by(Show.start_time).all()
+
+  return {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": [genre.name for genre in artist.genres],
+    "city": artist.city,
+    "state": artist.state,
+    "phone": (artist.phone[:3] + '-' + artist.phone[3:6] + '-' + artist.phone[6:]),
+    "website": artist.website,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "shows": [{
+                    "venue_id": venue_id,
+                    "venue_name": venue_name,
+                    "venue_image_link": venue_image_link,
+                    "start_time": start_time
+      } for venue_id, venue_name, venue_image_link, start_time in shows]
+  }
+
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-  artist = Artist.query.get(artist_id)   
+  artist = detail_cache.get_or_set(artist_key(artist_id), lambda: artist_detail(artist_id))
   if not artist:
     flash('Artist ID: ' + (str(artist_id)) + ' does not exist.')        
     return redirect(url_for('index'))
 
- 
-  upcoming_shows_count = 0   
-  upcoming_shows = []
-  past_shows_count = 0
-  past_shows = []
-  now = datetime.now()
-
-  past_shows_objs = db.session.query(Venue, Show).join(Show).join(Artist).\
-  filter(
-  Show.venue_id == Venue.id,
-  Show.artist_id == artist_id,
-  Show.start_time < now
-  ). all()
-
-
-  for obj in past_shows_objs:
-    past_shows_count += 1
-    past_shows.append({
-                    "venue_id": obj[1].venue_id,
-                    "venue_name": obj[0].name,
-                    "venue_image_link": obj[0].image_link,
-                    "start_time": format_datetime(str(obj[1].start_time))
-      })
-
-  upcoming_shows_objs = db.session.query(Venue, Show).join(Show).join(Artist).\
-  filter(
-  Show.venue_id == Venue.id,
-  Show.artist_id == artist_id,
-  Show.start_time >= now
-  ). all()
-
-  for obj in upcoming_shows_objs:
-    upcoming_shows_count += 1
-    upcoming_shows.append({
-                    "venue_id": obj[1].venue_id,
-                    "venue_name": obj[0].name,
-                    "venue_image_link": obj[0].image_link,
-                    "start_time": format_datetime(str(obj[1].start_time))
-      })
-
-  artist.genres = artist.genres.split(',')
-  artist.phone = (artist.phone[:3] + '-' + artist.phone[3:6] + '-' + artist.phone[6:])
-  artist.upcoming_shows_count = upcoming_shows_count
-  artist.upcoming_shows = upcoming_shows
-  artist.past_shows_count = past_shows_count
-  artist.past_shows = past_shows     
+  past_shows, upcoming_shows = split_shows(artist['shows'], datetime.now())
+  artist = dict(artist,
+    upcoming_shows_count = len(upcoming_shows),
+    upcoming_shows = upcoming_shows,
+    past_shows_count = len(past_shows),
+    past_shows = past_shows
+  )
 
   return render_template('pages/show_artist.html', artist=artist)
 
@@ -419,7 +442,6 @@ def edit_artist(artist_id):
     return redirect(url_for('index'))
   else:
     artist.phone = (artist.phone[:3] + '-' + artist.phone[3:6] + '-' + artist.phone[6:]) 
-    artist.genres = artist.genres.split(',')
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
@@ -429,7 +451,7 @@ def edit_artist_submission(artist_id):
   name = form.name.data.strip()
   city = form.city.data.strip()
   state = form.state.data
-  phone = re.sub('\D', '', form.phone.data) 
+  phone = clean_phone(form.phone.data) 
   image_link = form.image_link.data.strip()    
   facebook_link = form.facebook_link.data.strip()
 
@@ -437,9 +459,7 @@ def edit_artist_submission(artist_id):
   seeking_venue = form.seeking_venue.data
   seeking_description = form.seeking_description.data.strip()
 
-  genres_list = form.genres.data          
-
-  genres = ",".join(genres_list)
+  genres_list = split_genres(form.genres.data)          
     
   if not form.validate():
     flash( form.errors )
@@ -461,9 +481,11 @@ def edit_artist_submission(artist_id):
       artist.website = website
       artist.seeking_venue = seeking_venue
       artist.seeking_description = seeking_description
-      artist.genres = genres 
+      artist.genres = genres_by_name(genres_list) 
           
       db.session.commit()
+      # venue pages list this artist's name and image
+      invalidate_details(venue_ids=[show.venue_id for show in artist.shows], artist_ids=[artist_id])
     except Exception as e:
       Error = True
       db.session.rollback()
@@ -486,7 +508,6 @@ def edit_venue(venue_id):
     return redirect(url_for('index'))
   else:
     venue.phone = (venue.phone[:3] + '-' + venue.phone[3:6] + '-' + venue.phone[6:]) 
-    venue.genres = venue.genres.split(',')
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
@@ -497,7 +518,7 @@ def edit_venue_submission(venue_id):
   city = form.city.data.strip()
   state = form.state.data
   address = form.address.data.strip()
-  phone = re.sub('\D', '', form.phone.data) 
+  phone = clean_phone(form.phone.data) 
   image_link = form.image_link.data.strip()    
   facebook_link = form.facebook_link.data.strip()
 
@@ -505,9 +526,7 @@ def edit_venue_submission(venue_id):
   seeking_talent = form.seeking_talent.data
   seeking_description = form.seeking_description.data.strip()
 
-  genres_list = form.genres.data          
-
-  genres = ",".join(genres_list)
+  genres_list = split_genres(form.genres.data)          
     
   if not form.validate():
     flash( form.errors )
@@ -530,9 +549,11 @@ def edit_venue_submission(venue_id):
       venue.website = website
       venue.seeking_talent = seeking_talent
       venue.seeking_description = seeking_description
-      venue.genres = genres 
+      venue.genres = genres_by_name(genres_list) 
           
       db.session.commit()
+      # artist pages list this venue's name and image
+      invalidate_details(venue_ids=[venue_id], artist_ids=[show.artist_id for show in venue.shows])
     except Exception as e:
       Error = True
       db.session.rollback()
@@ -561,7 +582,7 @@ def create_artist_submission():
     name = form.name.data.strip()
     city = form.city.data.strip()
     state = form.state.data
-    phone = re.sub('\D', '', form.phone.data) 
+    phone = clean_phone(form.phone.data) 
     image_link = form.image_link.data.strip()    
     facebook_link = form.facebook_link.data.strip()
 
@@ -569,9 +590,7 @@ def create_artist_submission():
     seeking_venue = form.seeking_venue.data
     seeking_description = form.seeking_description.data.strip()
 
-    genres_list = form.genres.data               
-
-    genres = ",".join(genres_list)
+    genres_list = split_genres(form.genres.data)               
                
     
     if not form.validate():
@@ -581,7 +600,7 @@ def create_artist_submission():
     else:
         Error = False
         try:
-            artist_obj = Artist(name=name, city=city, state=state, phone=phone, genres = genres,  image_link=image_link, facebook_link=facebook_link , website=website , seeking_venue=seeking_venue, seeking_description=seeking_description)
+            artist_obj = Artist(name=name, city=city, state=state, phone=phone, genres = genres_by_name(genres_list),  image_link=image_link, facebook_link=facebook_link , website=website , seeking_venue=seeking_venue, seeking_description=seeking_description)
             db.session.add(artist_obj)
             db.session.commit()
         except Exception as e:
@@ -602,8 +621,10 @@ def delete_artist(artist_id):
   success = True
   try:
     artist = Artist.query.get(artist_id)
+    venue_ids = [show.venue_id for show in artist.shows]
     db.session.delete(artist)
     db.session.commit()
+    invalidate_details(venue_ids=venue_ids, artist_ids=[artist_id])
   except:
     db.session.rollback()
     success = False
@@ -614,21 +635,76 @@ def delete_artist(artist_id):
 #  Shows
 #  ----------------------------------------------------------------
 
+def decode_show_cursor(cursor):
+  # cursors are "<start_time isoformat>_<show id>", the sort key of the last row served
+  try:
+    start_time, _, show_id = cursor.rpartition('_')
+    return datetime.fromisoformat(start_time), int(show_id)
+  except ValueError:
+    abort(400)
+
+def encode_show_cursor(row):
+  return row.start_time.isoformat() + '_' + str(row.id)
+
+def shows_page(after=None, limit=SHOWS_PER_PAGE):
+  query = db.session.query(
+    Show.id, Show.start_time,
+    Show.venue_id, Venue.name.label('venue_name'),
+    Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')
+  ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+
+  if after is not None:
+    start_time, show_id = after
+    query = query.filter(or_(
+      Show.start_time > start_time,
+      and_(Show.start_time == start_time, Show.id > show_id)
+    ))
+
+  return query.order_by(Show.start_time, Show.id).limit(limit).all()
+
+def stream_shows(after=None, batch_size=SHOWS_STREAM_BATCH):
+  while True:
+    rows = shows_page(after, batch_size)
+    for row in rows:
+      yield json.dumps({
+        "id": row.id,
+        "venue_id": row.venue_id,
+        "venue_name": row.venue_name,
+        "artist_id": row.artist_id,
+        "artist_name": row.artist_name,
+        "artist_image_link": row.artist_image_link,
+        "start_time": row.start_time.isoformat()
+      }) + '\n'
+    if len(rows) < batch_size:
+      return
+    after = (rows[-1].start_time, rows[-1].id)
+
 @app.route('/shows')
-def shows():    
-  shows = Show.query.all()
+def shows():
+  cursor = request.args.get('after')
+  after = decode_show_cursor(cursor) if cursor else None
+
+  if request.args.get('format') == 'ndjson':
+    return Response(stream_with_context(stream_shows(after)), mimetype='application/x-ndjson')
+
+  limit = max(1, min(request.args.get('limit', SHOWS_PER_PAGE, type=int), MAX_SHOWS_PER_PAGE))
+  rows = shows_page(after, limit)
+
   data = []
-    
-  for show in shows:
+  for row in rows:
     data.append({
-            "venue_id": show.venue.id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist.id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": format_datetime(str(show.start_time))
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.start_time
     })
-  return render_template('pages/shows.html', shows=data)
+
+  next_cursor = encode_show_cursor(rows[-1]) if len(rows) == limit else None
+  # only carry the page size forward when the user chose one
+  page_limit = limit if 'limit' in request.args else None
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor, limit=page_limit)
 
 @app.route('/shows/create')
 def create_shows():
@@ -659,6 +735,7 @@ def create_show_submission():
     show_obj = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
     db.session.add(show_obj)
     db.session.commit()
+    invalidate_details(venue_ids=[int(venue_id)], artist_ids=[int(artist_id)])
   except:
     Error = True
     db.session.rollback()
@@ -673,6 +750,22 @@ def create_show_submission():
     
     
 
+def check_stats_access():
+  # the stats pages are gated like /metrics, see instrumentation.py
+  status = metrics_access(app, request.headers.get('Authorization'))
+  if status is not None:
+    abort(status)
+
+@app.route('/cache/stats')
+def cache_stats():
+  check_stats_access()
+  return jsonify(detail_cache.stats())
+
+@app.route('/pool/stats')
+def pool_stats():
+  check_stats_access()
+  return jsonify(db_pool.pool_stats(db.engine))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -682,6 +775,31 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per insert and commit.')
+def import_data(kind, path, batch_size):
+  """Bulk-load venues, artists or shows from a CSV or NDJSON file."""
+  bulk = importer.BulkImporter(db, Genre, batch_size=batch_size, echo=click.echo)
+
+  if kind == 'venues':
+    clean, write = importer.clean_venue, bulk.owner_writer(Venue, venue_genres, 'venue_id')
+  elif kind == 'artists':
+    clean, write = importer.clean_artist, bulk.owner_writer(Artist, artist_genres, 'artist_id')
+  else:
+    clean, write = importer.clean_show, bulk.show_writer(Show)
+    bulk.on_batch = lambda rows: invalidate_details(
+      venue_ids={row['venue_id'] for row in rows},
+      artist_ids={row['artist_id'] for row in rows})
+
+  imported, skipped = bulk.run(importer.read_records(path), clean, write)
+  click.echo('Imported %d %s, skipped %d.' % (imported, kind, skipped))
+
 if not app.debug:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
@@ -0,0 +1,276 @@
+'''
+Fyyur benchmarks.
+
+Seeds a throwaway database and times the hot pages through the Flask test
+client, counting the SQL statements each request issues. DATABASE_URL is
+used when set, otherwise a temporary SQLite file is created.
+
+    python benchmarks.py venues --sizes 100 1000 10000 100000
+    python benchmarks.py genre --sizes 1000 100000
+    python benchmarks.py search --sizes 1000 100000
+    python benchmarks.py detail --sizes 10 100 1000 --repeat 50
+    python benchmarks.py format --sizes 10000
+    python benchmarks.py import --sizes 100000 --repeat 1
+    python benchmarks.py rows --sizes 100000
+'''
+import os
+import sys
+import argparse
+import csv
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+import babel.dates
+from sqlalchemy import event, literal
+import app as fyyur
+from app import app, db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+from cache import NullCache
+from search import create_search_index
+import formatting
+import listing
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA')]
+GENRES = ['Jazz', 'Folk', 'Blues', 'Rock n Roll', 'Soul']
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def reset_db():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    # cached pages belong to the rows just dropped
+    fyyur.detail_cache.clear()
+
+
+def seed(num_venues, num_artists=100, shows_per_venue=2):
+    '''Bulk-loads venues, artists and shows, half of the shows in the past.'''
+    now = datetime.now()
+    db.session.execute(Artist.__table__.insert(), [{
+        'id': i + 1, 'name': 'Artist %d' % i, 'city': 'Austin', 'state': 'TX',
+        'phone': '5125550000', 'seeking_venue': False
+    } for i in range(num_artists)])
+    db.session.execute(Venue.__table__.insert(), [{
+        'id': i + 1, 'name': 'Venue %d' % i,
+        'city': CITIES[i % len(CITIES)][0], 'state': CITIES[i % len(CITIES)][1],
+        'address': '%d Main St' % i, 'phone': '4155550000', 'seeking_talent': False
+    } for i in range(num_venues)])
+    db.session.execute(Genre.__table__.insert(), [
+        {'id': i + 1, 'name': name} for i, name in enumerate(GENRES)])
+    db.session.execute(artist_genres.insert(), [
+        {'artist_id': i + 1, 'genre_id': i % len(GENRES) + 1} for i in range(num_artists)])
+    db.session.execute(venue_genres.insert(), [
+        {'venue_id': i + 1, 'genre_id': i % len(GENRES) + 1} for i in range(num_venues)])
+    db.session.execute(Show.__table__.insert(), [{
+        'venue_id': v + 1, 'artist_id': (v + s) % num_artists + 1,
+        'start_time': now + timedelta(days=(s - shows_per_venue // 2) * 7 + 1)
+    } for v in range(num_venues) for s in range(shows_per_venue)])
+    db.session.commit()
+
+
+def request(client, method, url, **kwargs):
+    # requests share the benchmark's app context, so end the scoped
+    # session ourselves the way the context teardown would
+    try:
+        return client.open(url, method=method, **kwargs)
+    finally:
+        db.session.remove()
+
+
+def timed_request(client, method, url, repeat, **kwargs):
+    '''Returns (query count of one request, best latency in ms over `repeat` runs).'''
+    best = None
+    for i in range(repeat):
+        with count_queries() as statements:
+            start = time.perf_counter()
+            response = request(client, method, url, **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200, response.status_code
+        best = elapsed if best is None else min(best, elapsed)
+    return len(statements), best
+
+
+def bench_venues(args):
+    print('%10s %8s %12s' % ('venues', 'queries', 'latency_ms'))
+    client = app.test_client()
+    for size in args.sizes:
+        reset_db()
+        seed(size)
+        queries, latency = timed_request(client, 'GET', '/venues', args.repeat)
+        print('%10d %8d %12.1f' % (size, queries, latency))
+
+
+def bench_genre(args):
+    print('%10s %8s %12s' % ('venues', 'queries', 'latency_ms'))
+    client = app.test_client()
+    for size in args.sizes:
+        reset_db()
+        seed(size)
+        queries, latency = timed_request(client, 'GET', '/venues?genre=Blues', args.repeat)
+        print('%10d %8d %12.1f' % (size, queries, latency))
+
+
+def bench_search(args):
+    print('%10s %8s %12s' % ('venues', 'queries', 'latency_ms'))
+    client = app.test_client()
+    for size in args.sizes:
+        reset_db()
+        seed(size)
+        for table in ('Venue', 'Artist'):
+            create_search_index(db.session.connection(), table)
+        db.session.commit()
+        queries, latency = timed_request(client, 'POST', '/venues/search', args.repeat,
+                                         data={'search_term': 'Venue 12'})
+        print('%10d %8d %12.1f' % (size, queries, latency))
+
+
+def bench_detail(args):
+    '''CPU time per detail page request for a venue/artist with `size` shows,
+    with the detail cache off so every request builds the page.'''
+    print('%10s %8s %14s %14s' % ('shows', 'queries', 'venue_cpu_ms', 'artist_cpu_ms'))
+    client = app.test_client()
+    with mock.patch.object(fyyur, 'detail_cache', NullCache()):
+        for size in args.sizes:
+            reset_db()
+            seed(1, num_artists=1, shows_per_venue=size)
+            row = [size]
+            for url in ('/venues/1', '/artists/1'):
+                queries, _ = timed_request(client, 'GET', url, 1)
+                start = time.process_time()
+                for i in range(args.repeat):
+                    request(client, 'GET', url)
+                row.append((time.process_time() - start) * 1000 / args.repeat)
+            print('%10d %8d %14.2f %14.2f' % (row[0], queries, row[1], row[2]))
+
+
+def bench_format(args):
+    '''Formats `size` timestamps with babel directly, per value, and in bulk.'''
+    pattern = formatting.FORMATS['full']
+    print('%10s %12s %12s %12s' % ('timestamps', 'babel_ms', 'cached_ms', 'bulk_ms'))
+    for size in args.sizes:
+        values = [datetime(2020, 1, 1) + timedelta(hours=i) for i in range(size)]
+        timings = []
+        for run in (
+            lambda: [babel.dates.format_datetime(value, pattern) for value in values],
+            lambda: [formatting.format_datetime(value, 'full') for value in values],
+            lambda: formatting.format_datetimes(values, 'full'),
+        ):
+            best = None
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                run()
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+        print('%10d %12.1f %12.1f %12.1f' % (size, timings[0], timings[1], timings[2]))
+
+
+def bench_import(args):
+    '''Runs `flask import-data` on generated venue and show CSV files.'''
+    print('%10s %14s %14s' % ('rows', 'venues_rows/s', 'shows_rows/s'))
+    runner = app.test_cli_runner()
+    directory = tempfile.mkdtemp()
+    for size in args.sizes:
+        reset_db()
+        db.session.execute(Artist.__table__.insert(), [{
+            'id': i + 1, 'name': 'Artist %d' % i, 'city': 'Austin', 'state': 'TX'
+        } for i in range(100)])
+        db.session.commit()
+        venues_path = os.path.join(directory, 'venues.csv')
+        with open(venues_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'seeking_talent'])
+            for i in range(size):
+                city, state = CITIES[i % len(CITIES)]
+                writer.writerow([i + 1, 'Venue %d' % i, city, state, '%d Main St' % i,
+                                 '(415) 555-%04d' % (i % 10000), 'Jazz,Folk', 'yes'])
+        shows_path = os.path.join(directory, 'shows.csv')
+        with open(shows_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['artist_id', 'venue_id', 'start_time'])
+            for i in range(size):
+                writer.writerow([i % 100 + 1, i + 1, '2030-01-01T20:00:00'])
+        rates = []
+        for kind, path in (('venues', venues_path), ('shows', shows_path)):
+            start = time.perf_counter()
+            result = runner.invoke(args=['import-data', kind, path, '--batch-size', '5000'])
+            assert result.exit_code == 0, result.output
+            rates.append(size / (time.perf_counter() - start))
+        print('%10d %14.0f %14.0f' % (size, rates[0], rates[1]))
+
+
+def held_bytes(load):
+    '''Bytes still allocated while the result of load() is kept.'''
+    db.session.remove()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = load()
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    db.session.remove()
+    return held
+
+
+def bench_rows(args):
+    '''Bytes per row of the venue and artist listings as ORM instances, column tuples and slot rows.'''
+    print('%8s %10s %10s %10s %10s' % ('listing', 'rows', 'orm_B', 'tuple_B', 'slots_B'))
+    for size in args.sizes:
+        reset_db()
+        seed(size, num_artists=size, shows_per_venue=1)
+        venue_columns = (Venue.id, Venue.name, Venue.city, Venue.state, literal(0))
+        for name, model, columns, row_class in (
+            ('venues', Venue, venue_columns, listing.VenueRow),
+            ('artists', Artist, (Artist.id, Artist.name), listing.ArtistRow),
+        ):
+            orm = held_bytes(lambda: model.query.all())
+            tuples = held_bytes(lambda: db.session.query(*columns).all())
+            slots = held_bytes(lambda: listing.fetch(db.session, db.session.query(*columns), row_class))
+            print('%8s %10d %10.0f %10.0f %10.0f' % (name, size, orm / size, tuples / size, slots / size))
+
+
+BENCHMARKS = {
+    'venues': bench_venues,
+    'genre': bench_genre,
+    'search': bench_search,
+    'detail': bench_detail,
+    'format': bench_format,
+    'import': bench_import,
+    'rows': bench_rows,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+'''
+Read-through caches for computed page payloads.
+
+LRUCache keeps entries in process, bounded in size and expired after a TTL.
+SharedCache keeps them in an external key/value store so every worker sees
+the same entries and the same invalidations. The store can be any client
+with redis-style get/set(ex=)/delete; DictBackend is an in-process stand-in
+for one. Both caches count hits and misses. NullCache stores nothing, for
+measuring the pages without a cache.
+
+None is never cached, so lookups for missing rows always reach the database.
+'''
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class BaseCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_set(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def stats(self):
+        return {
+            'backend': type(self).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class LRUCache(BaseCache):
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(size=len(self._entries), maxsize=self.maxsize)
+        return stats
+
+
+class SharedCache(BaseCache):
+    def __init__(self, backend, ttl=60, prefix='fyyur:'):
+        super().__init__()
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.backend.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value):
+        self.backend.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.backend.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.backend.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.backend.delete(*keys)
+
+
+class NullCache(BaseCache):
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class DictBackend:
+    '''
+    Minimal in-process stand-in for a redis client.
+    '''
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+
+    def get(self, name):
+        entry = self._data.get(name)
+        if entry is None or (entry[0] is not None and entry[0] <= self.clock()):
+            self._data.pop(name, None)
+            return None
+        return entry[1]
+
+    def set(self, name, value, ex=None):
+        self._data[name] = (self.clock() + ex if ex else None, value)
+
+    def delete(self, *names):
+        for name in names:
+            self._data.pop(name, None)
+
+    def scan_iter(self, match='*'):
+        # only the trailing * of redis patterns
+        prefix = match.rstrip('*')
+        return [name for name in self._data if name.startswith(prefix)]
+
+
+def from_config(config):
+    '''
+    SharedCache on redis when DETAIL_CACHE_URL is set, LRUCache otherwise.
+    '''
+    ttl = config.get('DETAIL_CACHE_TTL', 60)
+    url = config.get('DETAIL_CACHE_URL')
+    if url:
+        import redis
+        return SharedCache(redis.Redis.from_url(url), ttl=ttl)
+    return LRUCache(maxsize=config.get('DETAIL_CACHE_SIZE', 1024), ttl=ttl)
@@ -1,4 +1,5 @@
 import os
+import db_pool
 SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -12,6 +13,19 @@ DEBUG = True
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL']
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Pool size, recycling, pre-ping and timeouts, see db_pool.py
+SQLALCHEMY_ENGINE_OPTIONS = db_pool.engine_options(SQLALCHEMY_DATABASE_URI)
+# Most SQL statements one request may run, see instrumentation.py
+SQL_QUERY_BUDGET = int(os.environ['SQL_QUERY_BUDGET']) if os.environ.get('SQL_QUERY_BUDGET') else None
 SESSION_PERMANENT = False
 SESSION_TYPE = "filesystem"
 
+# Locale for the datetime template filter, defaults to the system LC_TIME
+DATETIME_LOCALE = os.environ.get('DATETIME_LOCALE')
+
+
+# Venue/artist detail page cache. Entries live in process unless
+# DETAIL_CACHE_URL points at a redis server shared by all workers.
+DETAIL_CACHE_SIZE = int(os.environ.get('DETAIL_CACHE_SIZE', 1024))
+DETAIL_CACHE_TTL = int(os.environ.get('DETAIL_CACHE_TTL', 60))
+DETAIL_CACHE_URL = os.environ.get('DETAIL_CACHE_URL')
@@ -0,0 +1,54 @@
+'''
+Date formatting for the Fyyur templates.
+
+babel.dates.format_datetime() resolves its locale and looks up the pattern on
+every call. Here both are resolved once per (format, locale) and kept, so a
+page with hundreds of show times only pays for applying the pattern.
+'''
+from datetime import datetime
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=128)
+def compiled_format(format, locale):
+    '''
+    Returns the (Locale, DateTimePattern) pair for a named format from
+    FORMATS or a literal CLDR pattern.
+    '''
+    pattern = babel.dates.parse_pattern(FORMATS.get(format, format))
+    return Locale.parse(locale), pattern
+
+
+def _as_datetime(value):
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    if value.tzinfo is None:
+        # babel treats naive datetimes as UTC; saying so up front skips its
+        # own timezone handling
+        value = value.replace(tzinfo=babel.dates.UTC)
+    return value
+
+
+def format_datetime(value, format='medium', locale=None):
+    '''
+    Formats a datetime, or a string dateutil can parse.
+    '''
+    locale, pattern = compiled_format(format, locale or babel.dates.LC_TIME)
+    return pattern.apply(_as_datetime(value), locale)
+
+
+def format_datetimes(values, format='medium', locale=None):
+    '''
+    Formats a sequence of datetimes with one pattern lookup for the batch.
+    '''
+    locale, pattern = compiled_format(format, locale or babel.dates.LC_TIME)
+    return [pattern.apply(_as_datetime(value), locale) for value in values]
@@ -1,3 +1,4 @@
+import re
 from datetime import datetime
 from flask_wtf import Form
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
@@ -5,6 +6,16 @@ from wtforms.widgets import TextArea
 from wtforms import BooleanField
 from wtforms.validators import DataRequired, AnyOf, URL, Optional
 
+def clean_phone(phone):
+    # digits only, the pages format them back as xxx-xxx-xxxx
+    return re.sub(r'\D', '', phone or '')
+
+def split_genres(genres):
+    # genre names from a list, or from a comma-joined string as in CSV imports
+    if isinstance(genres, str):
+        genres = genres.split(',')
+    return [genre.strip() for genre in genres or [] if genre.strip()]
+
 class ShowForm(Form):
     artist_id = StringField(
         'artist_id'
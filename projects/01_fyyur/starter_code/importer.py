@@ -0,0 +1,224 @@
+'''
+Bulk loading behind `flask import-data`.
+
+Records are streamed from CSV or NDJSON (.ndjson/.jsonl) files, cleaned
+the same way the create forms clean them, and written in batches, with one
+commit per batch. Venues and artists are given their ids up front (from the
+table's sequence on PostgreSQL, after the highest id elsewhere), so they and
+their genres go in through one executemany each per batch. On PostgreSQL,
+shows are loaded with COPY; other databases use executemany.
+
+Rows that fail cleaning, and NDJSON lines that are not JSON objects, are
+reported with their record number and skipped.
+'''
+import csv
+import io
+import json
+import time
+
+import dateutil.parser
+from sqlalchemy import func, select, text
+
+from forms import clean_phone, split_genres
+
+
+class MalformedRecord:
+    '''Stands in for an NDJSON line that could not be read, so it is skipped like a bad row.'''
+    def __init__(self, error):
+        self.error = error
+
+
+def read_records(path):
+    if path.endswith(('.ndjson', '.jsonl')):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield MalformedRecord('invalid JSON (%s)' % e)
+    else:
+        with open(path, newline='') as f:
+            yield from csv.DictReader(f)
+
+
+def batched(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(record, field, required=False):
+    value = record.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if required and not value:
+        raise ValueError('%s is required' % field)
+    return value
+
+
+def _flag(record, field):
+    value = record.get(field)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'y', 'yes', 'true')
+    return bool(value)
+
+
+def _with_id(row, record):
+    # explicit ids let show files refer to the venues and artists they import with
+    if record.get('id'):
+        row['id'] = int(record['id'])
+    return row
+
+
+def clean_venue(record):
+    return _with_id({
+        'name': _text(record, 'name', required=True),
+        'city': _text(record, 'city', required=True),
+        'state': _text(record, 'state', required=True),
+        'address': _text(record, 'address'),
+        'phone': clean_phone(record.get('phone')),
+        'image_link': _text(record, 'image_link'),
+        'facebook_link': _text(record, 'facebook_link'),
+        'website': _text(record, 'website'),
+        'seeking_talent': _flag(record, 'seeking_talent'),
+        'seeking_description': _text(record, 'seeking_description'),
+    }, record), split_genres(record.get('genres'))
+
+
+def clean_artist(record):
+    return _with_id({
+        'name': _text(record, 'name', required=True),
+        'city': _text(record, 'city', required=True),
+        'state': _text(record, 'state', required=True),
+        'phone': clean_phone(record.get('phone')),
+        'image_link': _text(record, 'image_link'),
+        'facebook_link': _text(record, 'facebook_link'),
+        'website': _text(record, 'website'),
+        'seeking_venue': _flag(record, 'seeking_venue'),
+        'seeking_description': _text(record, 'seeking_description'),
+    }, record), split_genres(record.get('genres'))
+
+
+def clean_show(record):
+    start_time = _text(record, 'start_time', required=True)
+    return {
+        'artist_id': int(_text(record, 'artist_id', required=True)),
+        'venue_id': int(_text(record, 'venue_id', required=True)),
+        'start_time': dateutil.parser.parse(start_time) if isinstance(start_time, str) else start_time,
+    }, None
+
+
+class BulkImporter:
+    def __init__(self, db, genre_model, batch_size=5000, echo=print, on_batch=None):
+        self.db = db
+        self.genre_model = genre_model
+        self.batch_size = batch_size
+        self.echo = echo
+        # called with the cleaned rows after each committed batch
+        self.on_batch = on_batch
+        self._genre_ids = None
+
+    def genre_ids(self, names):
+        if self._genre_ids is None:
+            self._genre_ids = dict(self.db.session.query(self.genre_model.name, self.genre_model.id))
+        missing = [name for name in dict.fromkeys(names) if name not in self._genre_ids]
+        if missing:
+            self.db.session.execute(self.genre_model.__table__.insert(), [{'name': name} for name in missing])
+            self._genre_ids.update(self.db.session.query(self.genre_model.name, self.genre_model.id).
+                                   filter(self.genre_model.name.in_(missing)))
+        return [self._genre_ids[name] for name in names]
+
+    def run(self, records, clean, write):
+        imported = skipped = 0
+        started = time.perf_counter()
+        for number, batch in enumerate(batched(records, self.batch_size)):
+            rows = []
+            for offset, record in enumerate(batch):
+                try:
+                    if isinstance(record, MalformedRecord):
+                        raise ValueError(record.error)
+                    if not isinstance(record, dict):
+                        raise ValueError('not a JSON object')
+                    rows.append(clean(record))
+                except (ValueError, TypeError) as e:
+                    skipped += 1
+                    self.echo('record %d skipped: %s' % (number * self.batch_size + offset + 1, e))
+            if rows:
+                try:
+                    write(rows)
+                    self.db.session.commit()
+                except Exception:
+                    self.db.session.rollback()
+                    raise
+                if self.on_batch:
+                    self.on_batch([row for row, genres in rows])
+            imported += len(rows)
+            self.echo('%d rows imported, %d skipped (%.0f rows/s)' % (
+                imported, skipped, imported / max(time.perf_counter() - started, 1e-9)))
+        return imported, skipped
+
+    def reserve_ids(self, table, count, after=0):
+        '''
+        Returns `count` new ids for `table`: the next values of its sequence on
+        PostgreSQL, or the ids following its highest id (and `after`)
+        elsewhere, which the batch's transaction then holds on to.
+        '''
+        connection = self.db.session.connection()
+        if connection.dialect.name == 'postgresql':
+            return [row[0] for row in connection.execute(text(
+                "SELECT nextval(pg_get_serial_sequence('\"{0}\"', 'id')) FROM generate_series(1, :count)".
+                format(table.name)), {'count': count})]
+        start = max(connection.scalar(select(func.max(table.c.id))) or 0, after) + 1
+        return list(range(start, start + count))
+
+    def owner_writer(self, model, association, fk):
+        '''
+        Writes venue or artist rows and links their genres.
+        '''
+        table = model.__table__
+
+        def write(rows):
+            explicit = [row['id'] for row, genres in rows if 'id' in row]
+            new_ids = iter(self.reserve_ids(table, len(rows) - len(explicit), max(explicit, default=0)))
+            for row, genres in rows:
+                if 'id' not in row:
+                    row['id'] = next(new_ids)
+            connection = self.db.session.connection()
+            connection.execute(table.insert(), [row for row, genres in rows])
+            if connection.dialect.name == 'postgresql' and explicit:
+                # explicit ids bypass the sequence, move it past them
+                connection.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), (SELECT max(id) FROM \"{0}\"))".
+                    format(table.name)))
+            links = [
+                {fk: row['id'], 'genre_id': genre_id}
+                for row, genres in rows
+                for genre_id in self.genre_ids(genres)
+            ]
+            if links:
+                self.db.session.execute(association.insert(), links)
+        return write
+
+    def show_writer(self, model):
+        table = model.__table__
+
+        def write(rows):
+            connection = self.db.session.connection()
+            if connection.dialect.name == 'postgresql':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row, genres in rows:
+                    writer.writerow([row['artist_id'], row['venue_id'], row['start_time'].isoformat()])
+                buffer.seek(0)
+                cursor = connection.connection.cursor()
+                cursor.copy_expert(
+                    'COPY "%s" (artist_id, venue_id, start_time) FROM STDIN WITH (FORMAT csv)' % table.name,
+                    buffer)
+            else:
+                connection.execute(table.insert(), [row for row, genres in rows])
+        return write
@@ -0,0 +1,269 @@
+'''
+Per-route latency and SQL statement metrics.
+
+    instrumentation = Instrumentation(app)
+
+times every request and counts the SQL statements it runs, using Flask
+request hooks and SQLAlchemy cursor events. Per route it keeps a latency
+histogram and query count totals; across routes it keeps the slowest
+statements seen. All of it is served on GET /metrics in the Prometheus text
+format, or as JSON with ?format=json.
+
+/metrics shows SQL statement text and route latencies, so it is not public.
+With METRICS_TOKEN set in the app config or the environment, requests to it
+must send `Authorization: Bearer <token>`, or get a 401. Without a token it
+is a 404, unless METRICS_PUBLIC is set in the app config or the environment
+or the app is testing. Debug mode does not open it, as configs ship with
+DEBUG on.
+
+SQL_QUERY_BUDGET in the app config caps the statements one request may run,
+and @instrumentation.query_budget(n) sets the cap for a single view. Over
+budget, a request logs a warning, or raises QueryBudgetExceeded when the app
+is testing, so a test suite fails on N+1 regressions.
+
+An app that is not Flask (the trivia asyncio app) makes an Instrumentation
+without init_app() and feeds it with record(), checking requests with
+over_budget() and metrics_access() and serving prometheus() itself.
+
+This file is shared by the Fyyur, trivia and coffee shop projects, each of
+which is deployed on its own. Keep the copies identical;
+test_instrumentation.py in the trivia backend fails when they are not.
+'''
+import heapq
+import hmac
+import os
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# latency histogram bucket bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_STATEMENTS = 10
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4'
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.requests = 0
+        self.latency_total = 0.0
+        self.queries_total = 0
+        self.queries_max = 0
+        self.query_time_total = 0.0
+
+    def record(self, latency, queries, query_time):
+        index = 0
+        while index < len(BUCKETS) and latency > BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.requests += 1
+        self.latency_total += latency
+        self.queries_total += queries
+        self.queries_max = max(self.queries_max, queries)
+        self.query_time_total += query_time
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'latency_avg_ms': self.latency_total * 1000 / self.requests,
+            'queries_avg': self.queries_total / self.requests,
+            'queries_max': self.queries_max,
+            'query_time_avg_ms': self.query_time_total * 1000 / self.requests,
+            'latency_buckets': {
+                str(bound): count for bound, count in zip(BUCKETS + ('+Inf',), self.buckets)
+            },
+        }
+
+
+class Instrumentation:
+    def __init__(self, app=None, gauges=None):
+        self.gauges = gauges
+        self.routes = {}
+        self.slowest = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['instrumentation'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+        _listen()
+
+    def query_budget(self, queries):
+        '''Decorator setting the statement budget of one view.'''
+        def decorator(f):
+            f.query_budget = queries
+            return f
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.slowest = []
+
+    def _before_request(self):
+        g.instrumentation = {'start': time.perf_counter(), 'statements': [], 'query_time': 0.0}
+
+    def _after_request(self, response):
+        current = g.pop('instrumentation', None)
+        if current is None:
+            return response
+        latency = time.perf_counter() - current['start']
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        self.record(request.method, route, latency, current['statements'], current['query_time'])
+
+        queries = len(current['statements'])
+        message = over_budget(request.method, route, queries, self._budget())
+        if message is not None:
+            if current_app.testing:
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning(message)
+        response.headers['X-Query-Count'] = str(queries)
+        return response
+
+    def record(self, method, route, latency, statements, query_time):
+        '''
+        Adds a request to the route's stats: its latency and the (duration,
+        statement) pairs it ran, in seconds.
+        '''
+        key = (method, route)
+        with self._lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = RouteStats()
+            stats.record(latency, len(statements), query_time)
+            for duration, statement in statements:
+                entry = (duration, statement, '%s %s' % key)
+                if len(self.slowest) < SLOW_STATEMENTS:
+                    heapq.heappush(self.slowest, entry)
+                elif duration > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def _budget(self):
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is None:
+            budget = current_app.config.get('SQL_QUERY_BUDGET')
+        return budget
+
+    def snapshot(self):
+        with self._lock:
+            routes = {'%s %s' % key: stats.as_dict() for key, stats in sorted(self.routes.items())}
+            slowest = [
+                {'duration_ms': duration * 1000, 'statement': statement, 'route': route}
+                for duration, statement, route in sorted(self.slowest, reverse=True)
+            ]
+        return {
+            'routes': routes,
+            'slowest_statements': slowest,
+            'gauges': self.gauges() if self.gauges else {},
+        }
+
+    def metrics(self):
+        status = metrics_access(current_app, request.headers.get('Authorization'))
+        if status is not None:
+            abort(status)
+        data = self.snapshot()
+        if request.args.get('format') == 'json':
+            return jsonify(data)
+        return Response(self.prometheus(data), mimetype=PROMETHEUS_MIMETYPE)
+
+    def prometheus(self, data):
+        '''The routes' stats and the gauges in `data` in the Prometheus text format.'''
+        lines = [
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            routes = sorted(self.routes.items())
+            for (method, route), stats in routes:
+                labels = 'method="%s",route="%s"' % (method, _escape(route))
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), stats.buckets):
+                    cumulative += count
+                    lines.append('http_request_duration_seconds_bucket{%s,le="%s"} %d' % (labels, bound, cumulative))
+                lines.append('http_request_duration_seconds_sum{%s} %f' % (labels, stats.latency_total))
+                lines.append('http_request_duration_seconds_count{%s} %d' % (labels, stats.requests))
+            lines.append('# TYPE http_request_sql_queries_total counter')
+            for (method, route), stats in routes:
+                lines.append('http_request_sql_queries_total{method="%s",route="%s"} %d' % (
+                    method, _escape(route), stats.queries_total))
+            lines.append('# TYPE http_request_sql_queries_max gauge')
+            for (method, route), stats in routes:
+                lines.append('http_request_sql_queries_max{method="%s",route="%s"} %d' % (
+                    method, _escape(route), stats.queries_max))
+        for name, value in sorted(data['gauges'].items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append('# TYPE %s gauge' % name)
+                lines.append('%s %s' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+
+def over_budget(method, route, queries, budget):
+    '''The warning for a request that ran more statements than `budget`, or None.'''
+    if budget is not None and queries > budget:
+        return '%s %s ran %d SQL statements, over its budget of %d' % (method, route, queries, budget)
+    return None
+
+
+def metrics_access(app, authorization):
+    '''
+    Returns None when a request sending the `authorization` header may read
+    /metrics on `app`, or else the status to answer it with.
+    '''
+    token = app.config.get('METRICS_TOKEN') or os.environ.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest((authorization or '').encode(), ('Bearer ' + token).encode()):
+            return 401
+    elif not (app.config.get('METRICS_PUBLIC') or os.environ.get('METRICS_PUBLIC') == '1' or app.testing):
+        return 404
+    return None
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('instrumentation_start', []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('instrumentation_start')
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()[1]
+    current = g.get('instrumentation') if has_request_context() else None
+    if current is not None:
+        current['statements'].append((duration, statement))
+        current['query_time'] += duration
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not fire for a statement that raised, so
+    # drop its start here or the connection's later timings are off
+    conn = exception_context.connection
+    started = conn.info.get('instrumentation_start') if conn is not None else None
+    if started and started[-1][0] is exception_context.execution_context:
+        started.pop()
+
+
+_listening = []
+
+
+def _listen():
+    # one listener on the Engine class covers every engine, and statements
+    # are attributed to whichever request is running on the thread
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening.append(True)
@@ -0,0 +1,36 @@
+'''
+Read-only rows for the venue and artist listing pages.
+
+The listings read two to five columns of every venue or artist and throw
+them away once the page is rendered. Loaded as ORM instances, each row would
+also carry instance state and an identity map entry in the session. Here the
+columns are selected with a plain SQL statement and each row is kept in a
+__slots__ object, a fraction of the size.
+'''
+
+
+class VenueRow:
+    __slots__ = ('id', 'name', 'city', 'state', 'num_upcoming_shows')
+
+    def __init__(self, id, name, city, state, num_upcoming_shows):
+        self.id = id
+        self.name = name
+        self.city = city
+        self.state = state
+        self.num_upcoming_shows = num_upcoming_shows
+
+
+class ArtistRow:
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+def fetch(session, query, row_class):
+    '''
+    Runs `query`, whose columns are row_class's slots in order, without the
+    ORM and returns a row_class per result row.
+    '''
+    return [row_class(*row) for row in session.execute(query.statement)]
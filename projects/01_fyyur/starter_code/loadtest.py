@@ -0,0 +1,260 @@
+'''
+Fyyur load testing.
+
+generate fills the database named by DATABASE_URL with synthetic data shaped
+like production: a few cities hold most venues, venue and artist popularity
+follow a Zipf curve so popular venues have many shows, and shows are split
+between past and upcoming.
+
+run replays a weighted mix of /venues, /venues/search, /venues/<id>,
+/artists/<id> and /shows at a set concurrency, then reports p50/p95/p99
+latency and throughput per endpoint. It drives a running server (--url), or
+the app in process through the Flask test client when no URL is given.
+
+    export DATABASE_URL=sqlite:////tmp/fyyur-load.db
+    python loadtest.py generate --venues 10000 --artists 20000 --shows 500000
+    python loadtest.py run --concurrency 16 --duration 30
+    python loadtest.py run --url http://127.0.0.1:5000 --concurrency 64 --requests 20000
+'''
+import sys
+import argparse
+import bisect
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from app import app, db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+from forms import VenueForm
+from search import create_search_index
+
+# (city, state, share of venues and artists)
+CITIES = [
+    ('New York', 'NY', 20), ('Los Angeles', 'CA', 14), ('Chicago', 'IL', 9),
+    ('San Francisco', 'CA', 8), ('Austin', 'TX', 7), ('Nashville', 'TN', 6),
+    ('Seattle', 'WA', 5), ('New Orleans', 'LA', 5), ('Boston', 'MA', 4),
+    ('Atlanta', 'GA', 4), ('Denver', 'CO', 3), ('Portland', 'OR', 3),
+    ('Detroit', 'MI', 2), ('Minneapolis', 'MN', 2), ('Philadelphia', 'PA', 2),
+    ('Memphis', 'TN', 2), ('Miami', 'FL', 1), ('Kansas City', 'MO', 1),
+    ('Phoenix', 'AZ', 1), ('Burlington', 'VT', 1),
+]
+GENRES = [name for name, label in VenueForm.genres.kwargs['choices']]
+WORDS = [
+    'Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Hidden', 'Silver', 'Wild',
+    'Lucky', 'Midnight', 'Rusty', 'Crystal', 'Neon', 'Broken', 'Little', 'Grand',
+]
+VENUE_NOUNS = ['Room', 'Hall', 'Tavern', 'Lounge', 'Theatre', 'Garden', 'Cellar', 'Barn']
+ARTIST_NOUNS = ['Foxes', 'Kings', 'Rivers', 'Echoes', 'Wolves', 'Saints', 'Engines', 'Birds']
+
+# (weight, name, method) of the replayed requests
+MIX = [
+    (20, 'venues', 'GET'),
+    (15, 'venues_search', 'POST'),
+    (30, 'venue_detail', 'GET'),
+    (20, 'artist_detail', 'GET'),
+    (15, 'shows', 'GET'),
+]
+
+
+class Zipf:
+    '''Draws 1..n with probability proportional to 1 / rank ** s.'''
+    def __init__(self, n, s=1.1, rng=random):
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+    def draw(self):
+        return bisect.bisect(self.cumulative, self.rng.random() * self.cumulative[-1]) + 1
+
+
+def name(rng, nouns, i):
+    return 'The %s %s %d' % (rng.choice(WORDS), rng.choice(nouns), i)
+
+
+def insert(table, rows, batch_size=10000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    cities = [(city, state) for city, state, share in CITIES]
+    shares = [share for city, state, share in CITIES]
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    insert(Genre.__table__, [{'id': i + 1, 'name': genre} for i, genre in enumerate(GENRES)])
+    for model, association, fk, count, nouns, extra in (
+        (Venue, venue_genres, 'venue_id', args.venues, VENUE_NOUNS, {'seeking_talent': False}),
+        (Artist, artist_genres, 'artist_id', args.artists, ARTIST_NOUNS, {'seeking_venue': False}),
+    ):
+        rows = []
+        for i in range(count):
+            city, state = rng.choices(cities, shares)[0]
+            row = dict(extra, id=i + 1, name=name(rng, nouns, i + 1), city=city, state=state,
+                       phone='%010d' % rng.randrange(10 ** 10))
+            if model is Venue:
+                row['address'] = '%d %s St' % (rng.randrange(1, 9999), rng.choice(WORDS))
+            rows.append(row)
+        insert(model.__table__, rows)
+        insert(association, [
+            {fk: i + 1, 'genre_id': genre_id}
+            for i in range(count)
+            for genre_id in rng.sample(range(1, len(GENRES) + 1), rng.randint(1, 3))
+        ])
+
+    venue_rank = Zipf(args.venues, rng=rng)
+    artist_rank = Zipf(args.artists, rng=rng)
+    shows = []
+    for i in range(args.shows):
+        if rng.random() < args.past_fraction:
+            start_time = now - timedelta(days=rng.uniform(0, 365))
+        else:
+            start_time = now + timedelta(days=rng.uniform(0, 180))
+        shows.append({'venue_id': venue_rank.draw(), 'artist_id': artist_rank.draw(),
+                      'start_time': start_time.replace(minute=0, second=0, microsecond=0)})
+        if len(shows) == 50000:
+            insert(Show.__table__, shows)
+            shows = []
+    insert(Show.__table__, shows)
+
+    for table in ('Venue', 'Artist'):
+        create_search_index(db.session.connection(), table)
+    db.session.commit()
+    print('%d venues, %d artists, %d shows in %s' % (
+        args.venues, args.artists, args.shows, db.engine.url))
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Driver:
+    def __init__(self, args):
+        self.args = args
+        self.url = args.url.rstrip('/') if args.url else None
+        with app.app_context():
+            self.num_venues = db.session.query(db.func.max(Venue.id)).scalar() or 1
+            self.num_artists = db.session.query(db.func.max(Artist.id)).scalar() or 1
+        self.venue_rank = Zipf(self.num_venues)
+        self.artist_rank = Zipf(self.num_artists)
+        self.weights = list(itertools.accumulate(weight for weight, name, method in MIX))
+        self.results = {name: [] for weight, name, method in MIX}
+        self.errors = {name: 0 for weight, name, method in MIX}
+        self.lock = threading.Lock()
+        self.issued = 0
+
+    def next_request(self, rng):
+        weight, name, method = MIX[bisect.bisect(self.weights, rng.random() * self.weights[-1])]
+        if name == 'venues':
+            return name, method, '/venues', None
+        if name == 'venues_search':
+            term = rng.choice(WORDS) if rng.random() < 0.7 else rng.choice(VENUE_NOUNS)
+            return name, method, '/venues/search', {'search_term': term}
+        if name == 'venue_detail':
+            return name, method, '/venues/%d' % self.venue_rank.draw(), None
+        if name == 'artist_detail':
+            return name, method, '/artists/%d' % self.artist_rank.draw(), None
+        return name, method, '/shows', None
+
+    def take(self):
+        with self.lock:
+            if self.args.requests and self.issued >= self.args.requests:
+                return False
+            self.issued += 1
+            return True
+
+    def worker(self, index, deadline):
+        rng = random.Random(index)
+        client = None if self.url else app.test_client()
+        while time.perf_counter() < deadline and self.take():
+            name, method, path, form = self.next_request(rng)
+            start = time.perf_counter()
+            try:
+                if client is not None:
+                    ok = client.open(path, method=method, data=form).status_code < 400
+                else:
+                    data = urlencode(form).encode() if form else None
+                    with urlopen(Request(self.url + path, data=data, method=method), timeout=30) as response:
+                        response.read()
+                    ok = True
+            except (HTTPError, OSError):
+                ok = False
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                if ok:
+                    self.results[name].append(elapsed)
+                else:
+                    self.errors[name] += 1
+
+    def run(self):
+        deadline = time.perf_counter() + (self.args.duration if not self.args.requests else 10 ** 9)
+        threads = [threading.Thread(target=self.worker, args=(i, deadline)) for i in range(self.args.concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        print('%-14s %8s %7s %9s %9s %9s %9s' % ('endpoint', 'requests', 'errors', 'req/s', 'p50_ms', 'p95_ms', 'p99_ms'))
+        everything = []
+        for weight, name, method in MIX:
+            latencies = sorted(self.results[name])
+            everything.extend(latencies)
+            self.print_row(name, latencies, self.errors[name], elapsed)
+        self.print_row('total', sorted(everything), sum(self.errors.values()), elapsed)
+
+    def print_row(self, name, latencies, errors, elapsed):
+        print('%-14s %8d %7d %9.1f %9.1f %9.1f %9.1f' % (
+            name, len(latencies), errors, len(latencies) / elapsed,
+            percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+            percentile(latencies, 99) * 1000))
+
+
+def run(args):
+    driver = Driver(args)
+    print('%s, %d workers, %s' % (
+        args.url or 'in process', args.concurrency,
+        '%d requests' % args.requests if args.requests else '%d s' % args.duration))
+    elapsed = driver.run()
+    driver.report(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    generate_parser = commands.add_parser('generate', help='replace the database contents with synthetic data')
+    generate_parser.add_argument('--venues', type=int, default=10000)
+    generate_parser.add_argument('--artists', type=int, default=20000)
+    generate_parser.add_argument('--shows', type=int, default=200000)
+    generate_parser.add_argument('--past-fraction', type=float, default=0.7)
+    generate_parser.add_argument('--seed', type=int, default=1)
+
+    run_parser = commands.add_parser('run', help='replay the request mix and report latency')
+    run_parser.add_argument('--url', help='base URL of a running server; in process when omitted')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--duration', type=float, default=30, help='seconds to run for')
+    run_parser.add_argument('--requests', type=int, help='stop after this many requests instead')
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        with app.app_context():
+            generate(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+"""normalize genres into venue_genres and artist_genres
+
+Backfills the association tables from the comma-joined Venue.genres and
+Artist.genres strings, then drops those columns. Genre names become
+unique, keeping the lowest id of any duplicates.
+
+Revision ID: 5f1c7a9d2e48
+Revises: e8d4f2b6a913
+Create Date: 2026-10-18 13:20:44.681250
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import create_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1c7a9d2e48'
+down_revision = 'e8d4f2b6a913'
+branch_labels = None
+depends_on = None
+
+genre = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+# (owner table, association table, association foreign key)
+OWNERS = [
+    ('Venue', 'venue_genres', 'venue_id'),
+    ('Artist', 'artist_genres', 'artist_id'),
+]
+
+
+def delete_duplicate_genres(conn):
+    '''
+    Keeps the lowest id for each genre name so the name can be unique.
+    Nothing links to Genre yet: 7addfa726be5 dropped the old genre tables
+    and the association tables are created after this, so the other
+    copies are simply deleted.
+    '''
+    keep = sa.select(sa.func.min(genre.c.id)).group_by(genre.c.name)
+    conn.execute(genre.delete().where(genre.c.id.notin_(keep)))
+
+
+def upgrade():
+    conn = op.get_bind()
+    delete_duplicate_genres(conn)
+    op.create_index(op.f('ix_Genre_name'), 'Genre', ['name'], unique=True)
+    for owner, association, fk in OWNERS:
+        op.create_table(association,
+        sa.Column(fk, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([fk], [owner + '.id'], ),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+        sa.PrimaryKeyConstraint(fk, 'genre_id')
+        )
+        op.create_index('ix_%s_genre_id_%s' % (association, fk), association, ['genre_id', fk], unique=False)
+
+    owned_genres = {}
+    for owner, association, fk in OWNERS:
+        source = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        owned_genres[owner] = [
+            (owner_id, [name.strip() for name in genres.split(',') if name.strip()])
+            for owner_id, genres in conn.execute(sa.select(source.c.id, source.c.genres))
+            if genres
+        ]
+
+    genre_ids = {name: genre_id for genre_id, name in conn.execute(sa.select(genre.c.id, genre.c.name))}
+    missing = sorted({name for rows in owned_genres.values() for owner_id, names in rows for name in names} - set(genre_ids))
+    if missing:
+        conn.execute(genre.insert(), [{'name': name} for name in missing])
+        genre_ids = {name: genre_id for genre_id, name in conn.execute(sa.select(genre.c.id, genre.c.name))}
+
+    for owner, association, fk in OWNERS:
+        links = sa.table(association, sa.column(fk, sa.Integer), sa.column('genre_id', sa.Integer))
+        rows = [
+            {fk: owner_id, 'genre_id': genre_ids[name]}
+            for owner_id, names in owned_genres[owner]
+            for name in dict.fromkeys(names)
+        ]
+        if rows:
+            conn.execute(links.insert(), rows)
+
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.drop_column('genres')
+        # SQLite rebuilds the table to drop a column, which loses the
+        # search triggers
+        create_search_index(conn, owner)
+
+
+def downgrade():
+    conn = op.get_bind()
+    for owner, association, fk in OWNERS:
+        op.add_column(owner, sa.Column('genres', sa.String(length=120), nullable=True))
+
+        source = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        links = sa.table(association, sa.column(fk, sa.Integer), sa.column('genre_id', sa.Integer))
+        owned_genres = {}
+        for owner_id, name in conn.execute(
+                sa.select(links.c[fk], genre.c.name).
+                select_from(links.join(genre, genre.c.id == links.c.genre_id)).
+                order_by(links.c[fk], genre.c.name)):
+            owned_genres.setdefault(owner_id, []).append(name)
+        for owner_id, names in owned_genres.items():
+            conn.execute(source.update().where(source.c.id == owner_id).values(genres=','.join(names)))
+
+        op.drop_index('ix_%s_genre_id_%s' % (association, fk), table_name=association)
+        op.drop_table(association)
+    op.drop_index(op.f('ix_Genre_name'), table_name='Genre')
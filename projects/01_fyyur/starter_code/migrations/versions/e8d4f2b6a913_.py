@@ -0,0 +1,30 @@
+"""search indexes on Venue and Artist names
+
+pg_trgm GIN indexes on PostgreSQL, FTS5 tables plus sync triggers on SQLite.
+
+Revision ID: e8d4f2b6a913
+Revises: c5a81f0e6d92
+Create Date: 2026-10-18 11:48:05.917342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8d4f2b6a913'
+down_revision = 'c5a81f0e6d92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        create_search_index(op.get_bind(), table)
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        drop_search_index(op.get_bind(), table)
@@ -0,0 +1,129 @@
+'''
+Name search for venues and artists.
+
+On PostgreSQL, matches come from a pg_trgm GIN index on the name column and
+are ranked by trigram similarity. On SQLite, they come from an FTS5 table kept
+in sync by triggers and are ranked by bm25, with each search word treated as a
+prefix. Any other backend falls back to an unranked ILIKE scan.
+
+The indexes are created by the search index migration, or by calling
+create_search_index() for databases built with db.create_all(). Until they
+exist (no FTS5 table on SQLite, no pg_trgm extension on PostgreSQL) search
+uses the ILIKE scan as well.
+'''
+import re
+import weakref
+
+from sqlalchemy import Float, Integer, case, func, literal, text
+
+SEARCH_LIMIT = 50
+
+# engine -> tables known to have a search index, so the lookup in
+# has_search_index() runs until one is found and not on every search
+_indexed = weakref.WeakKeyDictionary()
+
+
+def has_search_index(bind, table):
+    tables = _indexed.setdefault(bind.engine, set())
+    if table in tables:
+        return True
+    if bind.dialect.name == 'sqlite':
+        found = bind.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                             {'name': table + '_fts'}).first() is not None
+    elif bind.dialect.name == 'postgresql':
+        found = bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+    else:
+        found = False
+    if found:
+        tables.add(table)
+    return found
+
+
+def create_search_index(bind, table):
+    if bind.dialect.name == 'postgresql':
+        bind.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        bind.execute(text(
+            'CREATE INDEX IF NOT EXISTS "ix_{0}_name_trgm" ON "{0}" USING gin (name gin_trgm_ops)'.format(table)))
+    elif bind.dialect.name == 'sqlite':
+        statements = [
+            '''CREATE VIRTUAL TABLE IF NOT EXISTS "{0}_fts" USING fts5(name, content='{0}', content_rowid='id')''',
+            '''CREATE TRIGGER IF NOT EXISTS "{0}_fts_ai" AFTER INSERT ON "{0}" BEGIN
+                 INSERT INTO "{0}_fts"(rowid, name) VALUES (new.id, new.name);
+               END''',
+            '''CREATE TRIGGER IF NOT EXISTS "{0}_fts_ad" AFTER DELETE ON "{0}" BEGIN
+                 INSERT INTO "{0}_fts"("{0}_fts", rowid, name) VALUES ('delete', old.id, old.name);
+               END''',
+            '''CREATE TRIGGER IF NOT EXISTS "{0}_fts_au" AFTER UPDATE OF name ON "{0}" BEGIN
+                 INSERT INTO "{0}_fts"("{0}_fts", rowid, name) VALUES ('delete', old.id, old.name);
+                 INSERT INTO "{0}_fts"(rowid, name) VALUES (new.id, new.name);
+               END''',
+            '''INSERT INTO "{0}_fts"("{0}_fts") VALUES ('rebuild')''',
+        ]
+        for statement in statements:
+            bind.execute(text(statement.format(table)))
+    _indexed.setdefault(bind.engine, set()).add(table)
+
+
+def drop_search_index(bind, table):
+    if bind.dialect.name == 'postgresql':
+        bind.execute(text('DROP INDEX IF EXISTS "ix_{0}_name_trgm"'.format(table)))
+    elif bind.dialect.name == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            bind.execute(text('DROP TRIGGER IF EXISTS "{0}_fts_{1}"'.format(table, trigger)))
+        bind.execute(text('DROP TABLE IF EXISTS "{0}_fts"'.format(table)))
+    _indexed.get(bind.engine, set()).discard(table)
+
+
+def _escape_like(term):
+    return re.sub(r'([\\%_])', r'\\\1', term)
+
+
+def _fts_query(term):
+    # every word becomes a quoted prefix query, so punctuation in the
+    # search box cannot be read as FTS5 syntax
+    words = re.findall(r'\w+', term)
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def _matches(session, model, term, limit):
+    '''
+    Subquery of (id, rank) for the best `limit` matches, lower rank first.
+    '''
+    connection = session.connection()
+    dialect = connection.dialect.name
+    table = model.__tablename__
+    indexed = bool(term) and has_search_index(connection, table)
+
+    if dialect == 'sqlite' and indexed and _fts_query(term):
+        return text(
+            'SELECT rowid AS id, bm25("{0}_fts") AS rank FROM "{0}_fts" '
+            'WHERE "{0}_fts" MATCH :query ORDER BY rank LIMIT :limit'.format(table)
+        ).bindparams(query=_fts_query(term), limit=limit).\
+            columns(id=Integer, rank=Float).subquery('matches')
+
+    if dialect == 'postgresql' and indexed:
+        rank = -func.similarity(model.name, term)
+    else:
+        rank = literal(0)
+
+    return session.query(model.id.label('id'), rank.label('rank')).\
+        filter(model.name.ilike('%' + _escape_like(term) + '%', escape='\\')).\
+        order_by(rank, model.name, model.id).\
+        limit(limit).subquery('matches')
+
+
+def by_name(session, model, show_fk, show_start_time, term, now, limit=SEARCH_LIMIT):
+    '''
+    Returns up to `limit` (id, name, num_upcoming_shows) rows of `model`
+    whose name matches `term`, best match first. Upcoming shows are counted
+    through `show_fk` in the same query.
+    '''
+    matches = _matches(session, model, term.strip(), limit)
+    num_upcoming_shows = func.count(case((show_start_time > now, show_fk)))
+
+    return session.query(
+        model.id, model.name, num_upcoming_shows.label('num_upcoming_shows')
+    ).join(matches, matches.c.id == model.id).\
+        outerjoin(show_fk.table, show_fk == model.id).\
+        group_by(model.id, matches.c.rank).\
+        order_by(matches.c.rank, model.name).all()
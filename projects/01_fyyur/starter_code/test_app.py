@@ -0,0 +1,109 @@
+'''
+Behaviour tests for Fyyur routes, against a database seeded with
+benchmarks.seed(). DATABASE_URL selects the database, as for benchmarks.py.
+
+    python -m unittest test_app
+'''
+import os
+import re
+import unittest
+from unittest import mock
+
+from benchmarks import reset_db, seed
+from app import app, db, MAX_SHOWS_PER_PAGE
+from search import create_search_index, drop_search_index
+
+
+class ShowsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            reset_db()
+            seed(150, num_artists=10)
+            db.session.remove()
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def shows(self, url):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res.get_data(as_text=True).count('tile-show')
+
+    def test_limit(self):
+        self.assertEqual(self.shows('/shows?limit=5'), 5)
+
+    def test_limit_below_one(self):
+        self.assertEqual(self.shows('/shows?limit=0'), 1)
+        self.assertEqual(self.shows('/shows?limit=-1'), 1)
+
+    def test_limit_above_max(self):
+        self.assertEqual(self.shows('/shows?limit=%d' % (MAX_SHOWS_PER_PAGE + 1)), MAX_SHOWS_PER_PAGE)
+
+    def test_next_page_keeps_limit(self):
+        res = self.client.get('/shows?limit=5')
+        self.assertRegex(res.get_data(as_text=True), r'href="/shows\?after=[^"]*limit=5"')
+
+
+class SearchTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            reset_db()
+            seed(30, num_artists=30)
+            db.session.remove()
+
+    def setUp(self):
+        self.client = app.test_client()
+        page = self.client.get('/venues/create').get_data(as_text=True)
+        self.csrf_token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+
+    def search(self, kind, term):
+        res = self.client.post('/%s/search' % kind, data={'search_term': term, 'csrf_token': self.csrf_token})
+        self.assertEqual(res.status_code, 200)
+        return res.get_data(as_text=True)
+
+    def set_index(self, indexed):
+        with app.app_context():
+            for table in ('Venue', 'Artist'):
+                if indexed:
+                    create_search_index(db.session.connection(), table)
+                else:
+                    drop_search_index(db.session.connection(), table)
+            db.session.commit()
+            db.session.remove()
+
+    def test_without_index(self):
+        self.set_index(False)
+        for kind, name in (('venues', 'Venue 12'), ('artists', 'Artist 12')):
+            with self.subTest(kind=kind):
+                self.assertIn(name, self.search(kind, name))
+                self.assertIn(name, self.search(kind, 'ue 1' if kind == 'venues' else 'ist 1'))
+
+    def test_with_index(self):
+        self.set_index(True)
+        for kind, name in (('venues', 'Venue 12'), ('artists', 'Artist 12')):
+            with self.subTest(kind=kind):
+                self.assertIn(name, self.search(kind, name))
+
+
+class StatsAccessTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_hidden_without_token(self):
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': '', 'METRICS_PUBLIC': ''}), \
+                mock.patch.dict(app.config, {'METRICS_PUBLIC': False, 'DEBUG': True}):
+            for url in ('/cache/stats', '/pool/stats'):
+                self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_token(self):
+        with mock.patch.dict(app.config, {'METRICS_TOKEN': 'secret'}):
+            for url in ('/cache/stats', '/pool/stats'):
+                self.assertEqual(self.client.get(url).status_code, 401, url)
+                res = self.client.get(url, headers={'Authorization': 'Bearer secret'})
+                self.assertEqual(res.status_code, 200, url)
+
+
+if __name__ == '__main__':
+    unittest.main()
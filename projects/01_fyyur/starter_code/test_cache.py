@@ -0,0 +1,254 @@
+'''
+Tests for the venue and artist detail cache: the cache.py backends, and the
+invalidation done by the routes that change what a detail page shows.
+DATABASE_URL selects the database, as for benchmarks.py.
+
+    python -m unittest test_cache
+'''
+import argparse
+import contextlib
+import io
+import re
+import unittest
+from unittest import mock
+
+from benchmarks import bench_detail, reset_db, seed
+import app as fyyur
+from app import app, db
+from cache import LRUCache, SharedCache, NullCache, DictBackend, from_config
+from test_performance import VENUE, ARTIST
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = LRUCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_expiry(self):
+        self.cache.set('a', 1)
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual((self.cache.get('a'), self.cache.get('b'), self.cache.get('c')), (1, None, 3))
+
+    def test_get_or_set(self):
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return 'value'
+
+        self.assertEqual(self.cache.get_or_set('a', compute), 'value')
+        self.assertEqual(self.cache.get_or_set('a', compute), 'value')
+        self.assertIsNone(self.cache.get_or_set('missing', lambda: None))
+        self.assertIsNone(self.cache.get_or_set('missing', lambda: None))
+
+        self.assertEqual(len(computed), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 3, 1))
+
+    def test_delete(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.delete('a', 'unknown')
+
+        self.assertEqual((self.cache.get('a'), self.cache.get('b')), (None, 2))
+
+
+class SharedCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.backend = DictBackend(clock=self.clock)
+        self.cache = SharedCache(self.backend, ttl=10)
+
+    def test_values_are_pickled_under_prefix(self):
+        self.cache.set('venue:1', {'name': 'Venue', 'shows': [1, 2]})
+
+        self.assertEqual(list(self.backend._data), ['fyyur:venue:1'])
+        self.assertEqual(self.cache.get('venue:1'), {'name': 'Venue', 'shows': [1, 2]})
+
+    def test_expiry(self):
+        self.cache.set('a', 1)
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.backend._data, {})
+
+    def test_shared_between_caches(self):
+        other = SharedCache(self.backend, ttl=10)
+        self.cache.set('a', 1)
+        self.assertEqual(other.get('a'), 1)
+        other.delete('a')
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual((self.cache.stats()['hits'], self.cache.stats()['misses']), (0, 1))
+
+    def test_clear(self):
+        self.backend.set('other:a', b'value')
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.clear()
+
+        self.assertEqual(list(self.backend._data), ['other:a'])
+
+    def test_backend_without_expiry(self):
+        self.backend.set('key', b'value')
+        self.clock.now = 1e9
+
+        self.assertEqual(self.backend.get('key'), b'value')
+
+    def test_from_config(self):
+        cache = from_config({'DETAIL_CACHE_SIZE': 5, 'DETAIL_CACHE_TTL': 7})
+
+        self.assertIsInstance(cache, LRUCache)
+        self.assertEqual((cache.maxsize, cache.ttl), (5, 7))
+
+
+class NullCacheTestCase(unittest.TestCase):
+    def test_nothing_is_stored(self):
+        cache = NullCache()
+        computed = []
+        for i in range(2):
+            cache.get_or_set('a', lambda: computed.append(1) or 1)
+
+        self.assertEqual(len(computed), 2)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (0, 2))
+
+
+class BenchDetailTestCase(unittest.TestCase):
+    """benchmarks.py detail must build every page, not time cache hits."""
+
+    def test_detail_pages_query_at_every_size(self):
+        out = io.StringIO()
+        with app.app_context(), contextlib.redirect_stdout(out):
+            # a cached page from before the benchmark must not be served either
+            reset_db()
+            seed(1, num_artists=1, shows_per_venue=1)
+            self.assertEqual(app.test_client().get('/artists/1').status_code, 200)
+            bench_detail(argparse.Namespace(sizes=[100, 1000], repeat=1))
+            db.session.remove()
+
+        rows = [line.split() for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual([row[0] for row in rows], ['100', '1000'])
+        for row in rows:
+            self.assertGreater(int(row[1]), 0)
+
+    def test_reset_db_clears_cache(self):
+        with app.app_context():
+            reset_db()
+            seed(1, num_artists=1, shows_per_venue=1)
+            db.session.remove()
+            self.assertEqual(app.test_client().get('/venues/1').status_code, 200)
+            self.assertIsNotNone(fyyur.detail_cache.get(fyyur.venue_key(1)))
+            reset_db()
+            db.session.remove()
+
+            self.assertIsNone(fyyur.detail_cache.get(fyyur.venue_key(1)))
+
+
+class DetailInvalidationTest:
+    """Detail pages read through the cache, then a write, then the pages again.
+
+    With seed(3, num_artists=3) venue 1 has shows by artists 1 and 2, venue 2
+    by artists 2 and 3, and venue 3 by artists 3 and 1. Subclasses define
+    make_cache()."""
+
+    def setUp(self):
+        with app.app_context():
+            reset_db()
+            seed(3, num_artists=3)
+            db.session.remove()
+        self.cache = self.make_cache()
+        patcher = mock.patch.object(fyyur, 'detail_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+        page = self.client.get('/venues/create').get_data(as_text=True)
+        self.csrf_token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+
+    def page(self, url):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200, url)
+        return res.get_data(as_text=True)
+
+    def post(self, url, data):
+        return self.client.post(url, data=dict(data, csrf_token=self.csrf_token))
+
+    def test_pages_are_cached(self):
+        self.page('/venues/1')
+        self.page('/venues/1')
+
+        self.assertIsNotNone(self.cache.get(fyyur.venue_key(1)))
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+    def test_edit_venue(self):
+        self.page('/venues/1')
+        self.page('/artists/1')
+        self.post('/venues/1/edit', dict(VENUE, name='Renamed Venue'))
+
+        self.assertIn('Renamed Venue', self.page('/venues/1'))
+        self.assertIn('Renamed Venue', self.page('/artists/1'))
+
+    def test_edit_artist(self):
+        self.page('/artists/2')
+        self.page('/venues/2')
+        self.post('/artists/2/edit', dict(ARTIST, name='Renamed Artist'))
+
+        self.assertIn('Renamed Artist', self.page('/artists/2'))
+        self.assertIn('Renamed Artist', self.page('/venues/2'))
+
+    def test_delete_venue(self):
+        self.page('/venues/1')
+        self.assertIn('href="/venues/1"', self.page('/artists/1'))
+        self.assertTrue(self.client.delete('/venues/1').json['success'])
+
+        self.assertNotIn('href="/venues/1"', self.page('/artists/1'))
+        self.assertEqual(self.client.get('/venues/1').status_code, 302)
+
+    def test_delete_artist(self):
+        self.page('/artists/3')
+        self.assertIn('href="/artists/3"', self.page('/venues/2'))
+        self.assertTrue(self.client.delete('/artists/3').json['success'])
+
+        self.assertNotIn('href="/artists/3"', self.page('/venues/2'))
+        self.assertEqual(self.client.get('/artists/3').status_code, 302)
+
+    def test_create_show(self):
+        self.assertNotIn('href="/venues/3"', self.page('/artists/2'))
+        self.assertNotIn('href="/artists/2"', self.page('/venues/3'))
+        self.post('/shows/create', {'artist_id': '2', 'venue_id': '3', 'start_time': '2030-01-01 20:00:00'})
+
+        self.assertIn('href="/venues/3"', self.page('/artists/2'))
+        self.assertIn('href="/artists/2"', self.page('/venues/3'))
+
+
+class LRUDetailInvalidationTestCase(DetailInvalidationTest, unittest.TestCase):
+    def make_cache(self):
+        return LRUCache()
+
+
+class SharedDetailInvalidationTestCase(DetailInvalidationTest, unittest.TestCase):
+    def make_cache(self):
+        return SharedCache(DictBackend())
+
+
+if __name__ == '__main__':
+    unittest.main()
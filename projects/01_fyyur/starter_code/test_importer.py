@@ -0,0 +1,109 @@
+'''
+Tests for importer.BulkImporter, behind `flask import-data`. DATABASE_URL
+selects the database, as for benchmarks.py.
+
+    python -m unittest test_importer
+'''
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import count_queries, reset_db, seed
+from app import app, db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+import importer
+
+
+def write_file(name, text):
+    path = os.path.join(tempfile.mkdtemp(), name)
+    with open(path, 'w', newline='') as f:
+        f.write(text)
+    return path
+
+
+def venue(i, **fields):
+    return dict({'name': 'Imported %d' % i, 'city': 'Austin', 'state': 'TX', 'genres': 'Jazz,Salsa'}, **fields)
+
+
+class ImporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        reset_db()
+        seed(3, num_artists=3)
+        self.messages = []
+        self.bulk = importer.BulkImporter(db, Genre, batch_size=4, echo=self.messages.append)
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def import_venues(self, path):
+        write = self.bulk.owner_writer(Venue, venue_genres, 'venue_id')
+        return self.bulk.run(importer.read_records(path), importer.clean_venue, write)
+
+    def test_malformed_lines_are_skipped(self):
+        lines = [json.dumps(venue(0)), '{"name": "cut off', json.dumps(venue(1)), '[1, 2]', json.dumps(venue(2, city=''))]
+        path = write_file('venues.ndjson', '\n'.join(lines) + '\n')
+
+        self.assertEqual(self.import_venues(path), (2, 3))
+        self.assertEqual(Venue.query.filter(Venue.name.like('Imported %')).count(), 2)
+        skipped = [message for message in self.messages if 'skipped:' in message]
+        self.assertTrue(skipped[0].startswith('record 2 skipped: invalid JSON'))
+        self.assertEqual(skipped[1], 'record 4 skipped: not a JSON object')
+        self.assertEqual(skipped[2], 'record 5 skipped: city is required')
+
+    def test_one_insert_per_batch(self):
+        path = write_file('venues.ndjson', ''.join(json.dumps(venue(i)) + '\n' for i in range(10)))
+        with count_queries() as statements:
+            self.assertEqual(self.import_venues(path), (10, 0))
+
+        inserts = [statement for statement in statements if statement.startswith('INSERT INTO "Venue"')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_ids_and_genres(self):
+        path = write_file('venues.ndjson', ''.join(json.dumps(venue(i)) + '\n' for i in range(6)))
+        self.import_venues(path)
+
+        imported = Venue.query.filter(Venue.name.like('Imported %')).order_by(Venue.id).all()
+        self.assertEqual([v.id for v in imported], [4, 5, 6, 7, 8, 9])
+        self.assertEqual([v.name for v in imported], ['Imported %d' % i for i in range(6)])
+        for v in imported:
+            self.assertEqual(sorted(genre.name for genre in v.genres), ['Jazz', 'Salsa'])
+        self.assertEqual(Genre.query.filter_by(name='Salsa').count(), 1)
+
+    def test_explicit_ids(self):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, ['id', 'name', 'city', 'state', 'genres'])
+        writer.writeheader()
+        writer.writerow({'id': '', 'name': 'First', 'city': 'Austin', 'state': 'TX', 'genres': 'Folk'})
+        writer.writerow({'id': '20', 'name': 'Twentieth', 'city': 'Austin', 'state': 'TX', 'genres': ''})
+        writer.writerow({'id': '', 'name': 'Next', 'city': 'Austin', 'state': 'TX', 'genres': 'Soul'})
+        path = write_file('artists.csv', buffer.getvalue())
+        write = self.bulk.owner_writer(Artist, artist_genres, 'artist_id')
+
+        self.assertEqual(self.bulk.run(importer.read_records(path), importer.clean_artist, write), (3, 0))
+        artists = {artist.name: artist for artist in Artist.query.filter(Artist.id > 3)}
+        self.assertEqual({name: artist.id for name, artist in artists.items()},
+                         {'First': 21, 'Twentieth': 20, 'Next': 22})
+        self.assertEqual([genre.name for genre in artists['Next'].genres], ['Soul'])
+
+    def test_shows(self):
+        path = write_file('shows.ndjson', ''.join(json.dumps(row) + '\n' for row in [
+            {'artist_id': 1, 'venue_id': 2, 'start_time': '2030-01-02 20:00'},
+            {'artist_id': 'x', 'venue_id': 2, 'start_time': '2030-01-02 20:00'},
+            {'artist_id': 3, 'venue_id': 1, 'start_time': '2030-05-06T21:30:00'},
+        ]))
+        batches = []
+        self.bulk.on_batch = batches.append
+
+        self.assertEqual(self.bulk.run(importer.read_records(path), importer.clean_show, self.bulk.show_writer(Show)), (2, 1))
+        shows = Show.query.filter(Show.start_time >= '2030-01-01').order_by(Show.start_time).all()
+        self.assertEqual([(show.artist_id, show.venue_id) for show in shows], [(1, 2), (3, 1)])
+        self.assertEqual([[row['venue_id'] for row in batch] for batch in batches], [[2, 1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
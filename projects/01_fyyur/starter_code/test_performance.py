@@ -0,0 +1,183 @@
+'''
+Query-count and latency regression tests for every Fyyur route.
+
+For each size in PERF_SIZES (default 1000) a fresh database is seeded with
+benchmarks.seed() and every route is run through the test client. A route
+fails when it runs more SQL statements than its budget, which does not grow
+with the data, or when it is slower than its latency ceiling. A write route
+also fails unless it redirects or answers as expected, flashes the expected
+message and leaves the expected rows. DATABASE_URL selects the database, as
+for benchmarks.py.
+
+    python -m unittest test_performance
+    PERF_SIZES=1000,10000,100000 python -m unittest test_performance
+'''
+import os
+import re
+import time
+import unittest
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from benchmarks import reset_db, seed
+from app import app, db, Venue, Artist, Show
+from search import create_search_index
+
+SIZES = [int(size) for size in os.environ.get('PERF_SIZES', '1000').split(',')]
+# ceiling for any request, plus an allowance per seeded venue for the pages
+# that list every venue or artist
+LATENCY_MS = float(os.environ.get('PERF_LATENCY_MS', 1000))
+LATENCY_PER_ROW_MS = float(os.environ.get('PERF_LATENCY_PER_ROW_MS', 0.05))
+
+VENUE = {
+    'name': 'New Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+    'phone': '512-555-0100', 'genres': ['Jazz', 'Folk'], 'image_link': '',
+    'facebook_link': '', 'website': '', 'seeking_description': '',
+}
+ARTIST = {
+    'name': 'New Artist', 'city': 'Austin', 'state': 'TX', 'phone': '512-555-0101',
+    'genres': ['Jazz'], 'image_link': '', 'facebook_link': '', 'website': '',
+    'seeking_description': '',
+}
+SHOW = {'artist_id': '1', 'venue_id': '1', 'start_time': '2030-01-01 20:00:00'}
+
+# (method, url, form data, query budget, lists every row)
+READ_ROUTES = [
+    ('GET', '/', None, 0, False),
+    ('GET', '/venues', None, 1, True),
+    ('GET', '/venues?genre=Blues', None, 1, True),
+    ('POST', '/venues/search', {'search_term': 'Venue 1'}, 1, False),
+    ('GET', '/venues/1', None, 2, False),
+    ('GET', '/venues/create', None, 0, False),
+    ('GET', '/venues/1/edit', None, 1, False),
+    ('GET', '/artists', None, 1, True),
+    ('GET', '/artists?genre=Jazz', None, 1, True),
+    ('POST', '/artists/search', {'search_term': 'Artist 1'}, 1, False),
+    ('GET', '/artists/1', None, 2, False),
+    ('GET', '/artists/create', None, 0, False),
+    ('GET', '/artists/1/edit', None, 1, False),
+    ('GET', '/shows', None, 1, False),
+    ('GET', '/shows?limit=200', None, 1, False),
+    ('GET', '/shows/create', None, 0, False),
+    ('GET', '/cache/stats', None, 0, False),
+    ('GET', '/pool/stats', None, 0, False),
+    ('GET', '/metrics', None, 0, False),
+]
+
+
+def genre_names(row):
+    return sorted(genre.name for genre in row.genres)
+
+
+def created_venue(size):
+    venue = Venue.query.filter(Venue.id > size, Venue.name == 'New Venue').one()
+    return (venue.city, venue.phone, genre_names(venue)) == ('Austin', '5125550100', ['Folk', 'Jazz'])
+
+
+def edited_venue(size):
+    venue = Venue.query.get(1)
+    return (venue.name, venue.address, genre_names(venue)) == ('New Venue', '1 Main St', ['Folk', 'Jazz'])
+
+
+def created_artist(size):
+    artist = Artist.query.filter(Artist.id > size, Artist.name == 'New Artist').one()
+    return (artist.city, artist.phone, genre_names(artist)) == ('Austin', '5125550101', ['Jazz'])
+
+
+def edited_artist(size):
+    artist = Artist.query.get(1)
+    return (artist.name, genre_names(artist)) == ('New Artist', ['Jazz'])
+
+
+def created_show(size):
+    return Show.query.filter_by(artist_id=1, venue_id=1, start_time=datetime(2030, 1, 1, 20)).count() == 1
+
+
+# (method, url, form data, query budget, lists every row,
+#  (redirect path or JSON body, flashed message, check of the rows written))
+WRITE_ROUTES = [
+    ('POST', '/venues/create', VENUE, 3, False,
+     ('/', 'Venue New Venue was successfully listed!', created_venue)),
+    ('POST', '/venues/1/edit', VENUE, 7, False,
+     ('/venues/1', 'Venue New Venue was successfully updated!', edited_venue)),
+    ('POST', '/artists/create', ARTIST, 3, False,
+     ('/', 'Artist New Artist was successfully listed!', created_artist)),
+    ('POST', '/artists/1/edit', ARTIST, 6, False,
+     ('/artists/1', 'Artist New Artist was successfully updated!', edited_artist)),
+    ('POST', '/shows/create', SHOW, 3, False,
+     ('/', 'Show was successfully listed!', created_show)),
+    ('DELETE', '/venues/2', None, 6, False,
+     ({'success': True, 'url': '/venues'}, None, lambda size: Venue.query.get(2) is None)),
+    ('DELETE', '/artists/2', None, 6, False,
+     ({'success': True, 'url': '/artists'}, None, lambda size: Artist.query.get(2) is None)),
+]
+
+
+class RoutePerformanceTest:
+    """Runs every route against a database seeded with SIZE venues."""
+    SIZE = None
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['METRICS_PUBLIC'] = True
+        # requests must not share an app context with the seeding, or they
+        # would share its session and flask.g
+        with app.app_context():
+            reset_db()
+            seed(cls.SIZE, num_artists=cls.SIZE)
+            for table in ('Venue', 'Artist'):
+                create_search_index(db.session.connection(), table)
+            db.session.commit()
+            db.session.remove()
+
+    def setUp(self):
+        self.client = app.test_client()
+        page = self.client.get('/venues/create').get_data(as_text=True)
+        self.csrf_token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+
+    def check_route(self, method, url, data, budget, lists_rows, effect=None):
+        if data is not None:
+            data = dict(data, csrf_token=self.csrf_token)
+        start = time.perf_counter()
+        res = self.client.open(url, method=method, data=data)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        ceiling = LATENCY_MS + (LATENCY_PER_ROW_MS * self.SIZE if lists_rows else 0)
+        self.assertLess(res.status_code, 400)
+        self.assertLessEqual(int(res.headers['X-Query-Count']), budget)
+        self.assertLess(elapsed, ceiling)
+        if effect is not None:
+            self.check_effect(res, *effect)
+
+    def check_effect(self, res, response, message, written):
+        with self.client.session_transaction() as session:
+            flashes = [text for category, text in session.pop('_flashes', [])]
+        if isinstance(response, dict):
+            self.assertEqual(res.json, response)
+        else:
+            self.assertEqual(res.status_code, 302)
+            self.assertEqual(urlsplit(res.headers['Location']).path, response)
+        self.assertEqual(flashes, [message] if message else [])
+        with app.app_context():
+            self.assertTrue(written(self.SIZE))
+            db.session.remove()
+
+    def check_routes(self, routes):
+        for method, url, data, budget, lists_rows, *effect in routes:
+            with self.subTest(size=self.SIZE, route='%s %s' % (method, url)):
+                self.check_route(method, url, data, budget, lists_rows, *effect)
+
+    def test_read_routes(self):
+        self.check_routes(READ_ROUTES)
+
+    def test_write_routes(self):
+        self.check_routes(WRITE_ROUTES)
+
+
+for size in SIZES:
+    name = 'RoutePerformance%dTest' % size
+    globals()[name] = type(name, (RoutePerformanceTest, unittest.TestCase), {'SIZE': size})
+
+
+if __name__ == '__main__':
+    unittest.main()
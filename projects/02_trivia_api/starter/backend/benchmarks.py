@@ -0,0 +1,306 @@
+'''
+Trivia API benchmarks.
+
+Seeds a throwaway database and times endpoints through the Flask test
+client, counting the SQL statements each request issues. TRIVIA_BENCH_DB is
+used when set, otherwise a temporary SQLite file is created.
+
+  python benchmarks.py questions --sizes 1000 100000 1000000
+  python benchmarks.py questions --sizes 1000000 --count-ttl 60
+  python benchmarks.py quiz --sizes 100 10000 100000
+  python benchmarks.py search --sizes 10000 100000 1000000
+  python benchmarks.py rows --sizes 100000
+
+http drives an already running server over keep-alive connections instead,
+for comparing the threaded app with the asyncio one in flaskr/aio.py (start
+each on the same database, see the README):
+
+  python benchmarks.py http --url http://127.0.0.1:5000 --concurrency 1000 --duration 30
+'''
+import os
+import sys
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from sqlalchemy import event
+
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from flaskr.search import create_search_index, drop_search_index
+from models import db, rebuild_category_counts, Question, QuestionRow, Category
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports']
+# question and answer words, so searches match a known share of the rows
+WORDS = [
+  'river', 'mountain', 'painter', 'novel', 'planet', 'empire', 'guitar', 'olympic',
+  'ocean', 'element', 'composer', 'desert', 'volcano', 'treaty', 'galaxy', 'sculpture',
+  'island', 'dynasty', 'opera', 'marathon',
+]
+
+
+@contextmanager
+def count_queries():
+  statements = []
+
+  def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+  event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+  try:
+    yield statements
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def reset_db():
+  db.session.remove()
+  # seed() builds the search index after its inserts, which is faster than
+  # keeping it current row by row
+  drop_search_index(db.session.connection())
+  db.session.commit()
+  db.drop_all()
+  db.create_all()
+
+
+def seed(num_questions, batch_size=50000):
+  db.session.execute(Category.__table__.insert(), [
+    {'id': i + 1, 'type': type} for i, type in enumerate(CATEGORIES)])
+  for start in range(0, num_questions, batch_size):
+    db.session.execute(Question.__table__.insert(), [{
+      'question': 'Question %d: which %s %s?' % (i, WORDS[i % len(WORDS)], WORDS[i // len(WORDS) % len(WORDS)]),
+      'answer': 'Answer %d %s' % (i, WORDS[i // len(WORDS) ** 2 % len(WORDS)]),
+      'category': i % len(CATEGORIES) + 1, 'difficulty': i % 5 + 1
+    } for i in range(start, min(start + batch_size, num_questions))])
+  rebuild_category_counts(db.session.connection())
+  create_search_index(db.session.connection())
+  db.session.commit()
+
+
+def request(client, method, url, **kwargs):
+  # requests share the benchmark's app context, so end the scoped
+  # session ourselves the way the context teardown would
+  try:
+    return client.open(url, method=method, **kwargs)
+  finally:
+    db.session.remove()
+
+
+def timed_request(client, method, url, repeat, **kwargs):
+  '''Returns (query count of one request, best latency in ms over `repeat` runs).'''
+  best = None
+  for i in range(repeat):
+    with count_queries() as statements:
+      start = time.perf_counter()
+      response = request(client, method, url, **kwargs)
+      elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.status_code
+    best = elapsed if best is None else min(best, elapsed)
+  return len(statements), best
+
+
+def bench_questions(app, args):
+  '''First page, last page by ?page= and last page by ?after= for `size` questions.'''
+  print('%10s %8s %12s %12s %12s' % ('questions', 'queries', 'first_ms', 'last_page_ms', 'last_after_ms'))
+  client = app.test_client()
+  for size in args.sizes:
+    reset_db()
+    seed(size)
+    last_page = (size - 1) // QUESTIONS_PER_PAGE + 1
+    last_after = (last_page - 1) * QUESTIONS_PER_PAGE
+    queries, first = timed_request(client, 'GET', '/questions', args.repeat)
+    _, by_page = timed_request(client, 'GET', '/questions?page=%d' % last_page, args.repeat)
+    _, by_after = timed_request(client, 'GET', '/questions?after=%d' % last_after, args.repeat)
+    print('%10d %8d %12.1f %12.1f %12.1f' % (size, queries, first, by_page, by_after))
+
+
+def bench_quiz(app, args):
+  '''
+  One /quizzes step in a category of `size` questions, fresh and half
+  played, and a step of a half played quiz session.
+  '''
+  print('%10s %8s %12s %14s %12s' % ('category', 'queries', 'fresh_ms', 'half_played_ms', 'session_ms'))
+  client = app.test_client()
+  for size in args.sizes:
+    reset_db()
+    seed(size * len(CATEGORIES))
+    played = [question_id for question_id, in
+              db.session.query(Question.id).filter(Question.category == 1).limit(size // 2)]
+    db.session.remove()
+    category = {'id': 1, 'type': CATEGORIES[0]}
+    # the first request fills the id cache
+    request(client, 'POST', '/quizzes', json={'quiz_category': category, 'previous_questions': []})
+    queries, fresh = timed_request(client, 'POST', '/quizzes', args.repeat,
+                                   json={'quiz_category': category, 'previous_questions': []})
+    _, half = timed_request(client, 'POST', '/quizzes', args.repeat,
+                            json={'quiz_category': category, 'previous_questions': played})
+    session_id = request(client, 'POST', '/quizzes', json={
+      'quiz_category': category, 'previous_questions': played, 'session': True}).get_json()['session_id']
+    _, session = timed_request(client, 'POST', '/quizzes', args.repeat, json={'session_id': session_id})
+    print('%10d %8d %12.1f %14.1f %12.1f' % (size, queries, fresh, half, session))
+
+
+# search terms: a common word, two words, a prefix, and answer text, which
+# the ILIKE scan of the question never found
+SEARCH_TERMS = ['painter', 'volcano galaxy', 'sculpt', 'answer 12']
+
+
+def bench_search(app, args):
+  '''POST /questions/search against the ILIKE scan it replaced, for `size` questions.'''
+  print('%10s %-16s %8s %8s %10s %10s' % ('questions', 'term', 'ilike', 'matches', 'ilike_ms', 'search_ms'))
+  client = app.test_client()
+  for size in args.sizes:
+    reset_db()
+    seed(size)
+    db.session.remove()
+    for term in SEARCH_TERMS:
+      best = None
+      for i in range(args.repeat):
+        start = time.perf_counter()
+        found = [question.format() for question in
+                 Question.query.filter(Question.question.ilike('%' + term + '%')).all()]
+        elapsed = (time.perf_counter() - start) * 1000
+        db.session.remove()
+        best = elapsed if best is None else min(best, elapsed)
+      response = request(client, 'POST', '/questions/search', json={'searchTerm': term})
+      matches = response.get_json().get('total_questions', 0)
+      _, searched = timed_request(client, 'POST', '/questions/search', args.repeat, json={'searchTerm': term}) \
+        if response.status_code == 200 else (0, 0.0)
+      print('%10d %-16s %8d %8d %10.1f %10.1f' % (size, term, len(found), matches, best, searched))
+
+
+def held_bytes(load):
+  '''Bytes still allocated while the result of load() is kept.'''
+  db.session.remove()
+  tracemalloc.start()
+  try:
+    before = tracemalloc.get_traced_memory()[0]
+    result = load()
+    held = tracemalloc.get_traced_memory()[0] - before
+  finally:
+    tracemalloc.stop()
+  del result
+  db.session.remove()
+  return held
+
+
+def bench_rows(app, args):
+  '''Bytes per listed question as ORM instances and as QuestionRow tuples.'''
+  print('%10s %10s %10s' % ('questions', 'orm_B', 'row_B'))
+  for size in args.sizes:
+    reset_db()
+    seed(size)
+    orm = held_bytes(lambda: Question.query.all())
+    rows = held_bytes(lambda: QuestionRow.query(Question.query))
+    print('%10d %10.0f %10.0f' % (size, orm / size, rows / size))
+
+
+# (weight, method, path, json body) of the requests replayed by `http`
+HTTP_MIX = [
+  (40, 'POST', '/quizzes', {'quiz_category': {'id': 0, 'type': 'click'}, 'previous_questions': []}),
+  (30, 'GET', '/questions', None),
+  (20, 'GET', '/categories', None),
+  (10, 'POST', '/quizzes', {'quiz_category': {'id': 1, 'type': 'Science'}, 'previous_questions': [1, 7, 13]}),
+]
+
+
+async def http_client(host, port, deadline, latencies, errors):
+  '''One keep-alive connection issuing HTTP_MIX requests until `deadline`.'''
+  rng = random.Random()
+  weights = [weight for weight, method, path, body in HTTP_MIX]
+  reader = writer = None
+  while time.perf_counter() < deadline:
+    weight, method, path, body = rng.choices(HTTP_MIX, weights)[0]
+    payload = json.dumps(body).encode() if body is not None else b''
+    start = time.perf_counter()
+    try:
+      if writer is None:
+        reader, writer = await asyncio.open_connection(host, port)
+      writer.write(('%s %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n'
+                    'Content-Length: %d\r\n\r\n' % (method, path, host, len(payload))).encode() + payload)
+      head = await reader.readuntil(b'\r\n\r\n')
+      status = int(head.split(b' ', 2)[1])
+      length = 0
+      for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+          length = int(value)
+        elif name.strip().lower() == b'connection' and value.strip().lower() == b'close':
+          writer.close()
+          writer = None
+      await reader.readexactly(length)
+    except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+      status = None
+      if writer is not None:
+        writer.close()
+      writer = None
+    if status is not None and status < 400:
+      latencies.append(time.perf_counter() - start)
+    else:
+      errors.append(status)
+  if writer is not None:
+    writer.close()
+
+
+def percentile(ordered, p):
+  if not ordered:
+    return 0.0
+  return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def bench_http(args):
+  '''Requests per second and latency of a running server at `concurrency` connections.'''
+  url = urlsplit(args.url)
+  latencies, errors = [], []
+
+  async def run():
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(*(http_client(url.hostname, url.port or 80, deadline, latencies, errors)
+                           for i in range(args.concurrency)))
+
+  start = time.perf_counter()
+  asyncio.run(run())
+  elapsed = time.perf_counter() - start
+  latencies.sort()
+  print('%12s %9s %7s %9s %9s %9s %9s' % ('concurrency', 'requests', 'errors', 'req/s', 'p50_ms', 'p95_ms', 'p99_ms'))
+  print('%12d %9d %7d %9.1f %9.1f %9.1f %9.1f' % (
+    args.concurrency, len(latencies), len(errors), len(latencies) / elapsed,
+    percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000, percentile(latencies, 99) * 1000))
+
+
+BENCHMARKS = {
+  'questions': bench_questions,
+  'quiz': bench_quiz,
+  'search': bench_search,
+  'rows': bench_rows,
+}
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['http'])
+  parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--count-ttl', type=int, default=0, help='seconds to reuse the question count')
+  parser.add_argument('--url', default='http://127.0.0.1:5000', help='server driven by the http benchmark')
+  parser.add_argument('--concurrency', type=int, default=1000, help='open connections for http')
+  parser.add_argument('--duration', type=float, default=30, help='seconds to run http for')
+  args = parser.parse_args(argv)
+
+  if args.benchmark == 'http':
+    return bench_http(args)
+
+  database_path = os.environ.get('TRIVIA_BENCH_DB') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+  app = create_app({'DATABASE_PATH': database_path, 'QUESTION_COUNT_TTL': args.count_ttl})
+  with app.app_context():
+    BENCHMARKS[args.benchmark](app, args)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -1,27 +1,103 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, Response, request, abort, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
-
-from models import setup_db, Question, Category
+import time
+from sqlalchemy import func
+
+from models import setup_db, db, database_path, question_listeners, category_listeners, Question, QuestionRow, Category, CategoryCount
+from .quiz import QuestionPicker, QuizSessions
+from .snapshot import QuestionSnapshot
+from .categories import CategorySnapshot
+from .bulk import BulkImportError, read_rows, import_questions, export_questions
+from . import search
+from db_pool import pool_stats
+from instrumentation import Instrumentation, metrics_access
 
 QUESTIONS_PER_PAGE = 10
 
-def paginate_questions(request, selection):
+def paginate_questions(request, query):
+  """
+  Returns one page of formatted questions, fetched with LIMIT in the
+  database. `?after=<id>` pages by id (keyset) and stays as cheap deep into
+  the bank; `?page=<n>` is kept for the frontend and uses OFFSET.
+  """
+  query = query.order_by(Question.id)
+  after = request.args.get('after', None, type=int)
+  if after is not None:
+    query = query.filter(Question.id > after)
+  else:
+    page = request.args.get('page', 1, type=int)
+    query = query.offset(max(page - 1, 0) * QUESTIONS_PER_PAGE)
+
+  return [question.format() for question in QuestionRow.query(query.limit(QUESTIONS_PER_PAGE))]
+
+def paginate_snapshot(request, snapshot, category=None):
+  """
+  paginate_questions() for the in-memory question snapshot.
+  """
+  after = request.args.get('after', None, type=int)
   page = request.args.get('page', 1, type=int)
-  start =  (page - 1) * QUESTIONS_PER_PAGE
-  end = start + QUESTIONS_PER_PAGE
+  return [row.format() for row in snapshot.page(category, after, page, QUESTIONS_PER_PAGE)]
+
+def question_counter(app, ttl):
+  """
+  Returns a function counting questions with one COUNT query, reusing the
+  result for `ttl` seconds. The cached count is dropped whenever a question
+  is inserted or deleted through `app`.
+  """
+  cached = {}
 
-  questions = [question.format() for question in selection]
-  current_questions = questions[start:end]
+  def count():
+    if 'value' not in cached or cached['expires'] <= time.monotonic():
+      cached['value'] = db.session.query(func.count(Question.id)).scalar()
+      cached['expires'] = time.monotonic() + ttl
+    return cached['value']
 
-  return current_questions
+  def invalidate(event, question):
+    if event != 'update':
+      cached.clear()
+
+  question_listeners(app).append(invalidate)
+  return count
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
+  app.config['QUESTION_COUNT_TTL'] = int(os.environ.get('QUESTION_COUNT_TTL', 5))
+  app.config['QUIZ_IDS_TTL'] = int(os.environ.get('QUIZ_IDS_TTL', 60))
+  app.config['QUIZ_SESSIONS_MAX'] = int(os.environ.get('QUIZ_SESSIONS_MAX', 10000))
+  app.config['QUIZ_SESSION_TTL'] = int(os.environ.get('QUIZ_SESSION_TTL', 3600))
+  app.config['CATEGORIES_TTL'] = int(os.environ.get('CATEGORIES_TTL', 60))
+  app.config['CATEGORIES_MAX_AGE'] = int(os.environ.get('CATEGORIES_MAX_AGE', 0))
+  app.config['BULK_BATCH_SIZE'] = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+  app.config['QUESTION_SNAPSHOT'] = os.environ.get('QUESTION_SNAPSHOT', '') not in ('', '0')
+  app.config['QUESTION_SNAPSHOT_MAX_AGE'] = int(os.environ.get('QUESTION_SNAPSHOT_MAX_AGE', 300))
+  if os.environ.get('SQL_QUERY_BUDGET'):
+    app.config['SQL_QUERY_BUDGET'] = int(os.environ['SQL_QUERY_BUDGET'])
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+  setup_db(app, app.config.get('DATABASE_PATH', database_path))
+  count_questions = question_counter(app, app.config['QUESTION_COUNT_TTL'])
+  picker = QuestionPicker(ttl=app.config['QUIZ_IDS_TTL'])
+  question_listeners(app).append(picker.question_changed)
+  # opt-in read model serving the question reads from memory
+  snapshot = None
+  if app.config['QUESTION_SNAPSHOT']:
+    snapshot = QuestionSnapshot(max_age=app.config['QUESTION_SNAPSHOT_MAX_AGE'])
+    question_listeners(app).append(snapshot.question_changed)
+  sessions = QuizSessions(snapshot or picker, max_sessions=app.config['QUIZ_SESSIONS_MAX'], ttl=app.config['QUIZ_SESSION_TTL'])
+  category_snapshot = CategorySnapshot(ttl=app.config['CATEGORIES_TTL'])
+  category_listeners(app).append(category_snapshot.category_changed)
+
+  def gauges():
+    values = {'db_pool_' + name: value for name, value in pool_stats(db.engine).items()}
+    if snapshot is not None:
+      values.update(('question_snapshot_' + name, value)
+                    for name, value in snapshot.stats().items() if value is not None)
+    return values
+
+  Instrumentation(app, gauges=gauges)
   
   '''
   @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -46,16 +122,27 @@ def create_app(test_config=None):
     
   @app.route('/categories')
   def retrieve_categories():
-    categories = Category.query.order_by(Category.id).all()
+    categories, etag = category_snapshot.get()
 
     if len(categories) == 0:
       abort(404)
 
-    return jsonify({
-      'success': True,
-      'categories':  {category.id: category.type for category in categories},
-      'total_categories': len(categories)
-    })
+    if etag in request.if_none_match:
+      response = app.response_class(status=304)
+    else:
+      response = jsonify({
+        'success': True,
+        'categories': categories,
+        'total_categories': len(categories)
+      })
+    response.set_etag(etag)
+    if app.config['CATEGORIES_MAX_AGE']:
+      response.headers['Cache-Control'] = 'public, max-age=%d' % app.config['CATEGORIES_MAX_AGE']
+    else:
+      # let clients keep the body but revalidate it each time, which the
+      # ETag makes a bodiless 304
+      response.headers['Cache-Control'] = 'no-cache'
+    return response
 
   '''
   @TODO: 
@@ -72,20 +159,28 @@ def create_app(test_config=None):
   
   @app.route('/questions')
   def retrieve_questions():
-    selection = Question.query.order_by(Question.id).all()
-    current_questions = paginate_questions(request, selection)
-
-    categories = Category.query.order_by(Category.type).all()
+    if snapshot is not None:
+      current_questions = paginate_snapshot(request, snapshot)
+    else:
+      current_questions = paginate_questions(request, Question.query)
 
     if len(current_questions) == 0:
       abort(404)
 
+    if snapshot is not None:
+      total_questions = snapshot.count()
+      categories, etag = category_snapshot.get()
+    else:
+      total_questions = count_questions()
+      categories = {category.id: category.type for category in Category.query.order_by(Category.type)}
+
     return jsonify({
       'success': True,
       'questions': current_questions,
-      'total_questions': len(selection),
-      'categories': {category.id: category.type for category in categories},
-      'current_category': None
+      'total_questions': total_questions,
+      'categories': categories,
+      'current_category': None,
+      'next_after': current_questions[-1]['id'] if len(current_questions) == QUESTIONS_PER_PAGE else None
     })
 
   '''
@@ -145,6 +240,30 @@ def create_app(test_config=None):
     except:
       abort(422)
 
+  @app.route('/questions/bulk', methods=['POST'])
+  def create_questions():
+    try:
+      created = import_questions(read_rows(request), app.config['BULK_BATCH_SIZE'])
+    except BulkImportError as error:
+      return jsonify({
+        'success': False,
+        'error': 422,
+        'message': 'unprocessable',
+        'errors': error.errors,
+        'total_errors': error.error_count
+        }), 422
+
+    return jsonify({
+      'success': True,
+      'created': created
+    })
+
+  @app.route('/questions/export')
+  def export():
+    category = request.args.get('category', None, type=int)
+    lines = export_questions(app.config['BULK_BATCH_SIZE'], category)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
   '''
   @TODO: 
   Create a POST endpoint to get questions based on a search term. 
@@ -163,15 +282,20 @@ def create_app(test_config=None):
     except: 
       abort(422)
 
-    search_questions = Question.query.filter(Question.question.ilike(f'%{search_term}%')).all()
+    page = body.get('page')
+    try:
+      page = search.page_number(page if page is not None else request.args.get('page', 1, type=int))
+    except ValueError:
+      abort(400)
+    found, total_questions = search.search_questions(db.session, search_term or '', page, QUESTIONS_PER_PAGE)
 
-    if len(search_questions) == 0:
+    if len(found) == 0:
       abort(404)
 
     return jsonify({
       'success': True,
-      'questions': [question.format() for question in search_questions],
-      'total_questions': len(search_questions),
+      'questions': [question.format() for question in found],
+      'total_questions': total_questions,
       'current_category': None
     })
 
@@ -186,21 +310,35 @@ def create_app(test_config=None):
   
   @app.route('/categories/<int:category_id>/questions')
   def retrieve_category_questions(category_id):
-    current_category = Category.query.filter(Category.id == category_id).one_or_none()
-
-    if current_category is None:
-      abort(404)
-
-    current_questions = Question.query.filter(Question.category == category_id).all()
+    if snapshot is not None:
+      categories, etag = category_snapshot.get()
+      if category_id not in categories:
+        abort(404)
+      current_category = {'id': category_id, 'type': categories[category_id]}
+      total_questions = snapshot.count(category_id)
+      current_questions = paginate_snapshot(request, snapshot, category_id)
+    else:
+      # the category and its maintained question count in one query
+      found = db.session.query(Category, CategoryCount.question_count) \
+        .outerjoin(CategoryCount, CategoryCount.category_id == Category.id) \
+        .filter(Category.id == category_id).one_or_none()
+
+      if found is None:
+        abort(404)
+      current_category, total_questions = found
+      current_category = current_category.format()
+
+      current_questions = paginate_questions(request, Question.query.filter(Question.category == category_id))
 
     if len(current_questions) == 0:
       abort(404)
 
     return jsonify({
       'success': True,
-      'questions': [question.format() for question in current_questions],
-      'total_questions': len(current_questions),
-      'current_category': current_category.format()
+      'questions': current_questions,
+      'total_questions': total_questions or 0,
+      'current_category': current_category,
+      'next_after': current_questions[-1]['id'] if len(current_questions) == QUESTIONS_PER_PAGE else None
     })
 
 
@@ -224,29 +362,57 @@ def create_app(test_config=None):
     try:
       category = body.get('quiz_category')
       previous_questions = body.get('previous_questions')
+      session_id = body.get('session_id')
     except: 
       abort(422)
 
     try:
-
-      if category['id'] == 0:
-        available_questions = Question.query.filter(Question.id.notin_((previous_questions))).all()
-      else:
-        available_questions = Question.query.filter_by(category=category['id']).filter(Question.id.notin_((previous_questions))).all()
-
-      if len(available_questions) == 0:
-        new_question = None
+      if session_id or body.get('session'):
+        # the server remembers what was played; an unknown or expired
+        # session starts over from whatever the client sent
+        try:
+          new_question = sessions.next(session_id)
+        except KeyError:
+          session_id = sessions.start(category['id'] or None, previous_questions or [])
+          new_question = sessions.next(session_id)
       else:
-        new_question = available_questions[random.randrange( 0, len(available_questions))].format()               
+        new_question = (snapshot or picker).pick(category['id'] or None, previous_questions or [])
 
-      return jsonify({
+      response = {
         'success': True,
-        'question': new_question
-      })
+        'question': new_question.format() if new_question is not None else None
+      }
+      if session_id:
+        response['session_id'] = session_id
+      return jsonify(response)
 
     except:
       abort(422)
 
+  @app.cli.command('create-search-index')
+  def create_search_index():
+    '''Builds the full-text index behind POST /questions/search.'''
+    with db.engine.begin() as connection:
+      search.create_search_index(connection)
+
+  def check_stats_access():
+    # the stats pages are gated like /metrics, see instrumentation.py
+    status = metrics_access(app, request.headers.get('Authorization'))
+    if status is not None:
+      abort(status)
+
+  @app.route('/pool/stats')
+  def retrieve_pool_stats():
+    check_stats_access()
+    return jsonify(pool_stats(db.engine))
+
+  @app.route('/snapshot/stats')
+  def retrieve_snapshot_stats():
+    check_stats_access()
+    if snapshot is None:
+      abort(404)
+    return jsonify(snapshot.stats())
+
   '''
   @TODO: 
   Create error handlers for all expected errors 
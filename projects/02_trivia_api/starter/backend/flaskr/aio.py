@@ -0,0 +1,527 @@
+'''
+Asyncio deployment of the trivia API.
+
+create_app() here builds a Quart app with the same routes and JSON bodies as
+flaskr.create_app(), running its queries on an SQLAlchemy async engine, so
+one worker serves many concurrent quiz players instead of one per thread.
+It needs the packages in requirements-async.txt and an ASGI server:
+
+  pip install -r requirements-async.txt
+  hypercorn 'flaskr.aio:create_app()' --workers 4 --bind 0.0.0.0:5000
+
+PostgreSQL URLs are served through asyncpg and SQLite URLs through
+aiosqlite. Pool settings come from the same DB_* variables as db_pool.py.
+
+Two differences from the threaded app: there is no question snapshot, so
+GET /snapshot/stats is always a 404, and POST /questions/bulk reads the
+whole body before validating it instead of streaming NDJSON line by line.
+Quiz sessions, like the threaded app's, live in the memory of one worker.
+'''
+import os
+import time
+from array import array
+from collections import OrderedDict
+
+from quart import Quart, request, abort, g, has_request_context, jsonify
+from sqlalchemy import event, func, select
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from db_pool import engine_options, pool_stats, TimedPool, TimedNullPool
+from instrumentation import Instrumentation, QueryBudgetExceeded, PROMETHEUS_MIMETYPE, over_budget, metrics_access
+from models import database_path, adjust_category_counts, Question, Category, CategoryCount
+from . import QUESTIONS_PER_PAGE
+from .bulk import NDJSON_TYPES, BulkImportError, read_lines, array_rows, validated_batches, insert_batch, export_query, ndjson
+from .categories import categories_etag
+from .quiz import MAX_ID_ARRAYS, QuizSessions, pick_from
+from .search import match_query, page_number, search_indexes
+
+ASYNC_DRIVERS = {
+  'postgresql': 'postgresql+asyncpg',
+  'postgres': 'postgresql+asyncpg',
+  'sqlite': 'sqlite+aiosqlite',
+}
+
+questions = Question.__table__
+categories = Category.__table__
+category_counts = CategoryCount.__table__
+
+
+class TimedAsyncQueuePool(TimedPool, AsyncAdaptedQueuePool):
+  pass
+
+
+def async_engine(url):
+  '''
+  Returns an async engine for a database URL written for the sync app.
+  '''
+  url = make_url(url)
+  options = engine_options(str(url))
+  # async engines need an async-adapted queue pool
+  poolclass = options.pop('poolclass', None)
+  if poolclass is not None:
+    options['poolclass'] = TimedNullPool if issubclass(poolclass, NullPool) else TimedAsyncQueuePool
+  # asyncpg takes server settings instead of a libpq options string
+  connect_args = options.pop('connect_args', None)
+  if connect_args:
+    statement_timeout = connect_args['options'].split('=', 1)[1]
+    options['connect_args'] = {'server_settings': {'statement_timeout': statement_timeout}}
+  return create_async_engine(url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]), **options)
+
+
+class Cached:
+  '''
+  Holds values for `ttl` seconds, at most `max_size` of them, dropping the
+  least recently used first. The async app is the only writer it knows
+  about, so its routes drop values they change.
+  '''
+  def __init__(self, ttl, max_size=1):
+    self.ttl = ttl
+    self.max_size = max_size
+    self.values = OrderedDict()
+
+  def get(self, key):
+    entry = self.values.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+      self.values.move_to_end(key)
+      return entry[1]
+    return None
+
+  def set(self, key, value):
+    self.values[key] = (time.monotonic() + self.ttl, value)
+    self.values.move_to_end(key)
+    while len(self.values) > self.max_size:
+      self.values.popitem(last=False)
+    return value
+
+  def clear(self):
+    self.values.clear()
+
+
+def create_app(test_config=None):
+  app = Quart(__name__)
+  app.config['QUESTION_COUNT_TTL'] = int(os.environ.get('QUESTION_COUNT_TTL', 5))
+  app.config['QUIZ_IDS_TTL'] = int(os.environ.get('QUIZ_IDS_TTL', 60))
+  app.config['CATEGORIES_TTL'] = int(os.environ.get('CATEGORIES_TTL', 60))
+  app.config['CATEGORIES_MAX_AGE'] = int(os.environ.get('CATEGORIES_MAX_AGE', 0))
+  app.config['BULK_BATCH_SIZE'] = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+  app.config['QUIZ_SESSIONS_MAX'] = int(os.environ.get('QUIZ_SESSIONS_MAX', 10000))
+  app.config['QUIZ_SESSION_TTL'] = int(os.environ.get('QUIZ_SESSION_TTL', 3600))
+  if os.environ.get('SQL_QUERY_BUDGET'):
+    app.config['SQL_QUERY_BUDGET'] = int(os.environ['SQL_QUERY_BUDGET'])
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+
+  engine = async_engine(app.config.get('DATABASE_PATH', database_path))
+  instrumentation = Instrumentation(gauges=lambda: {
+    'db_pool_' + name: value for name, value in pool_stats(engine.sync_engine).items()})
+  question_count = Cached(app.config['QUESTION_COUNT_TTL'])
+  quiz_ids = Cached(app.config['QUIZ_IDS_TTL'], max_size=MAX_ID_ARRAYS)
+  category_snapshot = Cached(app.config['CATEGORIES_TTL'])
+  sessions = QuizSessions(None, max_sessions=app.config['QUIZ_SESSIONS_MAX'], ttl=app.config['QUIZ_SESSION_TTL'])
+
+  def questions_changed():
+    question_count.clear()
+    quiz_ids.clear()
+
+  async def all_categories():
+    snapshot = category_snapshot.get('categories')
+    if snapshot is None:
+      async with engine.connect() as conn:
+        rows = await conn.execute(select(categories.c.id, categories.c.type).order_by(categories.c.id))
+        result = {row.id: row.type for row in rows}
+      snapshot = category_snapshot.set('categories', (result, categories_etag(result)))
+    return snapshot
+
+  async def count_questions(conn):
+    count = question_count.get('count')
+    if count is None:
+      count = question_count.set('count', await conn.scalar(select(func.count(questions.c.id))))
+    return count
+
+  async def category_ids(conn, category):
+    ids = quiz_ids.get(category)
+    if ids is None:
+      query = select(questions.c.id).order_by(questions.c.id)
+      if category is not None:
+        query = query.where(questions.c.category == category)
+      ids = quiz_ids.set(category, array('q', (await conn.execute(query)).scalars()))
+    return ids
+
+  # the request hooks and cursor events of instrumentation.py, for Quart;
+  # cursor events run on the request's task, so they see its g
+  @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+  def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('aio_start', []).append((context, time.perf_counter()))
+
+  @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+  def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('aio_start')
+    if not started:
+      return
+    duration = time.perf_counter() - started.pop()[1]
+    current = g.get('instrumentation') if has_request_context() else None
+    if current is not None:
+      current['statements'].append((duration, statement))
+      current['query_time'] += duration
+
+  @event.listens_for(engine.sync_engine, 'handle_error')
+  def handle_error(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get('aio_start') if conn is not None else None
+    if started and started[-1][0] is exception_context.execution_context:
+      started.pop()
+
+  @app.before_request
+  async def before_request():
+    g.instrumentation = {'start': time.perf_counter(), 'statements': [], 'query_time': 0.0}
+
+  @app.after_request
+  async def after_request(response):
+    current = g.pop('instrumentation', None)
+    if current is not None:
+      route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+      instrumentation.record(request.method, route, time.perf_counter() - current['start'],
+                             current['statements'], current['query_time'])
+      queries = len(current['statements'])
+      view = app.view_functions.get(request.endpoint)
+      budget = getattr(view, 'query_budget', None)
+      message = over_budget(request.method, route, queries,
+                            budget if budget is not None else app.config.get('SQL_QUERY_BUDGET'))
+      if message is not None:
+        if app.testing:
+          raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+      response.headers['X-Query-Count'] = str(queries)
+
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,true')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    return response
+
+  @app.after_serving
+  async def dispose_engine():
+    await engine.dispose()
+
+  @app.route('/categories')
+  async def retrieve_categories():
+    result, etag = await all_categories()
+
+    if len(result) == 0:
+      abort(404)
+
+    if etag in request.if_none_match:
+      response = app.response_class('', status=304)
+    else:
+      response = jsonify({
+        'success': True,
+        'categories': result,
+        'total_categories': len(result)
+      })
+    response.set_etag(etag)
+    if app.config['CATEGORIES_MAX_AGE']:
+      response.headers['Cache-Control'] = 'public, max-age=%d' % app.config['CATEGORIES_MAX_AGE']
+    else:
+      response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+  def page_query(query):
+    # the ?page= / ?after= paging of flaskr.paginate_questions
+    query = query.order_by(questions.c.id).limit(QUESTIONS_PER_PAGE)
+    after = request.args.get('after', None, type=int)
+    if after is not None:
+      return query.where(questions.c.id > after)
+    page = request.args.get('page', 1, type=int)
+    return query.offset(max(page - 1, 0) * QUESTIONS_PER_PAGE)
+
+  @app.route('/questions')
+  async def retrieve_questions():
+    async with engine.connect() as conn:
+      current_questions = [dict(row) for row in (await conn.execute(page_query(select(questions)))).mappings()]
+      if len(current_questions) == 0:
+        abort(404)
+      total_questions = await count_questions(conn)
+
+    result, etag = await all_categories()
+
+    return jsonify({
+      'success': True,
+      'questions': current_questions,
+      'total_questions': total_questions,
+      'categories': {category_id: result[category_id] for category_id in sorted(result, key=result.get)},
+      'current_category': None,
+      'next_after': current_questions[-1]['id'] if len(current_questions) == QUESTIONS_PER_PAGE else None
+    })
+
+  @app.route("/questions/<int:question_id>", methods=['DELETE'])
+  async def delete_question(question_id):
+    async with engine.begin() as conn:
+      category = await conn.scalar(select(questions.c.category).where(questions.c.id == question_id))
+      deleted = (await conn.execute(questions.delete().where(questions.c.id == question_id))).rowcount
+      if deleted:
+        await conn.run_sync(adjust_category_counts, {category: -1})
+    if not deleted:
+      abort(422)
+    questions_changed()
+
+    return jsonify({
+      'success': True,
+      'deleted': question_id
+    })
+
+  @app.route('/questions', methods=['POST'])
+  async def create_question():
+    body = await request.get_json()
+
+    if not body or not ('question' in body and 'answer' in body and 'difficulty' in body and 'category' in body):
+      abort(422)
+
+    try:
+      category = int(body.get('category'))
+      async with engine.begin() as conn:
+        result = await conn.execute(questions.insert().values(
+          question=body.get('question'),
+          answer=body.get('answer'),
+          difficulty=body.get('difficulty'),
+          category=category))
+        await conn.run_sync(adjust_category_counts, {category: 1})
+      questions_changed()
+
+      return jsonify({
+        'success': True,
+        'created': result.inserted_primary_key[0]
+      })
+
+    except Exception:
+      abort(422)
+
+  @app.route('/questions/bulk', methods=['POST'])
+  async def create_questions():
+    inserted = 0
+    try:
+      if request.mimetype in NDJSON_TYPES:
+        rows = read_lines((await request.get_data(as_text=True)).splitlines())
+      else:
+        rows = array_rows(await request.get_json(silent=True))
+      async with engine.begin() as conn:
+        category_ids = set((await conn.execute(select(categories.c.id))).scalars())
+        for batch in validated_batches(rows, category_ids, app.config['BULK_BATCH_SIZE']):
+          await conn.run_sync(insert_batch, batch)
+          inserted += len(batch)
+    except BulkImportError as error:
+      return jsonify({
+        'success': False,
+        'error': 422,
+        'message': 'unprocessable',
+        'errors': error.errors,
+        'total_errors': error.error_count
+        }), 422
+    if inserted:
+      questions_changed()
+
+    return jsonify({
+      'success': True,
+      'created': inserted
+    })
+
+  @app.route('/questions/export')
+  async def export():
+    category = request.args.get('category', None, type=int)
+    batch_size = app.config['BULK_BATCH_SIZE']
+
+    async def lines():
+      last_id = None
+      async with engine.connect() as conn:
+        while True:
+          rows = (await conn.execute(export_query(batch_size, category, last_id))).mappings().all()
+          if not rows:
+            return
+          yield ndjson(rows).encode()
+          if len(rows) < batch_size:
+            return
+          last_id = rows[-1]['id']
+
+    return app.response_class(lines(), mimetype='application/x-ndjson')
+
+  @app.route('/questions/search', methods=['POST'])
+  async def search_questions():
+    body = await request.get_json()
+    try:
+      search_term = body.get('searchTerm', None)
+    except Exception:
+      abort(422)
+
+    page = body.get('page')
+    try:
+      page = page_number(page if page is not None else request.args.get('page', 1, type=int))
+    except ValueError:
+      abort(400)
+
+    found = []
+    async with engine.connect() as conn:
+      indexes = await conn.run_sync(search_indexes)
+      matches = match_query(conn.dialect.name, search_term or '', (page - 1) * QUESTIONS_PER_PAGE,
+                            QUESTIONS_PER_PAGE, indexes)
+      page_rows = (await conn.execute(matches)).all()
+      page_ids = [row.id for row in page_rows]
+      if page_ids:
+        rows = await conn.execute(select(questions).where(questions.c.id.in_(page_ids)))
+        by_id = {row['id']: dict(row) for row in rows.mappings()}
+        found = [by_id[question_id] for question_id in page_ids if question_id in by_id]
+
+    if len(found) == 0:
+      abort(404)
+
+    return jsonify({
+      'success': True,
+      'questions': found,
+      'total_questions': page_rows[0].total,
+      'current_category': None
+    })
+
+  @app.route('/categories/<int:category_id>/questions')
+  async def retrieve_category_questions(category_id):
+    async with engine.connect() as conn:
+      found = (await conn.execute(
+        select(categories.c.id, categories.c.type, category_counts.c.question_count)
+        .select_from(categories.outerjoin(category_counts, category_counts.c.category_id == categories.c.id))
+        .where(categories.c.id == category_id))).mappings().one_or_none()
+      if found is None:
+        abort(404)
+
+      rows = await conn.execute(page_query(select(questions).where(questions.c.category == category_id)))
+      current_questions = [dict(row) for row in rows.mappings()]
+
+    if len(current_questions) == 0:
+      abort(404)
+
+    return jsonify({
+      'success': True,
+      'questions': current_questions,
+      'total_questions': found['question_count'] or 0,
+      'current_category': {'id': found['id'], 'type': found['type']},
+      'next_after': current_questions[-1]['id'] if len(current_questions) == QUESTIONS_PER_PAGE else None
+    })
+
+  async def get_question(conn, question_id):
+    row = (await conn.execute(select(questions).where(questions.c.id == question_id))).mappings().one_or_none()
+    return dict(row) if row is not None else None
+
+  async def session_question(conn, session_id):
+    # ids deleted since the session started are passed over
+    while True:
+      question_id = sessions.next_id(session_id)
+      if question_id is None:
+        return None
+      question = await get_question(conn, question_id)
+      if question is not None:
+        return question
+
+  @app.route('/quizzes', methods=['POST'])
+  async def play():
+    body = await request.get_json()
+
+    try:
+      category = body.get('quiz_category')
+      previous_questions = body.get('previous_questions') or []
+      session_id = body.get('session_id')
+    except Exception:
+      abort(422)
+
+    def category_id():
+      # only needed when a question is picked from a category
+      try:
+        return int(category['id']) or None
+      except Exception:
+        abort(422)
+
+    async with engine.connect() as conn:
+      if session_id or body.get('session'):
+        # the server remembers what was played; an unknown or expired
+        # session starts over from whatever the client sent
+        try:
+          new_question = await session_question(conn, session_id)
+        except KeyError:
+          session_id = sessions.open(await category_ids(conn, category_id()), previous_questions)
+          new_question = await session_question(conn, session_id)
+      else:
+        for attempt in range(2):
+          question_id = pick_from(await category_ids(conn, category_id()), previous_questions)
+          if question_id is None:
+            new_question = None
+            break
+          new_question = await get_question(conn, question_id)
+          if new_question is not None:
+            break
+          # deleted by another process since the ids were read
+          quiz_ids.clear()
+
+    response = {
+      'success': True,
+      'question': new_question
+    }
+    if session_id:
+      response['session_id'] = session_id
+    return jsonify(response)
+
+  def check_stats_access():
+    # the stats pages are gated like /metrics, see instrumentation.py
+    status = metrics_access(app, request.headers.get('Authorization'))
+    if status is not None:
+      abort(status)
+
+  @app.route('/pool/stats')
+  async def retrieve_pool_stats():
+    check_stats_access()
+    return jsonify(pool_stats(engine.sync_engine))
+
+  @app.route('/snapshot/stats')
+  async def retrieve_snapshot_stats():
+    check_stats_access()
+    # the question snapshot is not ported
+    abort(404)
+
+  @app.route('/metrics')
+  async def metrics():
+    status = metrics_access(app, request.headers.get('Authorization'))
+    if status is not None:
+      abort(status)
+    data = instrumentation.snapshot()
+    if request.args.get('format') == 'json':
+      return jsonify(data)
+    return app.response_class(instrumentation.prometheus(data), mimetype=PROMETHEUS_MIMETYPE)
+
+  @app.errorhandler(400)
+  async def bad_request(error):
+    return jsonify({
+      "success": False,
+      "error": 400,
+      "message": "Bad request"
+      }), 400
+
+  @app.errorhandler(404)
+  async def not_found(error):
+    return jsonify({
+      "success": False,
+      "error": 404,
+      "message": "Not found"
+      }), 404
+
+  @app.errorhandler(422)
+  async def unprocessable(error):
+    return jsonify({
+      "success": False,
+      "error": 422,
+      "message": "unprocessable"
+      }), 422
+
+  @app.errorhandler(500)
+  async def server_error(error):
+    return jsonify({
+      "success": False,
+      "error": 500,
+      "message": "Internal Server Error"
+      }), 500
+
+  return app
@@ -0,0 +1,164 @@
+'''
+Bulk question import and export.
+
+An import is validated row by row while it is read and inserted with
+executemany in batches, all inside one transaction: either every row goes
+in or, when any row is invalid, none does and the response lists the bad
+rows. An NDJSON body is read line by line, so only one batch is held in
+memory. Exports page through the table by id and are written out as NDJSON
+one batch at a time.
+'''
+import json
+from collections import Counter
+
+from sqlalchemy import select
+
+from models import db, adjust_category_counts, notify_question_listeners, Question, Category
+
+BATCH_SIZE = 1000
+# errors listed in a rejected import; the rest are only counted
+MAX_ERRORS = 100
+
+FIELDS = ('question', 'answer', 'difficulty', 'category')
+
+
+class BulkImportError(Exception):
+  def __init__(self, errors, error_count):
+    super().__init__('%d invalid rows' % error_count)
+    self.errors = errors
+    self.error_count = error_count
+
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/jsonlines')
+
+
+def read_rows(request):
+  '''
+  Yields the rows of a JSON array body, or of an NDJSON body (one object
+  per line) when the content type is application/x-ndjson.
+  '''
+  if request.mimetype in NDJSON_TYPES:
+    yield from read_lines(request.stream)
+  else:
+    yield from array_rows(request.get_json(silent=True))
+
+
+def read_lines(lines):
+  '''
+  Yields the object on each NDJSON line. A line that is not valid JSON is
+  yielded as None, so it is reported like any other bad row.
+  '''
+  for line in lines:
+    if not line.strip():
+      continue
+    try:
+      yield json.loads(line)
+    except ValueError:
+      yield None
+
+
+def array_rows(rows):
+  if not isinstance(rows, list):
+    raise BulkImportError([{'row': None, 'error': 'body must be a JSON array or NDJSON'}], 1)
+  return rows
+
+
+def validate_question(row, category_ids):
+  '''Returns the row to insert, or raises ValueError naming the problem.'''
+  if not isinstance(row, dict):
+    raise ValueError('not a JSON object')
+  missing = [field for field in FIELDS if row.get(field) in (None, '')]
+  if missing:
+    raise ValueError('missing ' + ', '.join(missing))
+  if not isinstance(row['question'], str) or not isinstance(row['answer'], str):
+    raise ValueError('question and answer must be strings')
+  try:
+    difficulty = int(row['difficulty'])
+    category = int(row['category'])
+  except (TypeError, ValueError):
+    raise ValueError('difficulty and category must be integers')
+  if category not in category_ids:
+    raise ValueError('unknown category %d' % category)
+  return {'question': row['question'], 'answer': row['answer'],
+          'difficulty': difficulty, 'category': category}
+
+
+def validated_batches(rows, category_ids, batch_size=BATCH_SIZE):
+  '''
+  Yields `rows` validated, in lists of `batch_size`. After the first invalid
+  row no more batches are yielded, but the rest are still validated, and
+  BulkImportError listing the invalid rows is raised at the end.
+  '''
+  batch = []
+  errors = []
+  error_count = 0
+  for index, row in enumerate(rows):
+    try:
+      batch.append(validate_question(row, category_ids))
+    except ValueError as error:
+      error_count += 1
+      if len(errors) < MAX_ERRORS:
+        errors.append({'row': index, 'error': str(error)})
+    if error_count:
+      batch = []
+    elif len(batch) == batch_size:
+      yield batch
+      batch = []
+  if error_count:
+    raise BulkImportError(errors, error_count)
+  if batch:
+    yield batch
+
+
+def insert_batch(connection, batch):
+  connection.execute(Question.__table__.insert(), batch)
+  adjust_category_counts(connection, Counter(row['category'] for row in batch))
+
+
+def import_questions(rows, batch_size=BATCH_SIZE):
+  '''
+  Inserts `rows` in one transaction and returns how many were inserted.
+  Raises BulkImportError, after rolling back, if any row is invalid.
+  '''
+  category_ids = {category_id for category_id, in db.session.query(Category.id)}
+  inserted = 0
+  try:
+    for batch in validated_batches(rows, category_ids, batch_size):
+      insert_batch(db.session.connection(), batch)
+      inserted += len(batch)
+    db.session.commit()
+  except Exception:
+    db.session.rollback()
+    raise
+
+  if inserted:
+    notify_question_listeners('bulk_insert', None)
+  return inserted
+
+
+def export_query(batch_size=BATCH_SIZE, category=None, after=None):
+  '''The next `batch_size` questions (of `category`, if given) after the id `after`.'''
+  table = Question.__table__
+  query = select([table]).order_by(table.c.id).limit(batch_size)
+  if category is not None:
+    query = query.where(table.c.category == category)
+  if after is not None:
+    query = query.where(table.c.id > after)
+  return query
+
+
+def ndjson(rows):
+  return ''.join(json.dumps(dict(row)) + '\n' for row in rows)
+
+
+def export_questions(batch_size=BATCH_SIZE, category=None):
+  '''Yields every question (of `category`, if given) as NDJSON lines, by id.'''
+  last_id = None
+  while True:
+    rows = db.session.execute(export_query(batch_size, category, last_id)).fetchall()
+    if not rows:
+      return
+    yield ndjson(rows)
+    if len(rows) < batch_size:
+      return
+    last_id = rows[-1]['id']
@@ -0,0 +1,52 @@
+'''
+In-memory snapshot of the categories for GET /categories.
+
+Categories almost never change, so the id -> type map is read once and
+kept with a strong ETag computed from its content. The snapshot is
+dropped when a category is written through the Category model, and
+re-read after `ttl` seconds to pick up writes made by other processes.
+Because the ETag is a content hash, every worker hands out the same tag
+for the same categories.
+'''
+import hashlib
+import json
+import threading
+import time
+
+from models import Category
+
+
+class CategorySnapshot:
+  def __init__(self, ttl=60, clock=time.monotonic):
+    self.ttl = ttl
+    self.clock = clock
+    # bumped on every category write, so a snapshot read while a write
+    # was committing is not kept
+    self.version = 0
+    self._snapshot = None
+    self._lock = threading.Lock()
+
+  def category_changed(self, event, category):
+    with self._lock:
+      self.version += 1
+      self._snapshot = None
+
+  def get(self):
+    '''
+    Returns (categories, etag), where categories maps id to type.
+    '''
+    snapshot = self._snapshot
+    if snapshot is not None and snapshot[0] > self.clock():
+      return snapshot[1], snapshot[2]
+
+    version = self.version
+    categories = {category.id: category.type for category in Category.query.order_by(Category.id)}
+    etag = categories_etag(categories)
+    with self._lock:
+      if self.version == version:
+        self._snapshot = (self.clock() + self.ttl, categories, etag)
+    return categories, etag
+
+
+def categories_etag(categories):
+  return hashlib.sha1(json.dumps(sorted(categories.items())).encode()).hexdigest()
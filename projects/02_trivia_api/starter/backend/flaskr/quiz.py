@@ -0,0 +1,223 @@
+'''
+Random question selection for /quizzes.
+
+The ids of each category (and of all questions) are read once into a
+compact array and kept for a while. A pick draws random positions from
+that array until it lands on an id the player has not seen, so neither
+the candidate rows nor the previous_questions list go to the database.
+Only when most of a category has been played does it fall back to
+scanning the array for what is left.
+
+A quiz session moves that state to the server: it keeps the id array it
+started with and a lazily shuffled position in it, so each round costs
+O(1) whatever the client has already seen, and the client need not send
+previous_questions at all.
+'''
+import random
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from models import db, Question
+
+# random draws tried before scanning for the remaining ids
+MAX_DRAWS = 16
+# id arrays a picker keeps; past this the least recently used is dropped,
+# so made-up category ids sent by clients cannot grow it without bound
+MAX_ID_ARRAYS = 64
+
+
+class QuestionPicker:
+  def __init__(self, ttl=60, max_arrays=MAX_ID_ARRAYS, clock=time.monotonic):
+    self.ttl = ttl
+    self.max_arrays = max_arrays
+    self.clock = clock
+    # category id, or None for all categories -> (expires, array of ids),
+    # least recently used first
+    self._ids = OrderedDict()
+    self._lock = threading.Lock()
+
+  def question_changed(self, event, question):
+    with self._lock:
+      if event == 'update' or question is None:
+        # the question may have moved category, or many rows changed
+        self._ids.clear()
+      else:
+        self._ids.pop(None, None)
+        self._ids.pop(_category_key(question.category), None)
+
+  def invalidate(self, category=None):
+    with self._lock:
+      self._ids.pop(_category_key(category), None)
+
+  def ids(self, category=None):
+    key = _category_key(category)
+    with self._lock:
+      entry = self._ids.get(key)
+      if entry is not None:
+        self._ids.move_to_end(key)
+    if entry is not None and entry[0] > self.clock():
+      return entry[1]
+
+    query = db.session.query(Question.id).order_by(Question.id)
+    if key is not None:
+      query = query.filter(Question.category == key)
+    ids = array('q', (question_id for question_id, in query))
+    with self._lock:
+      self._ids[key] = (self.clock() + self.ttl, ids)
+      self._ids.move_to_end(key)
+      while len(self._ids) > self.max_arrays:
+        self._ids.popitem(last=False)
+    return ids
+
+  def get(self, question_id):
+    return Question.query.get(question_id)
+
+  def pick_id(self, category=None, previous_questions=()):
+    '''
+    Returns a random question id of `category` (None for any) that is not
+    in `previous_questions`, or None when every question has been played.
+    '''
+    return pick_from(self.ids(category), previous_questions)
+
+  def pick(self, category=None, previous_questions=()):
+    '''
+    Returns a random unplayed Question, or None. An id deleted by another
+    process since the array was read causes one reload and retry.
+    '''
+    for attempt in range(2):
+      question_id = self.pick_id(category, previous_questions)
+      if question_id is None:
+        return None
+      question = Question.query.get(question_id)
+      if question is not None:
+        return question
+      self.invalidate(category)
+    return None
+
+
+class QuizSession:
+  '''
+  A random order over `ids` drawn one id at a time: a Fisher-Yates shuffle
+  that records only the positions it has swapped, so it costs memory in
+  proportion to the rounds played rather than to the category.
+  '''
+  __slots__ = ('ids', 'skip', 'drawn', 'swaps', 'expires')
+
+  def __init__(self, ids, skip, expires):
+    self.ids = ids
+    self.skip = skip
+    self.drawn = 0
+    self.swaps = {}
+    self.expires = expires
+
+  def draw(self):
+    while self.drawn < len(self.ids):
+      i = self.drawn
+      j = random.randrange(i, len(self.ids))
+      position = self.swaps.pop(j, j)
+      if j != i:
+        self.swaps[j] = self.swaps.pop(i, i)
+      self.drawn += 1
+      question_id = self.ids[position]
+      if question_id not in self.skip:
+        return question_id
+    return None
+
+
+class QuizSessions:
+  '''
+  Quiz sessions by id, the least recently used dropped past
+  `max_sessions` and any left unused for `ttl` seconds. Question ids and
+  questions come from `picker`, a QuestionPicker or QuestionSnapshot; the
+  asyncio app has none, and reads them itself for open() and next_id().
+  '''
+  def __init__(self, picker, max_sessions=10000, ttl=3600, clock=time.monotonic):
+    self.picker = picker
+    self.max_sessions = max_sessions
+    self.ttl = ttl
+    self.clock = clock
+    self._sessions = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._sessions)
+
+  def start(self, category=None, previous_questions=()):
+    '''
+    Returns the id of a new session over the questions of `category` (None
+    for any), skipping `previous_questions`.
+    '''
+    # the array is shared with the picker; it is replaced, never changed,
+    # when questions change
+    return self.open(self.picker.ids(category), previous_questions)
+
+  def open(self, ids, previous_questions=()):
+    '''
+    Returns the id of a new session over the `ids` array, skipping
+    `previous_questions`. The array must not change while the session is
+    open.
+    '''
+    session_id = secrets.token_urlsafe(16)
+    now = self.clock()
+    session = QuizSession(ids, frozenset(previous_questions), now + self.ttl)
+    with self._lock:
+      while self._sessions:
+        oldest = next(iter(self._sessions.values()))
+        if oldest.expires > now and len(self._sessions) < self.max_sessions:
+          break
+        self._sessions.popitem(last=False)
+      self._sessions[session_id] = session
+    return session_id
+
+  def next_id(self, session_id):
+    '''
+    Returns the session's next question id, or None when it has run out.
+    Raises KeyError for an unknown or expired session.
+    '''
+    now = self.clock()
+    with self._lock:
+      session = self._sessions[session_id]
+      if session.expires <= now:
+        del self._sessions[session_id]
+        raise KeyError(session_id)
+      session.expires = now + self.ttl
+      self._sessions.move_to_end(session_id)
+      return session.draw()
+
+  def next(self, session_id):
+    '''
+    Returns the session's next Question, or None. Ids deleted since the
+    session started are passed over.
+    '''
+    while True:
+      question_id = self.next_id(session_id)
+      if question_id is None:
+        return None
+      question = self.picker.get(question_id)
+      if question is not None:
+        return question
+
+
+def pick_from(ids, previous_questions=()):
+  '''
+  Returns a random id from the `ids` array that is not in
+  `previous_questions`, or None when there is none left.
+  '''
+  previous = set(previous_questions)
+
+  if len(previous) < len(ids):
+    for i in range(MAX_DRAWS):
+      question_id = ids[random.randrange(len(ids))]
+      if question_id not in previous:
+        return question_id
+
+  remaining = [question_id for question_id in ids if question_id not in previous]
+  return random.choice(remaining) if remaining else None
+
+
+def _category_key(category):
+  # the frontend sends category ids as strings, and 0 for all categories
+  return (int(category) or None) if category is not None else None
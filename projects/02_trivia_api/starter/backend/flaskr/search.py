@@ -0,0 +1,203 @@
+'''
+Question search.
+
+A question matches when its question text contains the search term, as
+ILIKE '%term%' would find it, or when its question or answer text contains
+every word of the term, the last one possibly as the start of a word, so
+results follow along as the user types. Word matches come first, ranked
+with ts_rank on PostgreSQL and bm25 on SQLite, then the remaining substring
+matches by id. An empty term matches every question.
+
+On PostgreSQL, word matches come from a GIN index on the english tsvector
+of the question and answer, and substring matches from a pg_trgm index on
+the question. On SQLite, they come from two FTS5 tables kept in sync by
+triggers: questions_fts with a porter tokenizer and questions_trigram with
+a trigram one. Until those tables exist SQLite searches with a LIKE scan of
+the question, as does any other backend.
+
+The indexes are created by migrations/0002_question_search.sql and
+0003_question_substring_search.sql, or by `flask create-search-index`
+(create_search_index()) for databases built with db.create_all(). Neither
+runs when the app starts.
+'''
+import re
+import weakref
+
+from sqlalchemy import text
+
+from models import Question, QuestionRow
+
+DOCUMENT = "coalesce(question, '') || ' ' || coalesce(answer, '')"
+
+# SQLite FTS5 tables: name -> (indexed columns, tokenizer)
+FTS_TABLES = {
+  'questions_fts': ('question, answer', 'porter unicode61'),
+  'questions_trigram': ('question', 'trigram'),
+}
+
+# engine -> FTS tables known to exist, so search_indexes() looks them up
+# until all are found and not on every search
+_indexed = weakref.WeakKeyDictionary()
+
+
+def create_search_index(bind):
+  if bind.dialect.name == 'postgresql':
+    bind.execute(text(
+      "CREATE INDEX IF NOT EXISTS ix_questions_search ON questions "
+      "USING gin (to_tsvector('english', %s))" % DOCUMENT))
+    bind.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    bind.execute(text(
+      'CREATE INDEX IF NOT EXISTS ix_questions_question_trgm ON questions USING gin (question gin_trgm_ops)'))
+  elif bind.dialect.name == 'sqlite':
+    existing = _existing_tables(bind)
+    for table, (columns, tokenizer) in FTS_TABLES.items():
+      if table in existing:
+        continue
+      values = ', '.join('new.' + column.strip() for column in columns.split(','))
+      old_values = ', '.join('old.' + column.strip() for column in columns.split(','))
+      statements = [
+        '''CREATE VIRTUAL TABLE {0} USING fts5({1}, content='questions', content_rowid='id', tokenize='{2}')''',
+        '''CREATE TRIGGER {0}_ai AFTER INSERT ON questions BEGIN
+             INSERT INTO {0}(rowid, {1}) VALUES (new.id, {3});
+           END''',
+        '''CREATE TRIGGER {0}_ad AFTER DELETE ON questions BEGIN
+             INSERT INTO {0}({0}, rowid, {1}) VALUES ('delete', old.id, {4});
+           END''',
+        '''CREATE TRIGGER {0}_au AFTER UPDATE OF {1} ON questions BEGIN
+             INSERT INTO {0}({0}, rowid, {1}) VALUES ('delete', old.id, {4});
+             INSERT INTO {0}(rowid, {1}) VALUES (new.id, {3});
+           END''',
+        '''INSERT INTO {0}({0}) VALUES ('rebuild')''',
+      ]
+      for statement in statements:
+        bind.execute(text(statement.format(table, columns, tokenizer, values, old_values)))
+    _indexed[bind.engine] = set(FTS_TABLES)
+
+
+def drop_search_index(bind):
+  if bind.dialect.name == 'postgresql':
+    bind.execute(text('DROP INDEX IF EXISTS ix_questions_search'))
+    bind.execute(text('DROP INDEX IF EXISTS ix_questions_question_trgm'))
+  elif bind.dialect.name == 'sqlite':
+    for table in FTS_TABLES:
+      for trigger in ('ai', 'ad', 'au'):
+        bind.execute(text('DROP TRIGGER IF EXISTS %s_%s' % (table, trigger)))
+      bind.execute(text('DROP TABLE IF EXISTS %s' % table))
+  _indexed.pop(bind.engine, None)
+
+
+def _existing_tables(bind):
+  names = [name for name, in bind.execute(text(
+    "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (%s)" %
+    ', '.join("'%s'" % table for table in FTS_TABLES)))]
+  return set(names)
+
+
+def search_indexes(bind):
+  '''
+  The FTS tables a SQLite database has. PostgreSQL searches need no index
+  to run, only to run fast, so there this is always every table.
+  '''
+  if bind.dialect.name != 'sqlite':
+    return set(FTS_TABLES)
+  found = _indexed.get(bind.engine)
+  if found is None or len(found) < len(FTS_TABLES):
+    found = _existing_tables(bind)
+    if len(found) == len(FTS_TABLES):
+      _indexed[bind.engine] = found
+  return found
+
+
+def _words(term):
+  # only word characters reach the query, so punctuation in the search box
+  # cannot be read as tsquery or FTS5 syntax
+  return re.findall(r'\w+', term.lower())
+
+
+def _escape_like(term):
+  return re.sub(r'([\\%_])', r'\\\1', term)
+
+
+def match_query(dialect, term, offset, limit, indexes=FTS_TABLES):
+  '''
+  Query of (id, total) rows for the matches of `term` on a `dialect`
+  database, best first, from `offset` on and at most `limit` of them.
+  total is the number of matches, and `indexes` the FTS tables a SQLite
+  database has (see search_indexes()).
+  '''
+  term = term.strip()
+  words = _words(term)
+  params = {'offset': offset, 'limit': limit}
+
+  if not term:
+    return text(
+      'SELECT id, count(*) OVER () AS total FROM questions ORDER BY id LIMIT :limit OFFSET :offset'
+    ).bindparams(**params)
+
+  ranked = None
+  contained = "SELECT id FROM questions WHERE lower(question) LIKE lower(:pattern) ESCAPE '\\'"
+  if dialect == 'sqlite':
+    if words and 'questions_fts' in indexes:
+      ranked = 'SELECT rowid AS id, bm25(questions_fts) AS score FROM questions_fts WHERE questions_fts MATCH :query'
+      params['query'] = ' '.join('"%s"' % word for word in words) + '*'
+    # trigrams only find terms of three characters or more; a quoted
+    # phrase, its own quotes doubled, matches any text containing it
+    if 'questions_trigram' in indexes and len(term) >= 3:
+      contained = 'SELECT rowid AS id FROM questions_trigram WHERE questions_trigram MATCH :phrase'
+      params['phrase'] = '"%s"' % term.replace('"', '""')
+  elif dialect == 'postgresql':
+    if words:
+      # the document is written exactly as in the index definition, so the
+      # index is used
+      document = "to_tsvector('english', %s)" % DOCUMENT
+      ranked = (
+        "SELECT id, -ts_rank({0}, to_tsquery('english', :query)) AS score FROM questions "
+        "WHERE {0} @@ to_tsquery('english', :query)".format(document))
+      params['query'] = ' & '.join(words) + ':*'
+    contained = "SELECT id FROM questions WHERE question ILIKE :pattern ESCAPE '\\'"
+  if ':pattern' in contained:
+    params['pattern'] = '%' + _escape_like(term) + '%'
+
+  if ranked is None:
+    query = (
+      'SELECT id, count(*) OVER () AS total FROM ({0}) AS matches '
+      'ORDER BY id LIMIT :limit OFFSET :offset'.format(contained))
+  else:
+    # word matches by rank, then the other substring matches by id
+    query = (
+      'WITH ranked AS ({0}) '
+      'SELECT id, count(*) OVER () AS total FROM ('
+      'SELECT id, 0 AS tier, score FROM ranked '
+      'UNION ALL '
+      'SELECT id, 1 AS tier, 0 AS score FROM ({1}) AS contained WHERE id NOT IN (SELECT id FROM ranked)'
+      ') AS matches ORDER BY tier, score, id LIMIT :limit OFFSET :offset'.format(ranked, contained))
+  return text(query).bindparams(**params)
+
+
+def page_number(value):
+  '''
+  Returns the page number a search request gave, or raises ValueError when
+  it is not a positive integer.
+  '''
+  if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+    raise ValueError('page must be a positive integer, not %r' % (value,))
+  return value
+
+
+def search_questions(session, term, page=1, per_page=10):
+  '''
+  Returns (questions on `page`, number of matches) for `term`, best match
+  first. One query ranks and counts the matches and picks the page's ids,
+  and only the page is loaded. Past the last page the count is 0.
+  '''
+  connection = session.connection()
+  matches = match_query(connection.dialect.name, term, (page - 1) * per_page, per_page,
+                        search_indexes(connection))
+  rows = session.execute(matches).all()
+  if not rows:
+    return [], 0
+
+  page_ids = [row.id for row in rows]
+  questions = {question.id: question for question in
+               QuestionRow.query(session.query(Question).filter(Question.id.in_(page_ids)))}
+  return [questions[question_id] for question_id in page_ids if question_id in questions], rows[0].total
@@ -0,0 +1,233 @@
+'''
+In-memory read model of the question bank.
+
+With QUESTION_SNAPSHOT set, every question is held in process in columns:
+an id-sorted array of ids, arrays of categories and difficulties, and lists
+of the question and answer strings, plus a sorted id array per category.
+GET /questions, GET /categories/<id>/questions and POST /quizzes are then
+served from memory without touching the database.
+
+Writes through the Question model are applied in place as they commit. A
+bulk import, or `max_age` seconds without a full load, makes the next read
+load the bank again, which is how writes made by other processes show up.
+The load builds a new bank beside the old one, and only one thread loads at
+a time, so once a bank exists reads are never blocked behind a load.
+'''
+import bisect
+import sys
+import threading
+import time
+from array import array
+
+from sqlalchemy import select
+
+from models import db, Question, QuestionRow
+from .quiz import pick_from, _category_key
+
+
+class Bank:
+  '''The columns of every question, in id order.'''
+  def __init__(self):
+    self.ids = array('q')
+    self.categories = array('q')
+    self.difficulties = array('q')
+    self.questions = []
+    self.answers = []
+    # category id -> sorted array of its question ids
+    self.by_category = {}
+
+  @classmethod
+  def load(cls, connection):
+    bank = cls()
+    table = Question.__table__
+    result = connection.execute(select([getattr(table.c, name) for name in QuestionRow._fields]).order_by(table.c.id))
+    for question_id, question, answer, category, difficulty in result:
+      bank.append(question_id, question, answer, category, difficulty)
+    return bank
+
+  def append(self, question_id, question, answer, category, difficulty):
+    self.ids.append(question_id)
+    self.questions.append(question)
+    self.answers.append(answer)
+    self.categories.append(category or 0)
+    self.difficulties.append(difficulty or 0)
+    self.by_category.setdefault(category or 0, array('q')).append(question_id)
+
+  def position(self, question_id):
+    i = bisect.bisect_left(self.ids, question_id)
+    return i if i < len(self.ids) and self.ids[i] == question_id else None
+
+  def row(self, i):
+    return QuestionRow(self.ids[i], self.questions[i], self.answers[i],
+                       self.categories[i] or None, self.difficulties[i] or None)
+
+  def insert(self, question):
+    i = bisect.bisect_left(self.ids, question.id)
+    if i == len(self.ids):
+      return self.append(question.id, question.question, question.answer, question.category, question.difficulty)
+    if self.ids[i] == question.id:
+      return self.update(question)
+    self.ids.insert(i, question.id)
+    self.questions.insert(i, question.question)
+    self.answers.insert(i, question.answer)
+    self.categories.insert(i, question.category or 0)
+    self.difficulties.insert(i, question.difficulty or 0)
+    ids = self.by_category.setdefault(question.category or 0, array('q'))
+    ids.insert(bisect.bisect_left(ids, question.id), question.id)
+
+  def delete(self, question_id):
+    i = self.position(question_id)
+    if i is None:
+      return
+    ids = self.by_category[self.categories[i]]
+    del ids[bisect.bisect_left(ids, question_id)]
+    del self.ids[i], self.questions[i], self.answers[i], self.categories[i], self.difficulties[i]
+
+  def update(self, question):
+    i = self.position(question.id)
+    if i is None or self.categories[i] != (question.category or 0):
+      self.delete(question.id)
+      return self.insert(question)
+    self.questions[i] = question.question
+    self.answers[i] = question.answer
+    self.difficulties[i] = question.difficulty or 0
+
+  def category_ids(self, category=None):
+    '''The sorted ids of `category`, of every question when it is None.'''
+    key = _category_key(category)
+    return self.ids if key is None else self.by_category.get(key, array('q'))
+
+  def size(self):
+    '''Bytes held by the columns, the strings in them and the category arrays.'''
+    size = sum(sys.getsizeof(column) for column in
+               (self.ids, self.categories, self.difficulties, self.questions, self.answers, self.by_category))
+    size += sum(sys.getsizeof(text) for text in self.questions)
+    size += sum(sys.getsizeof(text) for text in self.answers)
+    size += sum(sys.getsizeof(ids) for ids in self.by_category.values())
+    return size
+
+
+class QuestionSnapshot:
+  def __init__(self, max_age=300, clock=time.monotonic):
+    self.max_age = max_age
+    self.clock = clock
+    self._bank = None
+    self._loaded_at = None
+    self._changed_at = None
+    # bumped on every write, so a load racing a write is not kept as fresh
+    self.version = 0
+    self._lock = threading.RLock()
+    self._load_lock = threading.Lock()
+    # (bank, version) the memory size was measured at, and the size
+    self._measured = (None, None, 0)
+
+  def question_changed(self, event, question):
+    with self._lock:
+      self.version += 1
+      self._changed_at = self.clock()
+      if self._bank is None:
+        return
+      if question is None:
+        # many rows changed at once; load them all again on the next read
+        self._loaded_at = None
+      elif event == 'insert':
+        self._bank.insert(question)
+      elif event == 'delete':
+        self._bank.delete(question.id)
+      else:
+        self._bank.update(question)
+
+  def _fresh(self):
+    return self._loaded_at is not None and self._loaded_at + self.max_age > self.clock()
+
+  def reload(self):
+    '''
+    Loads the whole bank and swaps it in, unless another thread loaded it
+    while this one waited for the load lock.
+    '''
+    with self._load_lock:
+      self._reload()
+
+  def _reload(self):
+    with self._lock:
+      if self._fresh():
+        return
+      version = self.version
+    with db.engine.connect() as connection:
+      bank = Bank.load(connection)
+    with self._lock:
+      self._bank = bank
+      self._loaded_at = self.clock() if self.version == version else None
+      if self._changed_at is None:
+        self._changed_at = self._loaded_at
+
+  def bank(self):
+    with self._lock:
+      if self._fresh():
+        return self._bank
+      bank = self._bank
+    if bank is None:
+      # nothing to serve yet, so wait for the first load
+      self.reload()
+    elif self._load_lock.acquire(blocking=False):
+      try:
+        self._reload()
+      finally:
+        self._load_lock.release()
+    # while another thread reloads, the old bank is served
+    return self._bank
+
+  def count(self, category=None):
+    bank = self.bank()
+    with self._lock:
+      return len(bank.category_ids(category))
+
+  def page(self, category=None, after=None, page=1, per_page=10):
+    '''
+    Returns the questions of a page in id order, by position after the id
+    `after` when it is given or else by page number.
+    '''
+    bank = self.bank()
+    with self._lock:
+      ids = bank.category_ids(category)
+      if after is not None:
+        start = bisect.bisect_right(ids, after)
+      else:
+        start = max(page - 1, 0) * per_page
+      page_ids = ids[start:start + per_page]
+      if ids is bank.ids:
+        return [bank.row(i) for i in range(start, start + len(page_ids))]
+      return [bank.row(bank.position(question_id)) for question_id in page_ids]
+
+  def get(self, question_id):
+    bank = self.bank()
+    with self._lock:
+      i = bank.position(question_id)
+      return bank.row(i) if i is not None else None
+
+  def ids(self, category=None):
+    bank = self.bank()
+    with self._lock:
+      # a copy, as the bank's own arrays change in place
+      return array('q', bank.category_ids(category))
+
+  def pick(self, category=None, previous_questions=()):
+    bank = self.bank()
+    with self._lock:
+      question_id = pick_from(bank.category_ids(category), previous_questions)
+      return bank.row(bank.position(question_id)) if question_id is not None else None
+
+  def stats(self):
+    with self._lock:
+      now = self.clock()
+      bank, version, size = self._measured
+      if self._bank is not None and (bank is not self._bank or version != self.version):
+        # measuring walks every string, so only after a change
+        size = self._bank.size()
+        self._measured = (self._bank, self.version, size)
+      return {
+        'questions': len(self._bank.ids) if self._bank is not None else 0,
+        'memory_bytes': size,
+        'age_seconds': round(now - self._loaded_at, 3) if self._loaded_at is not None else None,
+        'since_change_seconds': round(now - self._changed_at, 3) if self._changed_at is not None else None,
+      }
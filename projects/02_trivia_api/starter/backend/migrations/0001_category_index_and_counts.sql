@@ -0,0 +1,47 @@
+-- Makes questions.category an indexed integer foreign key and adds the
+-- category_counts table the category pages read their totals from.
+--
+--   psql trivia < migrations/0001_category_index_and_counts.sql
+--
+-- Safe to run on a database restored from trivia.psql (category is already
+-- an integer there) and on one created by db.create_all() from the old
+-- String column.
+
+BEGIN;
+
+ALTER TABLE questions
+    ALTER COLUMN category TYPE integer USING nullif(category::text, '')::integer;
+
+-- rows pointing at categories that no longer exist would fail the constraint
+UPDATE questions SET category = NULL
+    WHERE category IS NOT NULL
+      AND category NOT IN (SELECT id FROM categories);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'questions'::regclass AND contype = 'f'
+    ) THEN
+        ALTER TABLE questions
+            ADD CONSTRAINT category FOREIGN KEY (category) REFERENCES categories(id)
+            ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+-- (category, id) serves both the category filter and its id ordering
+CREATE INDEX IF NOT EXISTS ix_questions_category ON questions (category, id);
+
+CREATE TABLE IF NOT EXISTS category_counts (
+    category_id integer PRIMARY KEY REFERENCES categories(id) ON DELETE CASCADE,
+    question_count integer NOT NULL DEFAULT 0
+);
+
+DELETE FROM category_counts;
+INSERT INTO category_counts (category_id, question_count)
+    SELECT category, count(id) FROM questions
+    WHERE category IS NOT NULL
+    GROUP BY category;
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Full-text index over question and answer text for POST /questions/search
+-- (see flaskr/search.py, whose query repeats this expression).
+--
+--   psql trivia < migrations/0002_question_search.sql
+--
+-- CONCURRENTLY keeps the table writable while the index builds, so it may
+-- be run against a live database; it cannot run inside a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search ON questions
+    USING gin (to_tsvector('english', coalesce(question, '') || ' ' || coalesce(answer, '')));
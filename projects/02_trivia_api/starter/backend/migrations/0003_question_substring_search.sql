@@ -0,0 +1,12 @@
+-- Trigram index on question text for the substring matches of
+-- POST /questions/search (see flaskr/search.py), which ILIKE '%term%' uses.
+--
+--   psql trivia < migrations/0003_question_substring_search.sql
+--
+-- CONCURRENTLY keeps the table writable while the index builds, so it may
+-- be run against a live database; it cannot run inside a transaction.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_question_trgm ON questions
+    USING gin (question gin_trgm_ops);
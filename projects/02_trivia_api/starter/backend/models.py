@@ -1,8 +1,12 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from collections import Counter, namedtuple
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, create_engine, event, inspect, select, func, text
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from db_pool import engine_options
+
 database_name = "trivia"
 database_path = "postgres://ayasafan:25399@{}/{}".format('localhost:5432', database_name)
 
@@ -15,9 +19,39 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
-    db.create_all()
+    with app.app_context():
+        db.create_all()
+
+'''
+question_listeners(app)
+    the app's functions called as listener(event, question) after a question
+    is inserted, updated or deleted, so its in-process caches can drop stale
+    data. After a bulk import the event is 'bulk_insert' and question is None.
+    The list is kept in app.extensions, so the caches go away with their app.
+'''
+def question_listeners(app):
+    return app.extensions.setdefault('question_listeners', [])
+
+def notify_question_listeners(event, question):
+    if has_app_context():
+        for listener in question_listeners(current_app):
+            listener(event, question)
+
+'''
+category_listeners(app)
+    the app's functions called as listener(event, category) after a category
+    is inserted, updated or deleted
+'''
+def category_listeners(app):
+    return app.extensions.setdefault('category_listeners', [])
+
+def notify_category_listeners(event, category):
+    if has_app_context():
+        for listener in category_listeners(current_app):
+            listener(event, category)
 
 '''
 Question
@@ -25,11 +59,13 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  # category pages filter on category and page by id
+  __table_args__ = (Index('ix_questions_category', 'category', 'id'),)
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'))
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -41,13 +77,16 @@ class Question(db.Model):
   def insert(self):
     db.session.add(self)
     db.session.commit()
+    notify_question_listeners('insert', self)
   
   def update(self):
     db.session.commit()
+    notify_question_listeners('update', self)
 
   def delete(self):
     db.session.delete(self)
     db.session.commit()
+    notify_question_listeners('delete', self)
 
   def format(self):
     return {
@@ -58,6 +97,24 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+'''
+QuestionRow
+    the columns of a question as a plain tuple, for read-only listings that
+    need neither the session's identity map nor instance state
+
+    QuestionRow.query(query) turns a Question query into a list of them
+'''
+class QuestionRow(namedtuple('QuestionRow', 'id question answer category difficulty')):
+  __slots__ = ()
+
+  @classmethod
+  def query(cls, query):
+    columns = [getattr(Question, name) for name in cls._fields]
+    return [cls(*row) for row in query.with_entities(*columns)]
+
+  def format(self):
+    return self._asdict()
+
 '''
 Category
 
@@ -71,8 +128,81 @@ class Category(db.Model):
   def __init__(self, type):
     self.type = type
 
+  def insert(self):
+    db.session.add(self)
+    db.session.commit()
+    notify_category_listeners('insert', self)
+
+  def update(self):
+    db.session.commit()
+    notify_category_listeners('update', self)
+
+  def delete(self):
+    db.session.delete(self)
+    db.session.commit()
+    notify_category_listeners('delete', self)
+
   def format(self):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+CategoryCount
+    number of questions in each category, kept up to date as questions are
+    written so category pages need not count their rows
+'''
+class CategoryCount(db.Model):
+  __tablename__ = 'category_counts'
+
+  category_id = Column(Integer, ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
+  question_count = Column(Integer, nullable=False, default=0)
+
+'''
+adjust_category_counts(connection, deltas)
+    adds deltas[category_id] to the counts, inside the caller's transaction.
+    Writes that bypass the Question model (executemany, the async app) call
+    this themselves; model writes go through the mapper events below. It is
+    one upsert, so two transactions adding the first question of a category
+    do not both try to insert its row.
+'''
+_upsert_category_count = text(
+  'INSERT INTO category_counts (category_id, question_count) VALUES (:category_id, :delta) '
+  'ON CONFLICT (category_id) DO UPDATE '
+  'SET question_count = category_counts.question_count + excluded.question_count')
+
+def adjust_category_counts(connection, deltas):
+  rows = [{'category_id': category_id, 'delta': delta}
+          for category_id, delta in deltas.items() if category_id is not None and delta != 0]
+  if rows:
+    connection.execute(_upsert_category_count, rows)
+
+'''
+rebuild_category_counts(connection)
+    recounts every category from the questions table
+'''
+def rebuild_category_counts(connection):
+  table = CategoryCount.__table__
+  questions = Question.__table__
+  connection.execute(table.delete())
+  connection.execute(table.insert().from_select(['category_id', 'question_count'],
+    select([questions.c.category, func.count(questions.c.id)])
+      .where(questions.c.category != None)
+      .group_by(questions.c.category)))
+
+@event.listens_for(Question, 'after_insert')
+def _count_inserted_question(mapper, connection, question):
+  adjust_category_counts(connection, {question.category: 1})
+
+@event.listens_for(Question, 'after_delete')
+def _count_deleted_question(mapper, connection, question):
+  adjust_category_counts(connection, {question.category: -1})
+
+@event.listens_for(Question, 'after_update')
+def _count_moved_question(mapper, connection, question):
+  history = inspect(question).attrs.category.history
+  if history.has_changes():
+    deltas = Counter({category: -1 for category in history.deleted})
+    deltas.update({category: 1 for category in history.added})
+    adjust_category_counts(connection, deltas)
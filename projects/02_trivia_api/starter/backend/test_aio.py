@@ -0,0 +1,198 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks import reset_db, seed
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from models import db
+
+try:
+    from flaskr import aio
+except ImportError:
+    # requirements-async.txt is not installed
+    aio = None
+
+SIZE = 60
+NDJSON = {'Content-Type': 'application/x-ndjson'}
+
+
+def seeded_database():
+    database_path = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'aio.db')
+    app = create_app({'DATABASE_PATH': database_path})
+    with app.app_context():
+        reset_db()
+        seed(SIZE)
+        db.session.remove()
+    return database_path
+
+
+@unittest.skipIf(aio is None, 'requirements-async.txt is not installed')
+class ParityTestCase(unittest.IsolatedAsyncioTestCase):
+    """The same requests against flaskr and flaskr.aio, each on its own copy of one seeded database"""
+
+    async def asyncSetUp(self):
+        config = {'TESTING': True, 'BULK_BATCH_SIZE': 7}
+        self.sync_client = create_app(dict(config, DATABASE_PATH=seeded_database())).test_client()
+        self.aio_app = aio.create_app(dict(config, DATABASE_PATH=seeded_database()))
+        self.aio_client = self.aio_app.test_client()
+        await self.aio_app.startup()
+
+    async def asyncTearDown(self):
+        await self.aio_app.shutdown()
+
+    async def open(self, method, url, **kwargs):
+        """((status, body) from flaskr, (status, body) from flaskr.aio)"""
+        sync_res = self.sync_client.open(url, method=method, **kwargs)
+        aio_res = await self.aio_client.open(url, method=method, **kwargs)
+        return ((sync_res.status_code, sync_res.get_data(as_text=True)),
+                (aio_res.status_code, await aio_res.get_data(as_text=True)))
+
+    async def assertSameJson(self, method, url, **kwargs):
+        (sync_status, sync_body), (aio_status, aio_body) = await self.open(method, url, **kwargs)
+
+        self.assertEqual(aio_status, sync_status, '%s %s' % (method, url))
+        self.assertEqual(json.loads(aio_body), json.loads(sync_body), '%s %s' % (method, url))
+        return sync_status, json.loads(sync_body)
+
+    async def test_reads(self):
+        for method, url, body in [
+                ('GET', '/categories', None),
+                ('GET', '/questions', None),
+                ('GET', '/questions?page=3', None),
+                ('GET', '/questions?page=99', None),
+                ('GET', '/questions?after=%d' % (SIZE - QUESTIONS_PER_PAGE), None),
+                ('GET', '/categories/2/questions', None),
+                ('GET', '/categories/2/questions?after=20', None),
+                ('GET', '/categories/99/questions', None),
+                ('POST', '/questions/search', {'searchTerm': 'question 1'}),
+                ('POST', '/questions/search', {'searchTerm': 'question 1', 'page': 2}),
+                ('POST', '/questions/search', {'searchTerm': 'question 1', 'page': 0}),
+                ('POST', '/questions/search', {'searchTerm': 'no such words'}),
+                ('GET', '/snapshot/stats', None)]:
+            with self.subTest(route='%s %s' % (method, url), body=body):
+                await self.assertSameJson(method, url, json=body)
+
+    async def test_writes(self):
+        question = {'question': 'new question', 'answer': 'answer', 'difficulty': 1, 'category': 2}
+
+        self.assertEqual(await self.assertSameJson('POST', '/questions', json=question),
+                         (200, {'success': True, 'created': SIZE + 1}))
+        await self.assertSameJson('DELETE', '/questions/3')
+        await self.assertSameJson('DELETE', '/questions/3')
+        await self.assertSameJson('POST', '/questions', json={'question': 'no answer'})
+        # the counts and pages the writes changed
+        await self.assertSameJson('GET', '/questions')
+        await self.assertSameJson('GET', '/categories/2/questions')
+        await self.assertSameJson('GET', '/categories/3/questions')
+
+    async def test_bulk(self):
+        rows = [{'question': 'bulk %d' % i, 'answer': 'answer', 'difficulty': 2, 'category': 4} for i in range(20)]
+        lines = ''.join(json.dumps(row) + '\n' for row in rows[:10])
+
+        await self.assertSameJson('POST', '/questions/bulk', json=rows)
+        await self.assertSameJson('POST', '/questions/bulk', data=lines, headers=NDJSON)
+        await self.assertSameJson('POST', '/questions/bulk', data=lines + 'not json\n{"question": "q"}\n',
+                                  headers=NDJSON)
+        await self.assertSameJson('POST', '/questions/bulk', json=rows + [dict(rows[0], category=99)])
+        await self.assertSameJson('POST', '/questions/bulk', json={'question': 'not a list'})
+        await self.assertSameJson('GET', '/categories/4/questions?after=%d' % SIZE)
+
+    async def test_export(self):
+        await self.assertSameJson('POST', '/questions/bulk', json=[
+            {'question': 'exported', 'answer': 'answer', 'difficulty': 2, 'category': 5}])
+
+        for url, lines in [('/questions/export', SIZE + 1), ('/questions/export?category=5', SIZE // 6 + 1),
+                           ('/questions/export?category=99', 0)]:
+            with self.subTest(url=url):
+                (sync_status, sync_body), (aio_status, aio_body) = await self.open('GET', url)
+
+                self.assertEqual((aio_status, aio_body), (sync_status, sync_body))
+                self.assertEqual(len(aio_body.splitlines()), lines)
+
+    async def test_quizzes(self):
+        for category, previous in [(0, []), (2, [2, 8, 14]), ('3', []), (99, [])]:
+            body = {'quiz_category': {'id': category, 'type': 'any'}, 'previous_questions': previous}
+            with self.subTest(category=category):
+                (sync_status, sync_body), (aio_status, aio_body) = await self.open('POST', '/quizzes', json=body)
+                sync_question = json.loads(sync_body)['question']
+                aio_question = json.loads(aio_body)['question']
+
+                # the question is picked at random, so compare where it came from
+                self.assertEqual((aio_status, aio_question is None), (sync_status, sync_question is None))
+                if aio_question is not None:
+                    self.assertNotIn(aio_question['id'], previous)
+                    if int(category):
+                        self.assertEqual(aio_question['category'], int(category))
+
+    async def sync_quiz(self, body):
+        return self.sync_client.post('/quizzes', json=body).get_json()
+
+    async def aio_quiz(self, body):
+        res = await self.aio_client.post('/quizzes', json=body)
+        return await res.get_json()
+
+    async def play_session(self, quiz, previous):
+        data = await quiz({'quiz_category': {'id': 2, 'type': 'Art'}, 'previous_questions': previous, 'session': True})
+        played = []
+        while data['question'] is not None:
+            played.append(data['question']['id'])
+            self.assertEqual(data['question']['category'], 2)
+            # only the session id after the first round
+            data = await quiz({'session_id': data['session_id']})
+        return played
+
+    async def test_quiz_sessions(self):
+        previous = [2, 8, 14]
+        sync_played = await self.play_session(self.sync_quiz, previous)
+        aio_played = await self.play_session(self.aio_quiz, previous)
+
+        self.assertEqual(len(set(aio_played)), len(aio_played))
+        self.assertEqual(sorted(aio_played), sorted(sync_played))
+        self.assertFalse(set(aio_played) & set(previous))
+
+        # an unknown session starts over from the category sent with it
+        body = {'quiz_category': {'id': 3, 'type': 'any'}, 'previous_questions': [], 'session_id': 'expired'}
+        (sync_status, sync_body), (aio_status, aio_body) = await self.open('POST', '/quizzes', json=body)
+        self.assertEqual((aio_status, sync_status), (200, 200))
+        self.assertNotEqual(json.loads(aio_body)['session_id'], 'expired')
+        self.assertEqual(json.loads(aio_body)['question']['category'], 3)
+        # and without one there is nothing to start over from
+        await self.assertSameJson('POST', '/quizzes', json={'session_id': 'expired'})
+
+    async def test_stats(self):
+        await self.open('GET', '/categories')
+        (sync_status, sync_body), (aio_status, aio_body) = await self.open('GET', '/pool/stats')
+
+        self.assertEqual((aio_status, sync_status), (200, 200))
+        self.assertIn('pool', json.loads(aio_body))
+
+        (sync_status, sync_body), (aio_status, aio_body) = await self.open('GET', '/metrics')
+        line = 'http_request_sql_queries_total{method="GET",route="/categories"} 1'
+
+        self.assertEqual((aio_status, sync_status), (200, 200))
+        self.assertIn(line, sync_body.splitlines())
+        self.assertIn(line, aio_body.splitlines())
+
+        # the page and the count; the categories were read above
+        res = await self.aio_client.get('/questions')
+        self.assertEqual(res.headers['X-Query-Count'], '2')
+
+    async def test_stats_access(self):
+        token = {'METRICS_TOKEN': 'secret'}
+        with mock.patch.dict(self.sync_client.application.config, token), \
+                mock.patch.dict(self.aio_app.config, token):
+            for url in ('/pool/stats', '/snapshot/stats', '/metrics'):
+                (sync_status, sync_body), (aio_status, aio_body) = await self.open('GET', url)
+                self.assertEqual((aio_status, sync_status), (401, 401), url)
+
+                (sync_status, sync_body), (aio_status, aio_body) = await self.open(
+                    'GET', url, headers={'Authorization': 'Bearer secret'})
+                # neither app has a snapshot here
+                self.assertEqual((aio_status, sync_status), (404, 404) if url == '/snapshot/stats' else (200, 200), url)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
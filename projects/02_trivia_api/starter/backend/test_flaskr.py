@@ -41,6 +41,32 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(len(data['categories']))
 
+    def test_304_retrieve_categories(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        self.assertEqual(res.headers['ETag'], etag)
+
+    def test_200_retrieve_categories_after_category_write(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+
+        category = Category('Music')
+        category.insert()
+        try:
+            res = self.client().get('/categories', headers={'If-None-Match': etag})
+            data = json.loads(res.data)
+        finally:
+            category.delete()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertIn('Music', data['categories'].values())
+
     def test_200_retrieve_questions(self):
         res = self.client().get('/questions')
         data = json.loads(res.data)
@@ -59,6 +85,24 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Not found')
 
+    def test_200_retrieve_questions_after(self):
+        res = self.client().get('/questions?after=5')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['questions']) <= 10)
+        self.assertTrue(all(question['id'] > 5 for question in data['questions']))
+        self.assertEqual(data['total_questions'], len(Question.query.all()))
+
+    def test_404_retrieve_questions_after(self):
+        res = self.client().get('/questions?after=100000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Not found')
+
     def test_200_delete_question(self):
         res = self.client().delete('/questions/10')
         data = json.loads(res.data)
@@ -94,7 +138,40 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
-    
+    def test_200_create_questions_bulk(self):
+        len_questions_before = len(Question.query.all())
+        lines = '\n'.join(json.dumps({'question': 'bulk question %d' % i, 'answer': 'answer', 'difficulty': 1, 'category': 1}) for i in range(3))
+        res = self.client().post('/questions/bulk', data=lines, content_type='application/x-ndjson')
+        data = json.loads(res.data)
+        len_questions_after = len(Question.query.all())
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["created"], 3)
+        self.assertEqual(len_questions_after, len_questions_before + 3)
+
+    def test_422_create_questions_bulk(self):
+        len_questions_before = len(Question.query.all())
+        res = self.client().post('/questions/bulk', json=[
+            {'question': 'bulk question', 'answer': 'answer', 'difficulty': 1, 'category': 1},
+            {'question': 'bulk question', 'difficulty': 1}])
+        data = json.loads(res.data)
+        len_questions_after = len(Question.query.all())
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["errors"][0]["row"], 1)
+        self.assertEqual(len_questions_after, len_questions_before)
+
+    def test_200_export_questions(self):
+        res = self.client().get('/questions/export?category=1')
+        questions = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(questions), len(Question.query.filter(Question.category == 1).all()))
+
+
     def test_200_search_questions(self):
         res = self.client().post('/questions/search', json={'searchTerm': "title"})
         data = json.loads(res.data)
@@ -104,6 +181,35 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['total_questions'], 2)
         self.assertTrue(len(data['questions']))
 
+    def test_200_search_questions_answer_prefix(self):
+        res = self.client().post('/questions/search', json={'searchTerm': "scissor"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'][0]['answer'], 'Edward Scissorhands')
+
+    def test_200_search_questions_empty_term(self):
+        res = self.client().post('/questions/search', json={'searchTerm': ""})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], len(Question.query.all()))
+
+    def test_404_search_questions_past_last_page(self):
+        res = self.client().post('/questions/search', json={'searchTerm': "title", 'page': 2})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_400_search_questions_page(self):
+        res = self.client().post('/questions/search', json={'searchTerm': "title", 'page': "2"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Bad request')
+
     def test_404_search_questions(self):
         res = self.client().post('/questions/search', json={'searchTerm': "asdwekl"})
         data = json.loads(res.data)
@@ -139,6 +245,48 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertNotEqual(data['question'], None)
 
+    def test_200_play_skips_previous_questions(self):
+        ids = [question.id for question in Question.query.filter_by(category=1).all()]
+        res = self.client().post('/quizzes', json={"quiz_category": {"id": 1, "type":"Science"}, "previous_questions": ids[1:]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question']['id'], ids[0])
+
+    def test_200_play_all_questions_played(self):
+        ids = [question.id for question in Question.query.filter_by(category=1).all()]
+        res = self.client().post('/quizzes', json={"quiz_category": {"id": 1, "type":"Science"}, "previous_questions": ids})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question'], None)
+
+    def test_200_play_session(self):
+        ids = [question.id for question in Question.query.filter_by(category=1).all()]
+        res = self.client().post('/quizzes', json={"quiz_category": {"id": 1, "type":"Science"}, "previous_questions": [], "session": True})
+        data = json.loads(res.data)
+        played = [data['question']['id']]
+        for i in range(len(ids)):
+            res = self.client().post('/quizzes', json={"session_id": data['session_id']})
+            data = json.loads(res.data)
+            if data['question'] is not None:
+                played.append(data['question']['id'])
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question'], None)
+        self.assertEqual(sorted(played), sorted(ids))
+
+    def test_200_play_expired_session(self):
+        res = self.client().post('/quizzes', json={"quiz_category": {"id": 1, "type":"Science"}, "previous_questions": [], "session_id": "expired"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertNotEqual(data['session_id'], "expired")
+        self.assertTrue(data['question'])
+
     def test_200_invaild_play(self):
         res = self.client().post('/quizzes', json={"quiz_category": {"id": 100, "type":"Science"}, "previous_questions":[]})
         data = json.loads(res.data)
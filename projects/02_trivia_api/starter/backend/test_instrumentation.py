@@ -0,0 +1,149 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from instrumentation import Instrumentation, QueryBudgetExceeded
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = os.path.join(HERE, '..', '..', '..')
+# the other copies of instrumentation.py, relative to the projects directory
+COPIES = [
+    '01_fyyur/starter_code/instrumentation.py',
+    '03_coffee_shop_full_stack/starter_code/backend/src/instrumentation.py',
+]
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    engine = create_engine('sqlite://')
+    instrumentation = Instrumentation(app, gauges=lambda: {'pool_size': 5, 'pool_name': 'queue'})
+
+    @app.route('/queries/<int:count>')
+    def queries(count):
+        with engine.connect() as connection:
+            for i in range(count):
+                connection.execute(text('SELECT %d' % i))
+        return jsonify({'queries': count})
+
+    @app.route('/budgeted/<int:count>')
+    @instrumentation.query_budget(3)
+    def budgeted(count):
+        return queries(count)
+
+    return app
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def test_query_count_header(self):
+        client = make_app(TESTING=True).test_client()
+
+        self.assertEqual(client.get('/queries/0').headers['X-Query-Count'], '0')
+        self.assertEqual(client.get('/queries/4').headers['X-Query-Count'], '4')
+
+    def test_failed_statement_leaves_no_start(self):
+        make_app()
+        engine = create_engine('sqlite://')
+        with engine.connect() as connection:
+            with self.assertRaises(OperationalError):
+                connection.execute(text('SELECT * FROM missing'))
+            connection.execute(text('SELECT 1'))
+
+            self.assertEqual(connection.info['instrumentation_start'], [])
+
+    def test_budget_raises_when_testing(self):
+        client = make_app(TESTING=True, SQL_QUERY_BUDGET=2).test_client()
+
+        self.assertEqual(client.get('/queries/2').status_code, 200)
+        with self.assertRaises(QueryBudgetExceeded):
+            client.get('/queries/3')
+
+    def test_view_budget(self):
+        client = make_app(TESTING=True, SQL_QUERY_BUDGET=1).test_client()
+
+        self.assertEqual(client.get('/budgeted/3').status_code, 200)
+        with self.assertRaises(QueryBudgetExceeded):
+            client.get('/budgeted/4')
+
+    def test_budget_warns_in_production(self):
+        app = make_app(SQL_QUERY_BUDGET=2)
+        with self.assertLogs(app.logger, 'WARNING') as logs:
+            res = app.test_client().get('/queries/3')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('GET /queries/<int:count> ran 3 SQL statements, over its budget of 2', logs.output[0])
+
+    def test_metrics_prometheus(self):
+        client = make_app(TESTING=True).test_client()
+        client.get('/queries/2')
+        client.get('/queries/4')
+        lines = client.get('/metrics').get_data(as_text=True).splitlines()
+
+        labels = 'method="GET",route="/queries/<int:count>"'
+        self.assertIn('http_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels, lines)
+        self.assertIn('http_request_duration_seconds_count{%s} 2' % labels, lines)
+        self.assertIn('http_request_sql_queries_total{%s} 6' % labels, lines)
+        self.assertIn('http_request_sql_queries_max{%s} 4' % labels, lines)
+        self.assertIn('pool_size 5', lines)
+        # only numeric gauges are exported
+        self.assertFalse([line for line in lines if line.startswith('pool_name')])
+
+    def test_metrics_json(self):
+        client = make_app(TESTING=True).test_client()
+        client.get('/queries/2')
+        data = json.loads(client.get('/metrics?format=json').data)
+
+        route = data['routes']['GET /queries/<int:count>']
+        self.assertEqual((route['requests'], route['queries_max']), (1, 2))
+        self.assertEqual(sum(route['latency_buckets'].values()), 1)
+        self.assertEqual(sorted(entry['statement'] for entry in data['slowest_statements']), ['SELECT 0', 'SELECT 1'])
+        self.assertEqual(data['gauges'], {'pool_size': 5, 'pool_name': 'queue'})
+
+    def test_metrics_hidden_in_production(self):
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': ''}):
+            self.assertEqual(make_app().test_client().get('/metrics').status_code, 404)
+
+    def test_metrics_hidden_in_debug(self):
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': '', 'METRICS_PUBLIC': ''}):
+            self.assertEqual(make_app(DEBUG=True).test_client().get('/metrics').status_code, 404)
+
+    def test_metrics_public(self):
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': ''}):
+            self.assertEqual(make_app(METRICS_PUBLIC=True).test_client().get('/metrics').status_code, 200)
+
+    def test_metrics_token(self):
+        client = make_app(METRICS_TOKEN='secret').test_client()
+
+        self.assertEqual(client.get('/metrics').status_code, 401)
+        self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+    def test_metrics_token_from_environment(self):
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': 'secret'}):
+            client = make_app(TESTING=True).test_client()
+
+            self.assertEqual(client.get('/metrics').status_code, 401)
+            self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+
+class CopiesTestCase(unittest.TestCase):
+    def test_copies_identical(self):
+        with open(os.path.join(HERE, 'instrumentation.py')) as f:
+            source = f.read()
+        for copy in COPIES:
+            path = os.path.join(PROJECTS, copy)
+            if not os.path.exists(path):
+                # a project deployed on its own
+                continue
+            with self.subTest(copy=copy), open(path) as f:
+                self.assertEqual(f.read(), source, '%s differs from %s' % (copy, os.path.join(HERE, 'instrumentation.py')))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
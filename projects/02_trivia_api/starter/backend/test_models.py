@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks import reset_db, seed
+from models import db, adjust_category_counts, Question, Category, CategoryCount
+from flaskr import create_app
+
+
+class CategoryCountTestCase(unittest.TestCase):
+    """The category_counts rows kept up to date as questions are written"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app({'DATABASE_PATH': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'models.db')})
+
+    def setUp(self):
+        self.context = self.app.app_context()
+        self.context.push()
+        reset_db()
+        seed(12)
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def count(self, category_id):
+        count = CategoryCount.query.get(category_id)
+        return count.question_count if count is not None else None
+
+    def test_first_question_of_category(self):
+        category = Category('Music')
+        category.insert()
+        Question('first', 'answer', category.id, 1).insert()
+        Question('second', 'answer', category.id, 1).insert()
+
+        self.assertEqual(self.count(category.id), 2)
+
+    def test_delete_question(self):
+        Question.query.filter_by(category=1).first().delete()
+
+        self.assertEqual(self.count(1), 1)
+
+    def test_move_question(self):
+        question = Question.query.filter_by(category=1).first()
+        question.category = 2
+        question.update()
+
+        self.assertEqual((self.count(1), self.count(2)), (1, 3))
+
+    def test_adjust_many_categories(self):
+        category = Category('Music')
+        category.insert()
+        adjust_category_counts(db.session.connection(), {1: 5, 2: -1, category.id: 4, None: 3, 3: 0})
+        db.session.commit()
+
+        self.assertEqual([self.count(category_id) for category_id in (1, 2, 3, category.id)], [7, 1, 2, 4])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
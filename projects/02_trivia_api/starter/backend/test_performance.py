@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import unittest
+
+from benchmarks import reset_db, seed
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from models import db
+
+SIZES = [int(size) for size in os.environ.get('PERF_SIZES', '1000').split(',')]
+# ceiling for any request, plus an allowance per seeded question for the
+# endpoints that return every matching question
+LATENCY_MS = float(os.environ.get('PERF_LATENCY_MS', 1000))
+LATENCY_PER_ROW_MS = float(os.environ.get('PERF_LATENCY_PER_ROW_MS', 0.05))
+
+
+def routes(size):
+    """(method, url, json body, query budget, returns rows in proportion to size)"""
+    last_page = (size - 1) // QUESTIONS_PER_PAGE + 1
+    return [
+        ('GET', '/categories', None, 1, False),
+        ('GET', '/questions', None, 3, False),
+        ('GET', '/questions?page=%d' % last_page, None, 3, False),
+        ('GET', '/questions?after=%d' % (size - QUESTIONS_PER_PAGE), None, 3, False),
+        ('GET', '/categories/1/questions', None, 2, False),
+        ('GET', '/categories/1/questions?after=%d' % (size - 6 * QUESTIONS_PER_PAGE), None, 2, False),
+        ('POST', '/questions/search', {'searchTerm': 'Question 1'}, 2, False),
+        ('POST', '/questions/search', {'searchTerm': 'paint', 'page': 3}, 2, False),
+        ('POST', '/quizzes', {'quiz_category': {'id': 1, 'type': 'Science'}, 'previous_questions': [1, 7, 13]}, 2, False),
+        ('POST', '/quizzes', {'quiz_category': {'id': 0, 'type': 'click'}, 'previous_questions': []}, 2, False),
+        ('POST', '/questions', {'question': 'new question', 'answer': 'answer', 'difficulty': 1, 'category': 1}, 3, False),
+        ('DELETE', '/questions/%d' % size, None, 3, False),
+        ('GET', '/pool/stats', None, 0, False),
+        ('GET', '/metrics', None, 0, False),
+    ]
+
+
+def snapshot_routes(size):
+    """The reads served from the question snapshot, which need no queries once it is loaded"""
+    last_page = (size - 1) // QUESTIONS_PER_PAGE + 1
+    return [
+        ('GET', '/questions', None, 0, False),
+        ('GET', '/questions?page=%d' % last_page, None, 0, False),
+        ('GET', '/categories/1/questions', None, 0, False),
+        ('GET', '/categories/1/questions?after=%d' % (size - 6 * QUESTIONS_PER_PAGE), None, 0, False),
+        ('POST', '/quizzes', {'quiz_category': {'id': 1, 'type': 'Science'}, 'previous_questions': [1, 7, 13]}, 0, False),
+        ('GET', '/snapshot/stats', None, 0, False),
+    ]
+
+
+class RoutePerformanceTest:
+    """Runs every endpoint against a database seeded with SIZE questions.
+    TRIVIA_PERF_DB selects the database, a temporary SQLite file by default."""
+    SIZE = None
+    CONFIG = {}
+    ROUTES = staticmethod(routes)
+
+    @classmethod
+    def setUpClass(cls):
+        database_path = os.environ.get('TRIVIA_PERF_DB') or \
+            'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'perf.db')
+        cls.app = create_app(dict(cls.CONFIG, DATABASE_PATH=database_path, TESTING=True))
+        with cls.app.app_context():
+            reset_db()
+            seed(cls.SIZE)
+            db.session.remove()
+        # loads the snapshot, when there is one
+        cls.app.test_client().get('/questions')
+
+    def setUp(self):
+        self.client = self.app.test_client()
+
+    def test_routes(self):
+        for method, url, body, budget, returns_rows in self.ROUTES(self.SIZE):
+            with self.subTest(size=self.SIZE, route='%s %s' % (method, url)):
+                start = time.perf_counter()
+                res = self.client.open(url, method=method, json=body)
+                elapsed = (time.perf_counter() - start) * 1000
+
+                ceiling = LATENCY_MS + (LATENCY_PER_ROW_MS * self.SIZE if returns_rows else 0)
+                self.assertEqual(res.status_code, 200)
+                self.assertLessEqual(int(res.headers['X-Query-Count']), budget)
+                self.assertLess(elapsed, ceiling)
+
+
+for size in SIZES:
+    name = 'RoutePerformance%dTest' % size
+    globals()[name] = type(name, (RoutePerformanceTest, unittest.TestCase), {'SIZE': size})
+    name = 'SnapshotRoutePerformance%dTest' % size
+    globals()[name] = type(name, (RoutePerformanceTest, unittest.TestCase), {
+        'SIZE': size, 'CONFIG': {'QUESTION_SNAPSHOT': True}, 'ROUTES': staticmethod(snapshot_routes)})
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks import reset_db, seed
+from models import db
+from flaskr import create_app
+from flaskr.quiz import QuestionPicker
+
+
+class QuestionPickerTestCase(unittest.TestCase):
+    """QuestionPicker against a seeded SQLite file"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app({'DATABASE_PATH': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'quiz.db')})
+        with cls.app.app_context():
+            reset_db()
+            seed(60)
+            db.session.remove()
+
+    def setUp(self):
+        self.context = self.app.app_context()
+        self.context.push()
+        self.picker = QuestionPicker(max_arrays=3)
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def test_category_sent_as_string(self):
+        self.assertEqual(self.picker.ids('2'), self.picker.ids(2))
+        self.assertEqual(len(self.picker.ids('2')), 10)
+
+    def test_all_categories(self):
+        self.assertEqual(len(self.picker.ids(0)), 60)
+        self.assertEqual(len(self.picker.ids(None)), 60)
+
+    def test_unknown_categories_are_bounded(self):
+        for category in range(100, 200):
+            self.assertEqual(len(self.picker.ids(category)), 0)
+
+        self.assertEqual(list(self.picker._ids), [197, 198, 199])
+
+    def test_least_recently_used_dropped_first(self):
+        for category in (1, 2, 3):
+            self.picker.ids(category)
+        self.picker.ids(1)
+        self.picker.ids(4)
+
+        self.assertEqual(list(self.picker._ids), [3, 1, 4])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+import tempfile
+import unittest
+
+from benchmarks import reset_db, seed
+from models import db, Question
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from flaskr.search import create_search_index, drop_search_index
+
+# more than the 1000 matches search used to stop counting at
+SIZE = 1200
+
+
+class QuestionSearchTestCase(unittest.TestCase):
+    """POST /questions/search against a seeded SQLite file"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app({'DATABASE_PATH': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'search.db')})
+        with cls.app.app_context():
+            reset_db()
+            seed(SIZE)
+            cls.questions = {question.id: (question.question, question.answer) for question in Question.query}
+            db.session.remove()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+
+    def search(self, term, page=1):
+        res = self.client.post('/questions/search', json={'searchTerm': term, 'page': page})
+        return res.status_code, json.loads(res.data)
+
+    def containing(self, term):
+        return {question_id for question_id, (question, answer) in self.questions.items()
+                if term.lower() in question.lower()}
+
+    def all_ids(self, term):
+        ids = []
+        page = 1
+        while True:
+            status, data = self.search(term, page)
+            if status == 404:
+                return ids
+            ids.extend(question['id'] for question in data['questions'])
+            page += 1
+
+    def set_index(self, indexed):
+        with self.app.app_context():
+            if indexed:
+                create_search_index(db.session.connection())
+            else:
+                drop_search_index(db.session.connection())
+            db.session.commit()
+            db.session.remove()
+
+    def test_substring_of_question(self):
+        status, data = self.search('estion 11')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['total_questions'], len(self.containing('estion 11')))
+        self.assertEqual(set(self.all_ids('estion 11')), self.containing('estion 11'))
+
+    def test_short_term(self):
+        # too short for the trigram index; "1" also matches words starting with 1
+        words = {question_id for question_id, (question, answer) in self.questions.items()
+                 if any(word.startswith('1') for word in re.findall(r'\w+', question + ' ' + answer))}
+        status, data = self.search('1:')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['total_questions'], len(words | self.containing('1:')))
+
+    def test_word_matches_come_first(self):
+        # "paint" is the start of the word "painter" in question or answer
+        # text, and a substring of the question only where it says painter
+        words = {question_id for question_id, (question, answer) in self.questions.items()
+                 if 'painter' in (question + ' ' + answer).lower()}
+        ids = self.all_ids('paint')
+
+        self.assertEqual(set(ids), words | self.containing('paint'))
+        self.assertEqual(set(ids[:len(words)]), words)
+
+    def test_real_total(self):
+        status, data = self.search('question')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['total_questions'], SIZE)
+        status, data = self.search('question', SIZE // QUESTIONS_PER_PAGE)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data['questions']), QUESTIONS_PER_PAGE)
+
+    def test_empty_term_matches_everything(self):
+        for term in ('', '   ', None):
+            with self.subTest(term=term):
+                status, data = self.search(term)
+
+                self.assertEqual(status, 200)
+                self.assertEqual(data['total_questions'], SIZE)
+                self.assertEqual([question['id'] for question in data['questions']],
+                                 sorted(self.questions)[:QUESTIONS_PER_PAGE])
+
+    def test_without_index(self):
+        self.set_index(False)
+        self.addCleanup(self.set_index, True)
+
+        status, data = self.search('estion 11')
+        self.assertEqual(status, 200)
+        self.assertEqual(data['total_questions'], len(self.containing('estion 11')))
+        # without the index only substrings of the question match
+        self.assertEqual(set(self.all_ids('paint')), self.containing('paint'))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from benchmarks import reset_db, seed
+from models import db, Question
+from flaskr import create_app
+from flaskr.snapshot import Bank, QuestionSnapshot
+
+SIZE = 60
+
+
+class QuestionSnapshotTestCase(unittest.TestCase):
+    """The read endpoints with QUESTION_SNAPSHOT on, against a seeded SQLite file"""
+
+    @classmethod
+    def setUpClass(cls):
+        database_path = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'snapshot.db')
+        cls.app = create_app({'DATABASE_PATH': database_path, 'QUESTION_SNAPSHOT': True, 'TESTING': True})
+        with cls.app.app_context():
+            reset_db()
+            seed(SIZE)
+            db.session.remove()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+
+    def category_ids(self, category):
+        with self.app.app_context():
+            return [question.id for question in Question.query.filter_by(category=category).order_by(Question.id)]
+
+    def play(self, body):
+        res = self.client.post('/quizzes', json=body)
+        self.assertEqual(res.status_code, 200)
+        return json.loads(res.data)
+
+    def test_play_category_sent_as_string(self):
+        data = self.play({'quiz_category': {'id': '2', 'type': 'Art'}, 'previous_questions': []})
+
+        self.assertEqual(data['question']['category'], 2)
+
+    def test_play_all_categories(self):
+        data = self.play({'quiz_category': {'id': 0, 'type': 'click'}, 'previous_questions': []})
+
+        self.assertNotEqual(data['question'], None)
+
+    def test_play_skips_previous_questions(self):
+        ids = self.category_ids(3)
+        data = self.play({'quiz_category': {'id': '3', 'type': 'Geography'}, 'previous_questions': ids[1:]})
+
+        self.assertEqual(data['question']['id'], ids[0])
+
+    def test_play_all_questions_played(self):
+        ids = self.category_ids(3)
+        data = self.play({'quiz_category': {'id': '3', 'type': 'Geography'}, 'previous_questions': ids})
+
+        self.assertEqual(data['question'], None)
+
+    def test_play_session_category_sent_as_string(self):
+        ids = self.category_ids(4)
+        data = self.play({'quiz_category': {'id': '4', 'type': 'History'}, 'previous_questions': [], 'session': True})
+        played = [data['question']['id']]
+        while data['question'] is not None:
+            data = self.play({'session_id': data['session_id']})
+            if data['question'] is not None:
+                played.append(data['question']['id'])
+
+        self.assertEqual(sorted(played), ids)
+
+    def test_category_questions(self):
+        res = self.client.get('/categories/5/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], len(self.category_ids(5)))
+        self.assertEqual([question['id'] for question in data['questions']], self.category_ids(5))
+
+    def test_create_and_delete_question(self):
+        res = self.client.post('/questions', json={'question': 'snapshot question', 'answer': 'answer', 'difficulty': 1, 'category': '6'})
+        question_id = json.loads(res.data)['created']
+        last_page = '/categories/6/questions?after=%d' % self.category_ids(6)[-3]
+        created = json.loads(self.client.get(last_page).data)
+        stats = json.loads(self.client.get('/snapshot/stats').data)
+
+        self.client.delete('/questions/%d' % question_id)
+        deleted = json.loads(self.client.get(last_page).data)
+
+        self.assertIn(question_id, [question['id'] for question in created['questions']])
+        self.assertEqual(created['total_questions'], deleted['total_questions'] + 1)
+        self.assertEqual(stats['questions'], SIZE + 1)
+        self.assertNotIn(question_id, [question['id'] for question in deleted['questions']])
+        self.assertEqual(json.loads(self.client.get('/snapshot/stats').data)['questions'], SIZE)
+
+    def test_bulk_import_reloads(self):
+        res = self.client.post('/questions/bulk', json=[
+            {'question': 'bulk question %d' % i, 'answer': 'answer', 'difficulty': 1, 'category': 1} for i in range(3)])
+        data = json.loads(self.client.get('/categories/1/questions?after=%d' % self.category_ids(1)[-4]).data)
+        for question in data['questions']:
+            self.client.delete('/questions/%d' % question['id'])
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([question['question'] for question in data['questions']],
+                         ['bulk question %d' % i for i in range(3)])
+
+    def test_writes_reach_only_their_app(self):
+        other = create_app({'DATABASE_PATH': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'other.db'),
+                            'QUESTION_SNAPSHOT': True, 'TESTING': True})
+        with other.app_context():
+            reset_db()
+            seed(2 * SIZE)
+            db.session.remove()
+        other.test_client().get('/questions')
+        res = other.test_client().post('/questions', json={'question': 'other question', 'answer': 'answer', 'difficulty': 1, 'category': 1})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(other.test_client().get('/snapshot/stats').data)['questions'], 2 * SIZE + 1)
+        self.assertEqual(json.loads(self.client.get('/snapshot/stats').data)['questions'], SIZE)
+
+    def test_stats_access(self):
+        with mock.patch.dict(self.app.config, {'METRICS_TOKEN': 'secret'}):
+            self.assertEqual(self.client.get('/snapshot/stats').status_code, 401)
+            res = self.client.get('/snapshot/stats', headers={'Authorization': 'Bearer secret'})
+            self.assertEqual(res.status_code, 200)
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': '', 'METRICS_PUBLIC': ''}), \
+                mock.patch.dict(self.app.config, {'TESTING': False}):
+            self.assertEqual(self.client.get('/snapshot/stats').status_code, 404)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConcurrentReloadTestCase(unittest.TestCase):
+    """QuestionSnapshot.bank() called from many threads at once"""
+    THREADS = 8
+
+    @classmethod
+    def setUpClass(cls):
+        database_path = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'reload.db')
+        cls.app = create_app({'DATABASE_PATH': database_path})
+        with cls.app.app_context():
+            reset_db()
+            seed(SIZE)
+            db.session.remove()
+
+    def setUp(self):
+        self.clock = Clock()
+        self.snapshot = QuestionSnapshot(max_age=10, clock=self.clock)
+        self.loads = 0
+        self.loading = threading.Event()
+        self.release = threading.Event()
+        load = Bank.load.__func__
+
+        def slow_load(cls, connection):
+            self.loads += 1
+            self.loading.set()
+            self.release.wait(5)
+            return load(cls, connection)
+
+        patcher = mock.patch.object(Bank, 'load', classmethod(slow_load))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def banks(self):
+        """Calls bank() on every thread, and returns what each got back."""
+        banks = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def read():
+            with self.app.app_context():
+                barrier.wait()
+                banks.append(self.snapshot.bank())
+
+        threads = [threading.Thread(target=read) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        return threads, banks
+
+    def test_first_load_happens_once(self):
+        threads, banks = self.banks()
+        self.loading.wait(5)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(len(banks), self.THREADS)
+        self.assertTrue(all(bank is banks[0] for bank in banks))
+        self.assertEqual(len(banks[0].ids), SIZE)
+
+    def test_expired_bank_served_while_one_thread_reloads(self):
+        self.release.set()
+        with self.app.app_context():
+            old = self.snapshot.bank()
+        self.release.clear()
+        self.loading.clear()
+        self.clock.now = 10
+
+        threads, banks = self.banks()
+        self.loading.wait(5)
+        # every thread but the loader returns the old bank without waiting
+        for i in range(50):
+            if len(banks) == self.THREADS - 1:
+                break
+            time.sleep(0.1)
+        self.assertEqual(len(banks), self.THREADS - 1)
+        self.assertTrue(all(bank is old for bank in banks))
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, 2)
+        self.assertIsNot(banks[-1], old)
+        self.assertIsNot(self.snapshot.bank(), old)
+        self.assertEqual(self.loads, 2)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -14,6 +14,7 @@ class QuestionView extends Component {
       totalQuestions: 0,
       categories: {},
       currentCategory: null,
+      searchTerm: null,
     }
   }
 
@@ -30,7 +31,8 @@ class QuestionView extends Component {
           questions: result.questions,
           totalQuestions: result.total_questions,
           categories: result.categories,
-          currentCategory: result.current_category })
+          currentCategory: result.current_category,
+          searchTerm: null })
         return;
       },
       error: (error) => {
@@ -41,7 +43,19 @@ class QuestionView extends Component {
   }
 
   selectPage(num) {
-    this.setState({page: num}, () => this.getQuestions());
+    this.setState({page: num}, () => {
+      if (this.state.searchTerm !== null) {
+        this.submitSearch(this.state.searchTerm, num);
+      } else if (this.state.currentCategory) {
+        this.getByCategory(this.state.currentCategory.id, num);
+      } else {
+        this.getQuestions();
+      }
+    });
+  }
+
+  showAllQuestions = () => {
+    this.setState({page: 1, currentCategory: null, searchTerm: null}, () => this.getQuestions());
   }
 
   createPagination(){
@@ -58,15 +72,17 @@ class QuestionView extends Component {
     return pageNumbers;
   }
 
-  getByCategory= (id) => {
+  getByCategory= (id, page = 1) => {
     $.ajax({
-      url: `/categories/${id}/questions`, //TODO: update request URL
+      url: `/categories/${id}/questions?page=${page}`, //TODO: update request URL
       type: "GET",
       success: (result) => {
         this.setState({
           questions: result.questions,
+          page: page,
           totalQuestions: result.total_questions,
-          currentCategory: result.current_category })
+          currentCategory: result.current_category,
+          searchTerm: null })
         return;
       },
       error: (error) => {
@@ -76,13 +92,13 @@ class QuestionView extends Component {
     })
   }
 
-  submitSearch = (searchTerm) => {
+  submitSearch = (searchTerm, page = 1) => {
     $.ajax({
       url: `/questions/search`, //TODO: update request URL
       type: "POST",
       dataType: 'json',
       contentType: 'application/json',
-      data: JSON.stringify({searchTerm: searchTerm}),
+      data: JSON.stringify({searchTerm: searchTerm, page: page}),
       xhrFields: {
         withCredentials: true
       },
@@ -90,8 +106,10 @@ class QuestionView extends Component {
       success: (result) => {
         this.setState({
           questions: result.questions,
+          page: page,
           totalQuestions: result.total_questions,
-          currentCategory: result.current_category })
+          currentCategory: result.current_category,
+          searchTerm: searchTerm })
         return;
       },
       error: (error) => {
@@ -123,7 +141,7 @@ class QuestionView extends Component {
     return (
       <div className="question-view">
         <div className="categories-list">
-          <h2 onClick={() => {this.getQuestions()}}>Categories</h2>
+          <h2 onClick={this.showAllQuestions}>Categories</h2>
           <ul>
             {Object.keys(this.state.categories).map((id, ) => (
               <li key={id} onClick={() => {this.getByCategory(id)}}>
@@ -0,0 +1,131 @@
+'''
+Coffee shop backend benchmarks.
+
+auth: time spent in @requires_auth per request, verifying every token
+versus reusing verified payloads from the token cache. Tokens are signed
+with a throwaway RSA key that is served to verify_decode_jwt in place of
+the Auth0 JWKS.
+
+drinks: GET /drinks latency for `size` drinks, with a cold and a warm
+recipe cache, and for a conditional request answered with 304.
+
+The RSA key needs the packages in requirements-bench.txt:
+
+    pip install -r requirements-bench.txt
+    python benchmarks.py auth --repeat 2000
+    python benchmarks.py drinks --sizes 100 1000 10000
+'''
+import os
+import sys
+import argparse
+import base64
+import json
+import tempfile
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask
+from jose import jwt
+
+from src.auth import auth
+
+
+def b64_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def signing_key():
+    '''Returns (PEM private key, JWKS document) for a fresh RSA key.'''
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    numbers = key.public_key().public_numbers()
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    jwks = {'keys': [{'kty': 'RSA', 'kid': 'bench', 'use': 'sig', 'alg': 'RS256',
+                      'n': b64_uint(numbers.n), 'e': b64_uint(numbers.e)}]}
+    return pem, jwks
+
+
+def bench_auth(args):
+    pem, jwks = signing_key()
+    auth.fetch_jwks = lambda: jwks
+    token = jwt.encode({
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'exp': int(time.time()) + 3600,
+        'permissions': ['get:drinks-detail', 'post:drinks', 'patch:drinks', 'delete:drinks'],
+    }, pem, algorithm='RS256', headers={'kid': 'bench'})
+
+    app = Flask(__name__)
+    view = auth.requires_auth('get:drinks-detail')(lambda payload: payload)
+
+    print('%12s %14s' % ('mode', 'us_per_request'))
+    with app.test_request_context(headers={'Authorization': 'Bearer ' + token}):
+        for mode in ('uncached', 'cached'):
+            view()
+            start = time.perf_counter()
+            for i in range(args.repeat):
+                if mode == 'uncached':
+                    auth.verified_tokens.clear()
+                view()
+            elapsed = time.perf_counter() - start
+            print('%12s %14.1f' % (mode, elapsed * 1e6 / args.repeat))
+
+
+def best_of(repeat, run):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_drinks(args):
+    from src.api import app
+    from src.database import models
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    client = app.test_client()
+
+    print('%10s %10s %10s %14s' % ('drinks', 'cold_ms', 'warm_ms', 'not_modified_ms'))
+    with app.app_context():
+        for size in args.sizes:
+            models.db_drop_and_create_all()
+            models.db.session.execute(models.Drink.__table__.insert(), [{
+                'title': 'Drink %d' % i,
+                'recipe': json.dumps([{'name': 'milk', 'color': 'white', 'parts': i % 3 + 1},
+                                      {'name': 'coffee', 'color': 'brown', 'parts': 1}])
+            } for i in range(size)])
+            models.db.session.commit()
+            models.db.session.remove()
+
+            def cold():
+                models.parse_recipe.cache_clear()
+                client.get('/drinks')
+
+            cold_ms = best_of(args.repeat, cold)
+            warm_ms = best_of(args.repeat, lambda: client.get('/drinks'))
+            etag = client.get('/drinks').headers['ETag']
+            not_modified_ms = best_of(args.repeat, lambda: client.get('/drinks', headers={'If-None-Match': etag}))
+            print('%10d %10.1f %10.1f %14.1f' % (size, cold_ms, warm_ms, not_modified_ms))
+
+
+BENCHMARKS = {
+    'auth': bench_auth,
+    'drinks': bench_drinks,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -4,12 +4,18 @@ from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink, drinks_etag, serialize_drinks
+from .database.db_pool import pool_stats
+from .instrumentation import Instrumentation, metrics_access
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
+if os.environ.get('SQL_QUERY_BUDGET'):
+    app.config['SQL_QUERY_BUDGET'] = int(os.environ['SQL_QUERY_BUDGET'])
 setup_db(app)
 CORS(app)
+Instrumentation(app, gauges=lambda: {
+    'db_pool_' + name: value for name, value in pool_stats(db.engine).items()})
 
 '''
 @TODO uncomment the following line to initialize the datbase
@@ -27,6 +33,22 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
 '''
+def drinks_response(detail):
+    drinks = Drink.query.order_by(Drink.id).all()
+    etag = drinks_etag(drinks)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({
+            'success': True,
+            'drinks': serialize_drinks(drinks, detail)
+        })
+    response.set_etag(etag)
+    return response
+
+@app.route('/drinks')
+def retrieve_drinks():
+    return drinks_response(detail=False)
 
 
 '''
@@ -37,6 +59,13 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks-detail')
+@requires_auth('get:drinks-detail')
+def retrieve_drinks_detail(payload):
+    response = drinks_response(detail=True)
+    # the body depends on the Authorization header
+    response.headers['Cache-Control'] = 'private'
+    return response
 
 
 '''
@@ -75,6 +104,15 @@ CORS(app)
 '''
 
 
+@app.route('/pool/stats')
+def retrieve_pool_stats():
+    # gated like /metrics, see instrumentation.py
+    status = metrics_access(app, request.headers.get('Authorization'))
+    if status is not None:
+        abort(status)
+    return jsonify(pool_stats(db.engine))
+
+
 ## Error Handling
 '''
 Example error handling for unprocessable entity
@@ -108,3 +146,10 @@ def unprocessable(error):
 @TODO implement error handler for AuthError
     error handler should conform to general task above 
 '''
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify({
+                    "success": False, 
+                    "error": error.status_code,
+                    "message": error.error['description']
+                    }), error.status_code
@@ -1,4 +1,8 @@
 import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
@@ -8,6 +12,7 @@ from urllib.request import urlopen
 AUTH0_DOMAIN = 'udacity-fsnd.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'dev'
+TOKEN_CACHE_SIZE = 1024
 
 ## AuthError Exception
 '''
@@ -31,7 +36,33 @@ class AuthError(Exception):
     return the token part of the header
 '''
 def get_token_auth_header():
-   raise Exception('Not Implemented')
+    auth = request.headers.get('Authorization', None)
+    if not auth:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
+
+    parts = auth.split()
+    if parts[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must start with "Bearer".'
+        }, 401)
+
+    elif len(parts) == 1:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Token not found.'
+        }, 401)
+
+    elif len(parts) > 2:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must be bearer token.'
+        }, 401)
+
+    return parts[1]
 
 '''
 @TODO implement check_permissions(permission, payload) method
@@ -45,7 +76,21 @@ def get_token_auth_header():
     return true otherwise
 '''
 def check_permissions(permission, payload):
-    raise Exception('Not Implemented')
+    if 'permissions' not in payload:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Permissions not included in JWT.'
+        }, 400)
+
+    permissions = getattr(payload, 'permission_set', None)
+    if permissions is None:
+        permissions = payload['permissions']
+    if permission not in permissions:
+        raise AuthError({
+            'code': 'unauthorized',
+            'description': 'Permission not found.'
+        }, 403)
+    return True
 
 '''
 @TODO implement verify_decode_jwt(token) method
@@ -60,8 +105,118 @@ def check_permissions(permission, payload):
 
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
 '''
+def fetch_jwks():
+    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+    return json.loads(jsonurl.read())
+
 def verify_decode_jwt(token):
-    raise Exception('Not Implemented')
+    unverified_header = jwt.get_unverified_header(token)
+    if 'kid' not in unverified_header:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization malformed.'
+        }, 401)
+
+    rsa_key = {}
+    for key in fetch_jwks()['keys']:
+        if key['kid'] == unverified_header['kid']:
+            rsa_key = {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+    if rsa_key:
+        try:
+            return jwt.decode(
+                token,
+                rsa_key,
+                algorithms=ALGORITHMS,
+                audience=API_AUDIENCE,
+                issuer='https://' + AUTH0_DOMAIN + '/'
+            )
+
+        except jwt.ExpiredSignatureError:
+            raise AuthError({
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+
+        except jwt.JWTClaimsError:
+            raise AuthError({
+                'code': 'invalid_claims',
+                'description': 'Incorrect claims. Please, check the audience and issuer.'
+            }, 401)
+
+        except Exception:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+    raise AuthError({
+        'code': 'invalid_header',
+        'description': 'Unable to find the appropriate key.'
+    }, 400)
+
+## Verified Token Cache
+
+'''
+VerifiedPayload
+    a decoded jwt payload, with its permissions precomputed as a frozenset
+    so check_permissions is a set lookup
+    it is shared by every request made with the same token, treat it as read only
+'''
+class VerifiedPayload(dict):
+    def __init__(self, payload):
+        super().__init__(payload)
+        permissions = payload.get('permissions')
+        self.permission_set = frozenset(permissions) if permissions is not None else None
+
+'''
+VerifiedTokenCache
+    a bounded LRU of payloads that passed verify_decode_jwt, keyed by the
+    sha256 of the token, so repeated requests with one token skip the RS256
+    signature check
+    entries are dropped at the token's exp claim; tokens without exp are not cached
+'''
+class VerifiedTokenCache:
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, token, payload):
+        payload = VerifiedPayload(payload)
+        expires = payload.get('exp')
+        if isinstance(expires, (int, float)) and self.maxsize > 0:
+            key = hashlib.sha256(token.encode()).digest()
+            with self._lock:
+                self._entries[key] = (expires, payload)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+verified_tokens = VerifiedTokenCache()
 
 '''
 @TODO implement @requires_auth(permission) decorator method
@@ -78,7 +233,9 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
+            payload = verified_tokens.get(token)
+            if payload is None:
+                payload = verified_tokens.set(token, verify_decode_jwt(token))
             check_permissions(permission, payload)
             return f(payload, *args, **kwargs)
 
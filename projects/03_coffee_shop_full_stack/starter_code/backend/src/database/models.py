@@ -1,8 +1,13 @@
 import os
+import hashlib
+from functools import lru_cache
 from sqlalchemy import Column, String, Integer
+from sqlalchemy.orm import reconstructor
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from .db_pool import engine_options
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
@@ -16,6 +21,7 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
 
@@ -42,17 +48,34 @@ class Drink(db.Model):
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
     recipe =  Column(String(180), nullable=False)
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._parsed = None
+
+    @reconstructor
+    def init_on_load(self):
+        self._parsed = None
+
+    '''
+    parsed_recipe()
+        the (long, short) forms of the recipe blob, parsed once per instance
+        and shared between instances holding the same blob
+        dropped by update(), and rebuilt if recipe is reassigned
+    '''
+    def parsed_recipe(self):
+        if self._parsed is None or self._parsed[0] is not self.recipe:
+            self._parsed = (self.recipe,) + parse_recipe(self.recipe)
+        return self._parsed[1], self._parsed[2]
+
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': self.parsed_recipe()[1]
         }
 
     '''
@@ -63,7 +86,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.parsed_recipe()[0]
         }
 
     '''
@@ -102,6 +125,41 @@ class Drink(db.Model):
     '''
     def update(self):
         db.session.commit()
+        self._parsed = None
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+'''
+parse_recipe(recipe)
+    returns the (long, short) recipe lists for a recipe blob
+    results are kept per blob, so listing drinks does not re-parse recipes
+    that have not changed; treat them as read only
+'''
+@lru_cache(maxsize=1024)
+def parse_recipe(recipe):
+    long_recipe = json.loads(recipe)
+    short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in long_recipe]
+    return long_recipe, short_recipe
+
+'''
+drinks_etag(drinks)
+    a strong ETag over the ids, titles and recipes of a list of drinks
+    cheap next to serializing them, so unchanged lists can be answered with 304
+'''
+def drinks_etag(drinks):
+    digest = hashlib.sha1()
+    for drink in drinks:
+        digest.update(('%s\0%s\0%s\0' % (drink.id, drink.title, drink.recipe)).encode())
+    return digest.hexdigest()
+
+'''
+serialize_drinks(drinks, detail=False)
+    the short() (or, with detail, long()) form of every drink, in one pass
+'''
+def serialize_drinks(drinks, detail=False):
+    index = 0 if detail else 1
+    return [
+        {'id': drink.id, 'title': drink.title, 'recipe': drink.parsed_recipe()[index]}
+        for drink in drinks
+    ]
\ No newline at end of file
@@ -0,0 +1,89 @@
+'''
+Tests for the verified token cache behind @requires_auth.
+
+    python -m unittest test_auth
+'''
+import unittest
+
+from src.auth.auth import AuthError, VerifiedTokenCache, check_permissions
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def payload(exp=1000, permissions=('get:drinks-detail',)):
+    return {'sub': 'user', 'exp': exp, 'permissions': list(permissions)}
+
+
+class VerifiedTokenCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(0)
+        self.cache = VerifiedTokenCache(maxsize=2, clock=self.clock)
+
+    def test_hit_until_exp(self):
+        self.cache.set('token', payload(exp=1000))
+
+        self.clock.now = 999
+        self.assertEqual(self.cache.get('token')['sub'], 'user')
+        self.clock.now = 1000
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(len(self.cache._entries), 0)
+
+    def test_least_recently_used_evicted(self):
+        for token in ('a', 'b'):
+            self.cache.set(token, payload())
+        self.cache.get('a')
+        self.cache.set('c', payload())
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_tokens_without_exp_not_cached(self):
+        returned = self.cache.set('token', {'sub': 'user', 'permissions': []})
+
+        self.assertEqual(returned.permission_set, frozenset())
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_disabled(self):
+        cache = VerifiedTokenCache(maxsize=0, clock=self.clock)
+        cache.set('token', payload())
+
+        self.assertIsNone(cache.get('token'))
+
+    def test_clear(self):
+        self.cache.set('token', payload())
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_keys_are_token_digests(self):
+        self.cache.set('secret-token', payload())
+
+        self.assertNotIn('secret-token', self.cache._entries)
+        self.assertEqual([len(key) for key in self.cache._entries], [32])
+
+
+class CheckPermissionsTestCase(unittest.TestCase):
+    def test_cached_payload(self):
+        cached = VerifiedTokenCache(clock=Clock(0)).set('token', payload())
+
+        self.assertTrue(check_permissions('get:drinks-detail', cached))
+        with self.assertRaises(AuthError) as raised:
+            check_permissions('post:drinks', cached)
+        self.assertEqual(raised.exception.status_code, 403)
+
+    def test_plain_payload(self):
+        self.assertTrue(check_permissions('get:drinks-detail', payload()))
+        with self.assertRaises(AuthError) as raised:
+            check_permissions('get:drinks-detail', {'sub': 'user'})
+        self.assertEqual(raised.exception.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
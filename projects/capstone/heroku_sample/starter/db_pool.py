@@ -0,0 +1,126 @@
+'''
+Engine and connection pool settings for setup_db.
+
+engine_options(url) builds SQLALCHEMY_ENGINE_OPTIONS from these environment
+variables:
+
+  DB_POOL_SIZE          connections each process keeps open (default 5)
+  DB_MAX_OVERFLOW       extra connections allowed under load (default 10)
+  DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+  DB_POOL_RECYCLE       seconds before a connection is replaced (default 1800)
+  DB_POOL_PRE_PING      1 to test each connection on checkout, so connections
+                        dropped by a failover are replaced (default 1)
+  DB_STATEMENT_TIMEOUT  PostgreSQL statement_timeout in ms (default 0, none)
+  DB_PGBOUNCER          1 when connecting through PgBouncer
+
+Size the pool so that workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under
+the server's max_connections. With DB_PGBOUNCER, pooling is left to PgBouncer:
+connections are opened per checkout and closed on return, and no startup
+options are sent, since PgBouncer rejects them. Set statement_timeout on the
+database role instead.
+
+SQLite keeps SQLAlchemy's default pool. pool_stats(engine) reports checkout
+counts and wait times for the pools configured here.
+
+This file is shared by the Fyyur, trivia, coffee shop and capstone projects,
+each of which is deployed on its own. Keep the copies identical;
+test_db_pool.py in the trivia backend fails when they are not.
+'''
+import os
+import threading
+import time
+
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class TimedPool:
+    '''
+    Pool mixin that counts checkouts and times how long each one waits for
+    a connection, including connecting when the pool has to open one.
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timing = {'checkouts': 0, 'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+        self._timing_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            # only waits that ran out count; failed connects propagate as they are
+            with self._timing_lock:
+                self.timing['timeouts'] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._timing_lock:
+                self.timing['checkouts'] += 1
+                self.timing['wait_total'] += waited
+                self.timing['wait_max'] = max(self.timing['wait_max'], waited)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.timing = self.timing
+        pool._timing_lock = self._timing_lock
+        return pool
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    pass
+
+
+class TimedNullPool(TimedPool, NullPool):
+    pass
+
+
+def _env(environ, name, default):
+    return int(environ.get(name, default))
+
+
+def engine_options(url, environ=os.environ):
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {}
+
+    options = {'pool_pre_ping': bool(_env(environ, 'DB_POOL_PRE_PING', 1))}
+    postgres = make_url(url).get_backend_name() in ('postgresql', 'postgres')
+
+    if _env(environ, 'DB_PGBOUNCER', 0):
+        options['poolclass'] = TimedNullPool
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=_env(environ, 'DB_POOL_SIZE', 5),
+        max_overflow=_env(environ, 'DB_MAX_OVERFLOW', 10),
+        pool_timeout=_env(environ, 'DB_POOL_TIMEOUT', 30),
+        pool_recycle=_env(environ, 'DB_POOL_RECYCLE', 1800),
+    )
+    statement_timeout = _env(environ, 'DB_STATEMENT_TIMEOUT', 0)
+    if postgres and statement_timeout:
+        options['connect_args'] = {'options': '-c statement_timeout=%d' % statement_timeout}
+    return options
+
+
+def pool_stats(engine):
+    '''
+    Returns a dict describing the engine's pool: its type, and for the
+    pools configured here checkout counts and wait times in milliseconds.
+    '''
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(),
+                     checked_out=pool.checkedout(), overflow=pool.overflow())
+    timing = getattr(pool, 'timing', None)
+    if timing is not None:
+        checkouts = timing['checkouts']
+        stats.update(
+            checkouts=checkouts,
+            timeouts=timing['timeouts'],
+            wait_avg_ms=timing['wait_total'] * 1000 / checkouts if checkouts else 0.0,
+            wait_max_ms=timing['wait_max'] * 1000,
+        )
+    return stats